@@ -20,3 +20,4 @@
 ##############################################################################
 
 from . import wizard
+from . import controllers
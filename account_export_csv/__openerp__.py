@@ -37,6 +37,26 @@
 
     You can filter by period
 
+    The files are written in the filestore as they are generated and
+    downloaded by chunks, so large exports do not load the OpenERP worker
+    memory nor the database.
+
+    Long exports can run in background: the wizard shows the progress of the
+    export and the file is downloaded once it is done. The system parameter
+    account_export_csv.max_jobs (2 by default) limits the number of exports
+    running at the same time.
+
+    The journal entries of the periods can be read in parallel, each on its
+    own database connection, the system parameter
+    account_export_csv.export_workers (number of processors by default)
+    gives the number of periods read at the same time.
+
+    The files can be compressed with gzip or zip as they are generated.
+
+    With the pyarrow python library installed, the exports can also be
+    written as Parquet or Arrow files, with typed columns (dates, amounts,
+    numbers).
+
     TODO: rearange wizard view with only one button to generate file plus
     define a selection list to select report type
     """,
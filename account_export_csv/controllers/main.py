@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    Author Joel Grand-Guillaume and Vincent Renaville Copyright 2013
+#    Camptocamp SA
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+import mimetypes
+
+from openerp import http
+from openerp.http import request
+
+
+class AccountCSVExportController(http.Controller):
+
+    @http.route('/account_export_csv/download/<int:attachment_id>',
+                type='http', auth='user')
+    def download(self, attachment_id, **kwargs):
+        """
+        Stream the file of an export from the filestore by chunks
+        """
+        attachment_obj = request.registry['ir.attachment']
+        # reading the attachment checks the access to the export
+        attachment = attachment_obj.browse(
+            request.cr, request.uid, attachment_id, context=request.context)
+        if not attachment.exists() or \
+                attachment.res_model != 'account.csv.export' or \
+                not attachment.store_fname:
+            return request.not_found()
+        full_path = attachment_obj._full_path(request.cr, request.uid,
+                                              attachment.store_fname)
+        filename = attachment.datas_fname
+        mimetype, encoding = mimetypes.guess_type(filename)
+        if encoding == 'gzip':
+            # not text/csv, the browser must not decompress the download
+            mimetype = 'application/gzip'
+        mimetype = mimetype or 'application/octet-stream'
+        return http.send_file(full_path, mimetype=mimetype,
+                              as_attachment=True, filename=filename)
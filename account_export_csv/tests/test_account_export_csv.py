@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+import csv
+import datetime
+import gzip
+import hashlib
+import zipfile
+from cStringIO import StringIO
+
+from psycopg2.extensions import TransactionRollbackError
+
+import openerp.tests.common as common
+from openerp import tools
+
+from ..wizard import account_export_csv
+
+
+def _canonical(value):
+    """
+    Return a cell as the sequential export writes it, whatever the export
+    it comes from: empty and zero values as empty strings, numbers as floats
+    """
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return tools.ustr(value or u'')
+    return repr(round(number, 6)) if number else u''
+
+
+def _canonical_rows(rows):
+    return [[_canonical(value) for value in row] for row in rows]
+
+
+def _read_csv(content):
+    return [[value.decode('utf-8') for value in row]
+            for row in csv.reader(StringIO(content))]
+
+
+class test_account_export_csv(common.TransactionCase):
+
+    def setUp(self):
+        super(test_account_export_csv, self).setUp()
+        cr, uid = self.cr, self.uid
+        self.wizard_obj = self.registry('account.csv.export')
+        self.attachment_obj = self.registry('ir.attachment')
+        period_obj = self.registry('account.period')
+        self.period_ids = [self.ref('account.period_1'),
+                           self.ref('account.period_2'),
+                           self.ref('account.period_3')]
+        self.descriptions = []
+        # one entry in each period, so the export has several partitions
+        for period in period_obj.browse(cr, uid, self.period_ids):
+            self._create_move(cr, period)
+        self.last_period_code = period.code
+        self.wizard_values = {
+            'fiscalyear_id': self.ref('account.data_fiscalyear'),
+            'periods': [(6, 0, self.period_ids)],
+            'journal_ids': [(6, 0, [
+                self.ref('account.miscellaneous_journal')])],
+        }
+
+    def _create_move(self, cr, period):
+        debit_name = u'Débit "%s", test' % period.code
+        credit_name = u'Crédit %s' % period.code
+        self.descriptions += [debit_name, credit_name]
+        return self.registry('account.move').create(cr, self.uid, {
+            'journal_id': self.ref('account.miscellaneous_journal'),
+            'period_id': period.id,
+            'date': period.date_start,
+            'ref': u'CSV export %s' % period.code,
+            'line_id': [
+                (0, 0, {'name': debit_name,
+                        'account_id': self.ref('account.a_recv'),
+                        'partner_id': self.ref('base.res_partner_2'),
+                        'date': period.date_start,
+                        'debit': 1234.56,
+                        'credit': 0.0}),
+                (0, 0, {'name': credit_name,
+                        'account_id': self.ref('account.a_sale'),
+                        'date': period.date_start,
+                        'debit': 0.0,
+                        'credit': 1234.56}),
+            ]})
+
+    def _create_wizard(self, **values):
+        return self.wizard_obj.create(self.cr, self.uid,
+                                      dict(self.wizard_values, **values))
+
+    def _export(self, progress=None, **values):
+        """
+        Export the journal entries of the fixture with a wizard of the
+        given values, return the attachment and the content of its file
+        """
+        wizard_id = self._create_wizard(**values)
+        attachment_id = self.wizard_obj._write_attachment(
+            self.cr, self.uid, [wizard_id], 'journal_entries',
+            progress=progress)
+        attachment = self.attachment_obj.browse(self.cr, self.uid,
+                                                attachment_id)
+        full_path = self.attachment_obj._full_path(self.cr, self.uid,
+                                                   attachment.store_fname)
+        with open(full_path, 'rb') as f:
+            content = f.read()
+        return attachment, content
+
+    def _check_fixture(self, rows):
+        descriptions = [row[5] for row in rows[1:]]
+        for description in self.descriptions:
+            self.assertIn(description, descriptions)
+
+    def test_copy(self):
+        attachment, expected = self._export()
+        attachment, content = self._export(use_copy=True)
+        # PostgreSQL writes the lines, with its own line terminator and
+        # number formatting, the values are the same
+        self.assertNotIn('\r\n', content)
+        rows = _read_csv(content)
+        expected_rows = _read_csv(expected)
+        self.assertEqual(rows[0], expected_rows[0])
+        self._check_fixture(rows)
+        self.assertEqual(_canonical_rows(rows),
+                         _canonical_rows(expected_rows))
+
+    def test_filestore(self):
+        wizard_id = self._create_wizard()
+        self.wizard_obj.action_manual_export_journal_entries(
+            self.cr, self.uid, [wizard_id])
+        wizard = self.wizard_obj.browse(self.cr, self.uid, wizard_id)
+        self.assertEqual(wizard.state, 'done')
+        attachment = wizard.attachment_id
+        self.assertEqual(attachment.datas_fname, 'account_export.csv')
+        self.assertEqual(attachment.res_model, 'account.csv.export')
+        self.assertEqual(attachment.res_id, wizard_id)
+        # the file is written in the filestore, named after its content
+        full_path = self.attachment_obj._full_path(self.cr, self.uid,
+                                                   attachment.store_fname)
+        with open(full_path, 'rb') as f:
+            content = f.read()
+        sha = hashlib.sha1(content).hexdigest()
+        self.assertEqual(attachment.store_fname, sha[:2] + '/' + sha)
+        self.assertEqual(attachment.file_size, len(content))
+        self.assertEqual(attachment.datas.decode('base64'), content)
+        rows = _read_csv(content)
+        self.assertEqual(
+            rows[0], self.wizard_obj._get_header_journal_entries(
+                self.cr, self.uid, [wizard_id]))
+        self._check_fixture(rows)
+        # removing the wizard removes its export
+        self.wizard_obj.unlink(self.cr, self.uid, [wizard_id])
+        self.assertFalse(self.attachment_obj.search(
+            self.cr, self.uid, [('id', '=', attachment.id)]))
+
+    def test_progress(self):
+        class RecordedProgress(account_export_csv.AccountExportProgress):
+            interval = 0
+
+            def write(self, values):
+                self.writes.append(values)
+
+        progress = RecordedProgress(self.cr.dbname, 0)
+        progress.writes = []
+        attachment, content = self._export(progress=progress)
+        # same file as without progress
+        attachment, expected = self._export()
+        self.assertEqual(content, expected)
+        rows = _read_csv(content)
+        self.assertEqual(progress.lines, len(rows))
+        self.assertEqual(progress.period, self.last_period_code)
+        self.assertTrue(progress.writes)
+        self.assertEqual(progress.writes[-1]['progress_period'],
+                         self.last_period_code)
+
+    def test_progress_conflict(self):
+        class ConflictProgress(account_export_csv.AccountExportProgress):
+            heartbeat = 0.01
+
+            def _write(self, values):
+                self.attempts.append(values)
+                if values and self.conflicts:
+                    self.conflicts -= 1
+                    raise TransactionRollbackError()
+
+        progress = ConflictProgress(self.cr.dbname, 0)
+        progress.attempts = []
+        progress.conflicts = 1
+        progress.start_heartbeat()
+        progress.stop_heartbeat()
+        # the heartbeat is over once stopped, it writes nothing more
+        self.assertIsNone(progress._heartbeat_thread)
+        attempts = len(progress.attempts)
+        # an update conflicting with a concurrent one is tried again
+        progress.write({'state': 'done'})
+        self.assertEqual(progress.attempts[attempts:],
+                         [{'state': 'done'}, {'state': 'done'}])
+
+    def test_stale_job(self):
+        stale_id = self._create_wizard(state='running')
+        running_id = self._create_wizard(state='running')
+        self.cr.execute("UPDATE account_csv_export "
+                        "SET write_date = now() at time zone 'UTC' "
+                        "    - interval '1 hour' WHERE id = %s",
+                        (stale_id,))
+        self.wizard_obj.action_refresh(self.cr, self.uid, [stale_id])
+        self.wizard_obj.action_refresh(self.cr, self.uid, [running_id])
+        stale, running = self.wizard_obj.browse(self.cr, self.uid,
+                                                [stale_id, running_id])
+        self.assertEqual(stale.state, 'failed')
+        self.assertTrue(stale.error_message)
+        self.assertEqual(running.state, 'running')
+
+    def test_parallel(self):
+        self.registry('ir.config_parameter').set_param(
+            self.cr, self.uid, 'account_export_csv.export_workers', '2')
+        for use_copy in (False, True):
+            attachment, expected = self._export(use_copy=use_copy)
+            # the fixture is not committed, so the threads would not read
+            # it: the export falls back to the sequential one
+            attachment, content = self._export(use_copy=use_copy,
+                                               parallel=True)
+            self.assertEqual(content, expected)
+            wizard_id = attachment.res_id
+            self.assertFalse(self.wizard_obj._write_data_parallel(
+                self.cr, self.uid, [wizard_id], 'journal_entries',
+                StringIO()))
+            # the partitions of the threads, read on the same cursor, put
+            # together are the sequential export
+            export_params = self.wizard_obj._get_export_params(
+                self.cr, self.uid, [wizard_id])
+            partitions = self.wizard_obj._get_partitions(
+                self.cr, self.uid, export_params[1])
+            self.assertEqual(len(partitions), 3)
+            file_data = StringIO()
+            file_data.write(expected.splitlines(True)[0])
+            for date_from, date_to in partitions:
+                self.wizard_obj._write_lines(
+                    self.cr, self.uid, [wizard_id], 'journal_entries',
+                    file_data, export_params, use_copy,
+                    date_from=date_from, date_to=date_to)
+            self.assertEqual(file_data.getvalue(), expected)
+
+    def test_parallel_threads(self):
+        # the threads only read what is committed: the entries and the
+        # wizards of this test are committed by a cursor of its own, in
+        # periods the entries of setUp are not in, and removed at the end
+        cr, uid = self.registry.cursor(), self.uid
+        self.addCleanup(cr.close)
+        period_ids = [self.ref('account.period_4'),
+                      self.ref('account.period_5'),
+                      self.ref('account.period_6')]
+        param_obj = self.registry('ir.config_parameter')
+        workers = param_obj.get_param(cr, uid,
+                                      'account_export_csv.export_workers')
+        param_obj.set_param(cr, uid, 'account_export_csv.export_workers',
+                            '2')
+        first_description = len(self.descriptions)
+        move_ids = [self._create_move(cr, period)
+                    for period in self.registry('account.period').browse(
+                        cr, uid, period_ids)]
+        descriptions = self.descriptions[first_description:]
+        wizard_ids = [
+            self.wizard_obj.create(cr, uid, dict(
+                self.wizard_values, periods=[(6, 0, period_ids)],
+                parallel=True, use_copy=use_copy))
+            for use_copy in (False, True)]
+        cr.commit()
+        self.addCleanup(self._remove_committed, cr, move_ids, wizard_ids,
+                        workers)
+
+        read_cr = self.registry.cursor()
+        self.addCleanup(read_cr.close)
+        self.assertFalse(self.wizard_obj._has_written(read_cr))
+        for wizard_id, use_copy in zip(wizard_ids, (False, True)):
+            expected = StringIO()
+            if use_copy:
+                self.wizard_obj._copy_data(read_cr, uid, [wizard_id],
+                                           'journal_entries', expected)
+            else:
+                account_export_csv.AccountUnicodeWriter(expected).writerows(
+                    self.wizard_obj.get_data(read_cr, uid, [wizard_id],
+                                             'journal_entries'))
+            content = StringIO()
+            self.assertTrue(self.wizard_obj._write_data_parallel(
+                read_cr, uid, [wizard_id], 'journal_entries', content))
+            self.assertEqual(content.getvalue(), expected.getvalue())
+            rows = _read_csv(content.getvalue())
+            for description in descriptions:
+                self.assertIn(description, [row[5] for row in rows[1:]])
+
+    def _remove_committed(self, cr, move_ids, wizard_ids, workers):
+        cr.rollback()
+        self.wizard_obj.unlink(cr, self.uid, wizard_ids)
+        self.registry('account.move').unlink(cr, self.uid, move_ids)
+        self.registry('ir.config_parameter').set_param(
+            cr, self.uid, 'account_export_csv.export_workers', workers)
+        cr.commit()
+
+    def test_compression(self):
+        attachment, expected = self._export()
+        attachment, content = self._export(compression='gzip')
+        self.assertEqual(attachment.datas_fname, 'account_export.csv.gz')
+        self.assertEqual(
+            gzip.GzipFile(fileobj=StringIO(content)).read(), expected)
+        attachment, content = self._export(compression='zip')
+        self.assertEqual(attachment.datas_fname, 'account_export.csv.zip')
+        zip_file = zipfile.ZipFile(StringIO(content))
+        self.assertIsNone(zip_file.testzip())
+        self.assertEqual(zip_file.namelist(), ['account_export.csv'])
+        self.assertEqual(zip_file.read('account_export.csv'), expected)
+
+    def test_columnar(self):
+        pyarrow = account_export_csv.pyarrow
+        if pyarrow is None:
+            self.skipTest('pyarrow is not installed')
+        attachment, expected = self._export()
+        expected_rows = _read_csv(expected)
+        attachment, content = self._export(export_format='parquet')
+        self.assertEqual(attachment.datas_fname, 'account_export.parquet')
+        table = pyarrow.parquet.read_table(pyarrow.BufferReader(content))
+        self._check_table(table, expected_rows)
+        attachment, content = self._export(export_format='arrow')
+        self.assertEqual(attachment.datas_fname, 'account_export.arrow')
+        table = pyarrow.RecordBatchFileReader(
+            pyarrow.BufferReader(content)).read_all()
+        self._check_table(table, expected_rows)
+
+    def _check_table(self, table, expected_rows):
+        self.assertEqual(table.schema.names, expected_rows[0])
+        rows = zip(*[table.column(index).to_pylist()
+                     for index in range(table.num_columns)])
+        self.assertEqual(_canonical_rows(rows),
+                         _canonical_rows(expected_rows[1:]))
@@ -21,17 +21,60 @@
 #
 ##############################################################################
 
+import datetime
+import gzip
 import itertools
+import hashlib
+import logging
+import os
+import random
+import shutil
 import tempfile
+import struct
+import threading
+import time
+import zipfile
+import zlib
+from contextlib import closing
 from cStringIO import StringIO
-import base64
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
 
 import csv
 import codecs
+from psycopg2.extensions import TransactionRollbackError
 
+import openerp
+from openerp import api, sql_db, tools, SUPERUSER_ID
 from openerp.osv import orm, fields
 from openerp.tools.translate import _
 
+_logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# PostgreSQL type codes of the columns written with a type of their own in
+# the columnar exports, the other columns are written as strings
+PG_DATE = 1082
+PG_FLOATS = (700, 701, 1700)
+PG_INTEGERS = (20, 21, 23)
+PG_BOOLEAN = 16
+
+# semaphores limiting the exports running in background, by limit
+_job_semaphores = {}
+_job_semaphores_lock = threading.Lock()
+
+
+def _get_job_semaphore(limit):
+    with _job_semaphores_lock:
+        if limit not in _job_semaphores:
+            _job_semaphores[limit] = threading.BoundedSemaphore(limit)
+        return _job_semaphores[limit]
+
 
 class AccountUnicodeWriter(object):
 
@@ -71,12 +114,253 @@ class AccountUnicodeWriter(object):
             self.writerow(row)
 
 
+class AccountExportFile(object):
+
+    """
+    A file-like object writing an export to the file "f" while computing
+    the sha1 of its content, which gives its name in the filestore
+    """
+
+    def __init__(self, f):
+        self.stream = f
+        self.sha1 = hashlib.sha1()
+        self.size = 0
+
+    def write(self, data):
+        self.sha1.update(data)
+        self.size += len(data)
+        self.stream.write(data)
+
+    def tell(self):
+        return self.size
+
+    def flush(self):
+        self.stream.flush()
+
+    def close(self):
+        self.stream.flush()
+
+
+def _arrow_type(type_code):
+    """Return the Arrow type of a column of PostgreSQL type type_code"""
+    if type_code == PG_DATE:
+        return pyarrow.date32()
+    elif type_code in PG_FLOATS:
+        return pyarrow.float64()
+    elif type_code in PG_INTEGERS:
+        return pyarrow.int64()
+    elif type_code == PG_BOOLEAN:
+        return pyarrow.bool_()
+    return pyarrow.string()
+
+
+def _arrow_column(values, type_code):
+    """
+    Return the Arrow array of the values of a column of type type_code,
+    as returned by the OpenERP cursors (dates as strings, numerics as floats)
+    """
+    if type_code == PG_DATE:
+        values = [value and datetime.date(*map(int, value.split('-')))
+                  for value in values]
+    elif not (type_code in PG_FLOATS or type_code in PG_INTEGERS or
+              type_code == PG_BOOLEAN):
+        values = [value if value is None else tools.ustr(value)
+                  for value in values]
+    return pyarrow.array(values, type=_arrow_type(type_code))
+
+
+class AccountExportCounter(object):
+
+    """
+    A file-like object writing to the file "f" and counting the lines
+    written for the progress of the export
+    """
+
+    def __init__(self, f, progress):
+        self.stream = f
+        self.progress = progress
+
+    def write(self, data):
+        self.stream.write(data)
+        self.progress.update(lines=data.count('\n'))
+
+
+class AccountExportZipFile(object):
+
+    """
+    A file-like object compressing what is written to it as the single
+    member "arcname" of a zip archive written to the file "f".
+
+    The archive is streamed: the crc and the sizes of the member are only
+    known at the end, so they are written after its data (data descriptor).
+    """
+
+    # without the zip64 extensions, which not all the tools read
+    max_size = 0xFFFFFFFF
+
+    def __init__(self, f, arcname):
+        self.stream = f
+        if isinstance(arcname, unicode):
+            arcname = arcname.encode('utf-8')
+        self.arcname = arcname
+        date_time = time.localtime()[:6]
+        self.dosdate = ((date_time[0] - 1980) << 9 | date_time[1] << 5 |
+                        date_time[2])
+        self.dostime = (date_time[3] << 11 | date_time[4] << 5 |
+                        date_time[5] // 2)
+        # data descriptor, utf-8 file name
+        self.flag_bits = 0x08 | 0x800
+        self.compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION,
+                                           zlib.DEFLATED, -15)
+        self.crc = 0
+        self.file_size = 0
+        self.compress_size = 0
+        self.offset = 0
+        self._write(struct.pack(zipfile.structFileHeader,
+                                zipfile.stringFileHeader,
+                                20, 0, self.flag_bits, zipfile.ZIP_DEFLATED,
+                                self.dostime, self.dosdate, 0, 0, 0,
+                                len(self.arcname), 0) + self.arcname)
+
+    def _write(self, data):
+        self.stream.write(data)
+        self.offset += len(data)
+
+    def _write_compressed(self, data):
+        self.compress_size += len(data)
+        if self.compress_size > self.max_size:
+            raise orm.except_orm(
+                _('Error'),
+                _('The export is too large for a zip file, use gzip.'))
+        self._write(data)
+
+    def write(self, data):
+        if not data:
+            return
+        self.crc = zlib.crc32(data, self.crc) & 0xFFFFFFFF
+        self.file_size += len(data)
+        if self.file_size > self.max_size:
+            raise orm.except_orm(
+                _('Error'),
+                _('The export is too large for a zip file, use gzip.'))
+        self._write_compressed(self.compressor.compress(data))
+
+    def close(self):
+        self._write_compressed(self.compressor.flush())
+        self._write(struct.pack('<4s3L', 'PK\x07\x08', self.crc,
+                                self.compress_size, self.file_size))
+        central_dir_offset = self.offset
+        central_dir = struct.pack(
+            zipfile.structCentralDir, zipfile.stringCentralDir,
+            20, 3, 20, 0, self.flag_bits, zipfile.ZIP_DEFLATED,
+            self.dostime, self.dosdate, self.crc, self.compress_size,
+            self.file_size, len(self.arcname), 0, 0, 0, 0,
+            0644 << 16, 0) + self.arcname
+        self._write(central_dir)
+        self._write(struct.pack(zipfile.structEndArchive,
+                                zipfile.stringEndArchive,
+                                0, 0, 1, 1, len(central_dir),
+                                central_dir_offset, 0))
+
+
+class AccountExportProgress(object):
+
+    """
+    Report the progress of an export running in background on its wizard,
+    with a cursor of its own so the user sees it while the export runs
+    """
+
+    # seconds between two updates of the wizard
+    interval = 2
+    # seconds between two signs of life of the job, even when it does not
+    # write lines (waiting for its turn, long queries)
+    heartbeat = 10
+    # attempts of an update of the wizard conflicting with a concurrent one
+    # (the heartbeat and the job update the same row)
+    write_attempts = 5
+
+    def __init__(self, dbname, wizard_id):
+        self.dbname = dbname
+        self.wizard_id = wizard_id
+        self.lines = 0
+        self.period = None
+        self._last_update = 0
+        self._stopped = threading.Event()
+        self._heartbeat_thread = None
+
+    def start_heartbeat(self):
+        """Touch the wizard regularly while the job is alive, a wizard left
+        running without it is failed on the next refresh"""
+        def beat():
+            while not self._stopped.wait(self.heartbeat):
+                try:
+                    self.write({})
+                except Exception:
+                    _logger.exception('Accounting CSV export %s heartbeat',
+                                      self.wizard_id)
+        thread = threading.Thread(
+            target=beat,
+            name='account_export_csv.%s.heartbeat' % self.wizard_id)
+        thread.daemon = True
+        thread.start()
+        self._heartbeat_thread = thread
+
+    def stop_heartbeat(self):
+        """Stop the heartbeat and wait for its last update, so it does not
+        conflict with the final update of the job"""
+        self._stopped.set()
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join()
+            self._heartbeat_thread = None
+
+    def update(self, lines=0, period=None, force=False):
+        self.lines += lines
+        if period:
+            self.period = period
+        if force or time.time() - self._last_update >= self.interval:
+            self._last_update = time.time()
+            self.write({'progress_rows': self.lines,
+                        'progress_period': self.period})
+
+    def track(self, rows, period_column):
+        """Follow the period of the rows written"""
+        for row in rows:
+            self.update(period=row[period_column])
+            yield row
+
+    def write(self, values):
+        for attempt in xrange(1, self.write_attempts + 1):
+            try:
+                return self._write(values)
+            except TransactionRollbackError:
+                if attempt == self.write_attempts:
+                    raise
+                _logger.info('Accounting CSV export %s: concurrent update '
+                             'of the wizard, retrying', self.wizard_id)
+                time.sleep(random.uniform(0.0, 0.5 * attempt))
+
+    def _write(self, values):
+        # plain SQL in its own transaction: the export transaction never
+        # writes the wizard, which would conflict with these updates
+        columns = sorted(values)
+        with closing(sql_db.db_connect(self.dbname).cursor()) as cr:
+            cr.execute("UPDATE account_csv_export "
+                       "SET " + ", ".join(
+                           ["write_date = now() at time zone 'UTC'"] +
+                           ["%s = %%s" % column for column in columns]) +
+                       " WHERE id = %s",
+                       [values[column] for column in columns] +
+                       [self.wizard_id])
+            cr.commit()
+
+
 class AccountCSVExport(orm.TransientModel):
     _name = 'account.csv.export'
     _description = 'Export Accounting'
 
     _columns = {
-        'data': fields.binary('CSV', readonly=True),
+        'attachment_id': fields.many2one('ir.attachment', 'Export File',
+                                         readonly=True),
         'company_id': fields.many2one('res.company', 'Company',
                                       invisible=True),
         'fiscalyear_id': fields.many2one('account.fiscalyear', 'Fiscalyear',
@@ -93,6 +377,45 @@ class AccountCSVExport(orm.TransientModel):
             'Journals',
             help='If empty, use all journals, only used for journal entries'),
         'export_filename': fields.char('Export CSV Filename', size=128),
+        'run_in_background': fields.boolean(
+            'Run in Background',
+            help="Generate the file in background, the wizard shows the "
+                 "progress of the export and the file can be downloaded "
+                 "once it is done."),
+        'state': fields.selection([('draft', 'Draft'),
+                                   ('running', 'Running'),
+                                   ('done', 'Done'),
+                                   ('failed', 'Failed')],
+                                  'State', readonly=True),
+        'progress_rows': fields.integer('Lines Written', readonly=True),
+        'progress_period': fields.char('Current Period', readonly=True),
+        'error_message': fields.text('Error', readonly=True),
+        'parallel': fields.boolean(
+            'Export Periods in Parallel',
+            help="Read the journal entries of the periods at the same time, "
+                 "each on its own database connection. The file is the "
+                 "same as the one of a sequential export."),
+        'export_format': fields.selection(
+            [('csv', 'CSV'),
+             ('parquet', 'Parquet'),
+             ('arrow', 'Arrow')],
+            'File Format',
+            help="Parquet and Arrow files hold typed columns (dates, "
+                 "amounts, numbers) and are read directly by the data "
+                 "analysis tools. They need the pyarrow python library."),
+        'compression': fields.selection(
+            [('none', 'None'),
+             ('gzip', 'gzip'),
+             ('zip', 'zip')],
+            'Compression',
+            help="Compress the file as it is generated, the journal entries "
+                 "exports are about ten times smaller."),
+        'use_copy': fields.boolean(
+            'Fast Export',
+            help="Let PostgreSQL write the lines of the file (COPY), which "
+                 "is much faster on large exports. The amounts are written "
+                 "as stored in the database, zero amounts included, and "
+                 "the lines end with a line feed only."),
     }
 
     def _get_company_default(self, cr, uid, context=None):
@@ -109,30 +432,26 @@ class AccountCSVExport(orm.TransientModel):
 
     _defaults = {'company_id': _get_company_default,
                  'fiscalyear_id': _get_fiscalyear_default,
-                 'export_filename': 'account_export.csv'}
+                 'export_filename': 'account_export.csv',
+                 'export_format': 'csv',
+                 'compression': 'none',
+                 'state': 'draft'}
+
+    # suffix of the file name of the compressed exports
+    _compression_suffixes = {'gzip': '.gz', 'zip': '.zip'}
+
+    # rows of a row group (Parquet) or record batch (Arrow)
+    _columnar_batch_size = 65536
+
+    # column of the rows giving their period, to report the progress
+    _period_columns = {'journal_entries': 18}
+
+    # seconds without sign of life after which a background export is
+    # considered dead, see AccountExportProgress.heartbeat
+    _job_stale_delay = 60
 
     def action_manual_export_account(self, cr, uid, ids, context=None):
-        this = self.browse(cr, uid, ids)[0]
-        rows = self.get_data(cr, uid, ids, "account", context)
-        file_data = StringIO()
-        try:
-            writer = AccountUnicodeWriter(file_data)
-            writer.writerows(rows)
-            file_value = file_data.getvalue()
-            self.write(cr, uid, ids,
-                       {'data': base64.encodestring(file_value)},
-                       context=context)
-        finally:
-            file_data.close()
-        return {
-            'type': 'ir.actions.act_window',
-            'res_model': 'account.csv.export',
-            'view_mode': 'form',
-            'view_type': 'form',
-            'res_id': this.id,
-            'views': [(False, 'form')],
-            'target': 'new',
-        }
+        return self._export(cr, uid, ids, "account", context=context)
 
     def _get_header_account(self, cr, uid, ids, context=None):
         return [_(u'CODE'),
@@ -142,15 +461,15 @@ class AccountCSVExport(orm.TransientModel):
                 _(u'BALANCE'),
                 ]
 
-    def _get_rows_account(self, cr, uid, ids,
-                          fiscalyear_id,
-                          period_range_ids,
-                          journal_ids,
-                          context=None):
+    def _get_query_account(self, cr, uid, ids,
+                           fiscalyear_id,
+                           period_range_ids,
+                           journal_ids,
+                           context=None):
         """
-        Return list to generate rows of the CSV file
+        Return the query and its parameters selecting the rows of the CSV file
         """
-        cr.execute("""
+        return ("""
                 select ac.code,ac.name,
                 sum(debit) as sum_debit,
                 sum(credit) as sum_credit,
@@ -160,10 +479,23 @@ class AccountCSVExport(orm.TransientModel):
                 and period_id in %(period_ids)s
                 group by ac.id,ac.code,ac.name
                 order by ac.code
-                   """,
-                   {'fiscalyear_id': fiscalyear_id,
-                       'period_ids': tuple(period_range_ids)}
-                   )
+                """,
+                {'fiscalyear_id': fiscalyear_id,
+                 'period_ids': tuple(period_range_ids)})
+
+    def _get_rows_account(self, cr, uid, ids,
+                          fiscalyear_id,
+                          period_range_ids,
+                          journal_ids,
+                          context=None):
+        """
+        Return list to generate rows of the CSV file
+        """
+        cr.execute(*self._get_query_account(cr, uid, ids,
+                                            fiscalyear_id,
+                                            period_range_ids,
+                                            journal_ids,
+                                            context=context))
         res = cr.fetchall()
 
         rows = []
@@ -172,27 +504,7 @@ class AccountCSVExport(orm.TransientModel):
         return rows
 
     def action_manual_export_analytic(self, cr, uid, ids, context=None):
-        this = self.browse(cr, uid, ids)[0]
-        rows = self.get_data(cr, uid, ids, "analytic", context)
-        file_data = StringIO()
-        try:
-            writer = AccountUnicodeWriter(file_data)
-            writer.writerows(rows)
-            file_value = file_data.getvalue()
-            self.write(cr, uid, ids,
-                       {'data': base64.encodestring(file_value)},
-                       context=context)
-        finally:
-            file_data.close()
-        return {
-            'type': 'ir.actions.act_window',
-            'res_model': 'account.csv.export',
-            'view_mode': 'form',
-            'view_type': 'form',
-            'res_id': this.id,
-            'views': [(False, 'form')],
-            'target': 'new',
-        }
+        return self._export(cr, uid, ids, "analytic", context=context)
 
     def _get_header_analytic(self, cr, uid, ids, context=None):
         return [_(u'ANALYTIC CODE'),
@@ -204,15 +516,15 @@ class AccountCSVExport(orm.TransientModel):
                 _(u'BALANCE'),
                 ]
 
-    def _get_rows_analytic(self, cr, uid, ids,
-                           fiscalyear_id,
-                           period_range_ids,
-                           journal_ids,
-                           context=None):
+    def _get_query_analytic(self, cr, uid, ids,
+                            fiscalyear_id,
+                            period_range_ids,
+                            journal_ids,
+                            context=None):
         """
-        Return list to generate rows of the CSV file
+        Return the query and its parameters selecting the rows of the CSV file
         """
-        cr.execute("""  select aac.code as analytic_code,
+        return ("""  select aac.code as analytic_code,
                         aac.name as analytic_name,
                         ac.code,ac.name,
                         sum(debit) as sum_debit,
@@ -226,10 +538,23 @@ class AccountCSVExport(orm.TransientModel):
                         and account_move_line.period_id in %(period_ids)s
                         group by aac.id,aac.code,aac.name,ac.id,ac.code,ac.name
                         order by aac.code
-                   """,
-                   {'fiscalyear_id': fiscalyear_id,
-                       'period_ids': tuple(period_range_ids)}
-                   )
+                """,
+                {'fiscalyear_id': fiscalyear_id,
+                 'period_ids': tuple(period_range_ids)})
+
+    def _get_rows_analytic(self, cr, uid, ids,
+                           fiscalyear_id,
+                           period_range_ids,
+                           journal_ids,
+                           context=None):
+        """
+        Return list to generate rows of the CSV file
+        """
+        cr.execute(*self._get_query_analytic(cr, uid, ids,
+                                             fiscalyear_id,
+                                             period_range_ids,
+                                             journal_ids,
+                                             context=context))
         res = cr.fetchall()
 
         rows = []
@@ -239,46 +564,235 @@ class AccountCSVExport(orm.TransientModel):
 
     def action_manual_export_journal_entries(self, cr, uid, ids, context=None):
         """
-        Here we use TemporaryFile to avoid full filling the OpenERP worker
-        Memory
-        We also write the data to the wizard with SQL query as write seems
-        to use too much memory as well.
+        The lines are written as they are fetched to a file of the
+        filestore, attached to the wizard, and downloaded by chunks from the
+        /account_export_csv/download controller, so neither the OpenERP
+        worker memory nor the database ever hold the whole file.
 
-        Those improvements permitted to improve the export from a 100k line to
-        200k lines
-        with default `limit_memory_hard = 805306368` (768MB) with more lines,
-        you might encounter a MemoryError when trying to download the file even
-        if it has been generated.
+        The fast export (COPY) writes the lines without going through
+        python at all.
+        """
+        return self._export(cr, uid, ids, "journal_entries", context=context)
 
-        To be able to export bigger volume of data, it is advised to set
-        limit_memory_hard to 2097152000 (2 GB) to generate the file and let
-        OpenERP load it in the wizard when trying to download it.
+    def _export(self, cr, uid, ids, result_type, context=None):
+        this = self.browse(cr, uid, ids)[0]
+        if this.run_in_background:
+            self.write(cr, uid, ids, {'state': 'running',
+                                      'attachment_id': False,
+                                      'progress_rows': 0,
+                                      'progress_period': False,
+                                      'error_message': False},
+                       context=context)
+            # the job reads the wizard with its own cursor
+            cr.commit()
+            job = threading.Thread(
+                target=self._export_job,
+                args=(cr.dbname, uid, this.id, result_type, context),
+                name='account_export_csv.%s' % this.id)
+            job.start()
+        else:
+            attachment_id = self._write_attachment(cr, uid, ids, result_type,
+                                                   context=context)
+            self.write(cr, uid, ids, {'attachment_id': attachment_id,
+                                      'state': 'done'},
+                       context=context)
+        return self.action_refresh(cr, uid, ids, context=context)
 
-        Tested with up to a generation of 700k entry lines
+    def _fail_stale_jobs(self, cr, uid, ids, context=None):
         """
-        this = self.browse(cr, uid, ids)[0]
-        rows = self.get_data(cr, uid, ids, "journal_entries", context)
-        with tempfile.TemporaryFile() as file_data:
-            writer = AccountUnicodeWriter(file_data)
-            writer.writerows(rows)
-            with tempfile.TemporaryFile() as base64_data:
-                file_data.seek(0)
-                base64.encode(file_data, base64_data)
-                base64_data.seek(0)
-                cr.execute("""
-                UPDATE account_csv_export
-                SET data = %s
-                WHERE id = %s""", (base64_data.read(), ids[0]))
+        Fail the background exports of which the job stopped giving signs
+        of life: the server process running it was stopped or recycled
+        (limit_time_real, limit_memory_hard) before the export was done
+        """
+        cr.execute("SELECT id FROM account_csv_export "
+                   "WHERE id IN %s AND state = 'running' "
+                   "AND write_date < now() at time zone 'UTC' "
+                   "    - %s * interval '1 second'",
+                   (tuple(ids), self._job_stale_delay))
+        stale_ids = [row[0] for row in cr.fetchall()]
+        if stale_ids:
+            _logger.warning('Accounting CSV exports %s stopped without '
+                            'finishing', stale_ids)
+            self.write(cr, uid, stale_ids,
+                       {'state': 'failed',
+                        'error_message': _(
+                            "The export stopped without finishing, the "
+                            "server process running it was probably "
+                            "restarted. Please run it again.")},
+                       context=context)
+
+    def action_refresh(self, cr, uid, ids, context=None):
+        self._fail_stale_jobs(cr, uid, ids, context=context)
         return {
             'type': 'ir.actions.act_window',
             'res_model': 'account.csv.export',
             'view_mode': 'form',
             'view_type': 'form',
-            'res_id': this.id,
+            'res_id': ids[0],
             'views': [(False, 'form')],
             'target': 'new',
         }
 
+    def _export_job(self, dbname, uid, wizard_id, result_type,
+                    context=None):
+        """
+        Generate the file of an export in background, at most
+        account_export_csv.max_jobs (system parameter, 2 by default) exports
+        run at the same time
+        """
+        with api.Environment.manage():
+            registry = openerp.registry(dbname)
+            with closing(registry.cursor()) as cr:
+                limit = self.pool['ir.config_parameter'].get_param(
+                    cr, SUPERUSER_ID, 'account_export_csv.max_jobs',
+                    default='2')
+            progress = AccountExportProgress(dbname, wizard_id)
+            progress.start_heartbeat()
+            try:
+                with _get_job_semaphore(max(int(limit), 1)):
+                    try:
+                        with closing(registry.cursor()) as cr:
+                            attachment_id = self._write_attachment(
+                                cr, uid, [wizard_id], result_type,
+                                progress=progress, context=context)
+                            cr.commit()
+                    except Exception, exc:
+                        _logger.exception('Accounting CSV export %s failed',
+                                          wizard_id)
+                        # the final state is written once the heartbeat
+                        # is stopped, so they do not conflict
+                        progress.stop_heartbeat()
+                        progress.write({'state': 'failed',
+                                        'error_message': tools.ustr(exc)})
+                    else:
+                        progress.stop_heartbeat()
+                        progress.write({'state': 'done',
+                                        'attachment_id': attachment_id,
+                                        'progress_rows': progress.lines,
+                                        'progress_period': progress.period})
+            finally:
+                progress.stop_heartbeat()
+
+    def _write_data(self, cr, uid, ids, result_type, file_data,
+                    progress=None, context=None):
+        this = self.browse(cr, uid, ids)[0]
+        if this.parallel and result_type == 'journal_entries' and \
+                self._write_data_parallel(cr, uid, ids, result_type,
+                                          file_data, context=context):
+            return
+        if this.use_copy:
+            self._copy_data(cr, uid, ids, result_type, file_data,
+                            context=context)
+        else:
+            writer = AccountUnicodeWriter(file_data)
+            rows = self.get_data(cr, uid, ids, result_type, context)
+            if progress is not None and \
+                    result_type in self._period_columns:
+                rows = itertools.chain(
+                    [next(rows)],  # header
+                    progress.track(rows, self._period_columns[result_type]))
+            writer.writerows(rows)
+
+    def _open_output(self, cr, uid, ids, file_data, context=None):
+        """
+        Return the file-like object the lines of the export are written to,
+        compressing them in file_data as they come if it is asked for
+        """
+        this = self.browse(cr, uid, ids)[0]
+        if this.compression == 'gzip':
+            # closing it does not close file_data
+            return gzip.GzipFile(filename='', mode='wb', fileobj=file_data)
+        elif this.compression == 'zip':
+            return AccountExportZipFile(
+                file_data, this.export_filename or 'account_export.csv')
+        return file_data
+
+    def _write_attachment(self, cr, uid, ids, result_type, progress=None,
+                          context=None):
+        """
+        Write the export in the filestore as it is generated and return the
+        attachment holding it
+        """
+        this = self.browse(cr, uid, ids)[0]
+        attachment_obj = self.pool['ir.attachment']
+        filestore = attachment_obj._filestore(cr, uid, context=context)
+        if not os.path.isdir(filestore):
+            os.makedirs(filestore)
+        # written in the filestore directory so it is moved, not copied,
+        # to its place once its content, thus its name, is known
+        fd, tmp_path = tempfile.mkstemp(prefix='account_export.',
+                                        dir=filestore)
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                file_data = AccountExportFile(tmp_file)
+                if this.export_format in ('parquet', 'arrow'):
+                    self._write_columnar(cr, uid, ids, result_type,
+                                         file_data, progress=progress,
+                                         context=context)
+                else:
+                    output = self._open_output(cr, uid, ids, file_data,
+                                               context=context)
+                    stream = output
+                    if progress is not None:
+                        stream = AccountExportCounter(output, progress)
+                    self._write_data(cr, uid, ids, result_type, stream,
+                                     progress=progress, context=context)
+                    output.close()
+            sha = file_data.sha1.hexdigest()
+            store_fname = sha[:2] + '/' + sha
+            full_path = attachment_obj._full_path(cr, uid, store_fname)
+            if os.path.exists(full_path):
+                os.unlink(tmp_path)
+            else:
+                if not os.path.isdir(os.path.dirname(full_path)):
+                    os.makedirs(os.path.dirname(full_path))
+                os.rename(tmp_path, full_path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        filename = this.export_filename or 'account_export.csv'
+        if this.export_format in ('parquet', 'arrow'):
+            filename = '%s.%s' % (os.path.splitext(filename)[0],
+                                  this.export_format)
+        else:
+            filename += self._compression_suffixes.get(this.compression, '')
+        attachment_id = attachment_obj.create(
+            cr, uid, {'name': filename,
+                      'datas_fname': filename,
+                      'res_model': self._name,
+                      'res_id': this.id,
+                      'type': 'binary'},
+            context=context)
+        # the file is already in the filestore, only link it, in SQL as
+        # ir.attachment.write() drops file_size from its values
+        cr.execute("UPDATE ir_attachment SET store_fname = %s, file_size = %s "
+                   "WHERE id = %s",
+                   (store_fname, file_data.size, attachment_id))
+        attachment_obj.invalidate_cache(cr, uid, ['store_fname', 'file_size'],
+                                        [attachment_id], context=context)
+        return attachment_id
+
+    def action_download(self, cr, uid, ids, context=None):
+        this = self.browse(cr, uid, ids)[0]
+        return {
+            'type': 'ir.actions.act_url',
+            'url': '/account_export_csv/download/%d' % this.attachment_id.id,
+            'target': 'self',
+        }
+
+    def unlink(self, cr, uid, ids, context=None):
+        attachment_ids = [this.attachment_id.id
+                          for this in self.browse(cr, uid, ids,
+                                                  context=context)
+                          if this.attachment_id]
+        res = super(AccountCSVExport, self).unlink(cr, uid, ids,
+                                                   context=context)
+        if attachment_ids:
+            self.pool['ir.attachment'].unlink(cr, uid, attachment_ids,
+                                              context=context)
+        return res
+
     def _get_header_journal_entries(self, cr, uid, ids, context=None):
         return [
             # Standard Sage export fields
@@ -310,15 +824,24 @@ class AccountCSVExport(orm.TransientModel):
             _(u'BANK STATEMENT'),
         ]
 
-    def _get_rows_journal_entries(self, cr, uid, ids,
-                                  fiscalyear_id,
-                                  period_range_ids,
-                                  journal_ids,
-                                  context=None):
+    def _get_query_journal_entries(self, cr, uid, ids,
+                                   fiscalyear_id,
+                                   period_range_ids,
+                                   journal_ids,
+                                   date_from=None,
+                                   date_to=None,
+                                   context=None):
         """
-        Create a generator of rows of the CSV file
+        Return the query and its parameters selecting the rows of the CSV file,
+        only the lines dated from date_from (included) to date_to (excluded)
+        when they are given
         """
-        cr.execute("""
+        date_filter = ""
+        if date_from:
+            date_filter += "AND account_move_line.date >= %(date_from)s "
+        if date_to:
+            date_filter += "AND account_move_line.date < %(date_to)s "
+        return ("""
         SELECT
           account_move_line.date AS date,
           account_journal.name as journal,
@@ -372,11 +895,31 @@ class AccountCSVExport(orm.TransientModel):
             (account_bank_statement.id=account_move_line.statement_id)
         WHERE account_period.id IN %(period_ids)s
         AND account_journal.id IN %(journal_ids)s
-        ORDER BY account_move_line.date
+        """ + date_filter + """
+        ORDER BY account_move_line.date, account_move_line.id
         """,
-                   {'period_ids': tuple(
-                       period_range_ids), 'journal_ids': tuple(journal_ids)}
-                   )
+                {'period_ids': tuple(period_range_ids),
+                 'journal_ids': tuple(journal_ids),
+                 'date_from': date_from,
+                 'date_to': date_to})
+
+    def _get_rows_journal_entries(self, cr, uid, ids,
+                                  fiscalyear_id,
+                                  period_range_ids,
+                                  journal_ids,
+                                  date_from=None,
+                                  date_to=None,
+                                  context=None):
+        """
+        Create a generator of rows of the CSV file
+        """
+        cr.execute(*self._get_query_journal_entries(cr, uid, ids,
+                                                    fiscalyear_id,
+                                                    period_range_ids,
+                                                    journal_ids,
+                                                    date_from=date_from,
+                                                    date_to=date_to,
+                                                    context=context))
         while 1:
             # http://initd.org/psycopg/docs/cursor.html#cursor.fetchmany
             # Set cursor.arraysize to minimize network round trips
@@ -387,10 +930,10 @@ class AccountCSVExport(orm.TransientModel):
             for row in rows:
                 yield row
 
-    def get_data(self, cr, uid, ids, result_type, context=None):
-        get_header_func = getattr(
-            self, ("_get_header_%s" % (result_type)), None)
-        get_rows_func = getattr(self, ("_get_rows_%s" % (result_type)), None)
+    def _get_export_params(self, cr, uid, ids, context=None):
+        """
+        Return the fiscal year, the periods and the journals to export
+        """
         form = self.browse(cr, uid, ids[0], context=context)
         fiscalyear_id = form.fiscalyear_id.id
         if form.periods:
@@ -407,6 +950,14 @@ class AccountCSVExport(orm.TransientModel):
         else:
             j_obj = self.pool.get("account.journal")
             journal_ids = j_obj.search(cr, uid, [], context=context)
+        return fiscalyear_id, period_range_ids, journal_ids
+
+    def get_data(self, cr, uid, ids, result_type, context=None):
+        get_header_func = getattr(
+            self, ("_get_header_%s" % (result_type)), None)
+        get_rows_func = getattr(self, ("_get_rows_%s" % (result_type)), None)
+        fiscalyear_id, period_range_ids, journal_ids = \
+            self._get_export_params(cr, uid, ids, context=context)
         rows = itertools.chain((get_header_func(cr, uid, ids,
                                                 context=context),),
                                get_rows_func(cr, uid, ids,
@@ -416,3 +967,216 @@ class AccountCSVExport(orm.TransientModel):
                                              context=context)
                                )
         return rows
+
+    def _copy_data(self, cr, uid, ids, result_type, file_data,
+                   context=None):
+        """
+        Write the CSV file with a COPY of the query selecting its rows,
+        PostgreSQL formats the lines and psycopg writes them straight to
+        file_data
+        """
+        get_header_func = getattr(
+            self, ("_get_header_%s" % (result_type)), None)
+        get_query_func = getattr(
+            self, ("_get_query_%s" % (result_type)), None)
+        fiscalyear_id, period_range_ids, journal_ids = \
+            self._get_export_params(cr, uid, ids, context=context)
+        # the header is translated, so it is not the one of COPY
+        writer = AccountUnicodeWriter(file_data, lineterminator='\n')
+        writer.writerow(get_header_func(cr, uid, ids, context=context))
+        query, params = get_query_func(cr, uid, ids,
+                                       fiscalyear_id,
+                                       period_range_ids,
+                                       journal_ids,
+                                       context=context)
+        cr.copy_expert("COPY (%s) TO STDOUT WITH CSV" %
+                       cr.mogrify(query, params), file_data)
+
+    def _get_export_workers(self, cr, uid, context=None):
+        """
+        Number of partitions of a parallel export read at the same time,
+        from the system parameter account_export_csv.export_workers (number
+        of processors by default)
+        """
+        workers = self.pool['ir.config_parameter'].get_param(
+            cr, SUPERUSER_ID, 'account_export_csv.export_workers')
+        try:
+            return max(int(workers), 1)
+        except (TypeError, ValueError):
+            return cpu_count()
+
+    def _get_partitions(self, cr, uid, period_range_ids, context=None):
+        """
+        Split the export in date ranges starting at the periods, as a list
+        of (date_from, date_to), date_to excluded, in date order. The first
+        and last ranges are open, so the lines dated out of their period
+        are exported too.
+        """
+        cr.execute("SELECT DISTINCT date_start FROM account_period "
+                   "WHERE id IN %s ORDER BY date_start",
+                   (tuple(period_range_ids),))
+        bounds = [row[0] for row in cr.fetchall()][1:]
+        return zip([None] + bounds, bounds + [None])
+
+    def _write_lines(self, cr, uid, ids, result_type, file_data,
+                     export_params, use_copy, date_from=None, date_to=None,
+                     context=None):
+        """
+        Write the lines of the journal entries dated from date_from to
+        date_to, without the header
+        """
+        fiscalyear_id, period_range_ids, journal_ids = export_params
+        if use_copy:
+            query, params = self._get_query_journal_entries(
+                cr, uid, ids, fiscalyear_id, period_range_ids, journal_ids,
+                date_from=date_from, date_to=date_to, context=context)
+            cr.copy_expert("COPY (%s) TO STDOUT WITH CSV" %
+                           cr.mogrify(query, params), file_data)
+        else:
+            writer = AccountUnicodeWriter(file_data)
+            writer.writerows(self._get_rows_journal_entries(
+                cr, uid, ids, fiscalyear_id, period_range_ids, journal_ids,
+                date_from=date_from, date_to=date_to, context=context))
+
+    @staticmethod
+    def _has_written(cr):
+        """Whether the transaction of cr has changed the database"""
+        if cr._cnx.server_version >= 100000:
+            cr.execute("SELECT txid_current_if_assigned() IS NOT NULL")
+        else:
+            # pg_stat_activity is read once per transaction otherwise
+            cr.execute("SELECT pg_stat_clear_snapshot()")
+            cr.execute("SELECT backend_xid IS NOT NULL "
+                       "FROM pg_stat_activity WHERE pid = pg_backend_pid()")
+        return cr.fetchone()[0]
+
+    def _write_data_parallel(self, cr, uid, ids, result_type, file_data,
+                             context=None):
+        """
+        Write the same file as a sequential export of the journal entries,
+        with the lines of each period read in a thread with its own cursor
+        and written to a temporary file, the files being appended to
+        file_data in date order as they are done.
+
+        The cursors of the threads import the snapshot of cr, so they read
+        the same lines as a sequential export would.
+
+        Return False when the export can not be split, or when the
+        transaction of cr has changes the threads would not see. The caller
+        then writes it sequentially.
+        """
+        this = self.browse(cr, uid, ids[0], context=context)
+        export_params = self._get_export_params(cr, uid, ids,
+                                                context=context)
+        partitions = self._get_partitions(cr, uid, export_params[1],
+                                          context=context)
+        workers = min(self._get_export_workers(cr, uid, context=context),
+                      len(partitions))
+        # snapshots can be exported since PostgreSQL 9.2, the transaction
+        # id of a backend is known since 9.4
+        if workers < 2 or cr._cnx.server_version < 90400:
+            return False
+        # the changes of the transaction of cr are not in its snapshot,
+        # the threads would not read them
+        if self._has_written(cr):
+            return False
+
+        use_copy = this.use_copy
+        if use_copy:
+            writer = AccountUnicodeWriter(file_data, lineterminator='\n')
+        else:
+            writer = AccountUnicodeWriter(file_data)
+        writer.writerow(self._get_header_journal_entries(cr, uid, ids,
+                                                         context=context))
+
+        cr.execute("SELECT pg_export_snapshot()")
+        snapshot_id = cr.fetchone()[0]
+        dbname = cr.dbname
+
+        def write_partition(partition):
+            date_from, date_to = partition
+            partition_file = tempfile.TemporaryFile(prefix='account_export.')
+            with api.Environment.manage():
+                partition_cr = sql_db.db_connect(dbname).cursor()
+                try:
+                    # must be the first statement of the transaction
+                    partition_cr.execute("SET TRANSACTION SNAPSHOT %s",
+                                         (snapshot_id,))
+                    self._write_lines(partition_cr, uid, ids, result_type,
+                                      partition_file, export_params,
+                                      use_copy, date_from=date_from,
+                                      date_to=date_to, context=context)
+                except Exception:
+                    partition_file.close()
+                    raise
+                finally:
+                    partition_cr.rollback()
+                    partition_cr.close()
+            partition_file.seek(0)
+            return partition_file
+
+        thread_pool = ThreadPool(workers)
+        try:
+            for partition_file in thread_pool.imap(write_partition,
+                                                   partitions):
+                with partition_file:
+                    shutil.copyfileobj(partition_file, file_data, 1 << 20)
+        finally:
+            thread_pool.close()
+            thread_pool.join()
+        return True
+
+    def _write_columnar(self, cr, uid, ids, result_type, file_data,
+                        progress=None, context=None):
+        """
+        Write the rows of the export as typed columns in a Parquet or Arrow
+        file, one row group (Parquet) or record batch (Arrow) for each
+        batch of rows fetched from a server-side cursor, so only one batch
+        is ever held in memory. The columns are named after the header of
+        the CSV file.
+        """
+        if pyarrow is None:
+            raise orm.except_orm(
+                _('Error'),
+                _('The python library pyarrow is required to export in '
+                  'the Parquet and Arrow formats.'))
+        this = self.browse(cr, uid, ids)[0]
+        get_header_func = getattr(
+            self, ("_get_header_%s" % (result_type)), None)
+        get_query_func = getattr(
+            self, ("_get_query_%s" % (result_type)), None)
+        fiscalyear_id, period_range_ids, journal_ids = \
+            self._get_export_params(cr, uid, ids, context=context)
+        names = get_header_func(cr, uid, ids, context=context)
+        query, params = get_query_func(cr, uid, ids,
+                                       fiscalyear_id,
+                                       period_range_ids,
+                                       journal_ids,
+                                       context=context)
+        # named cursor of the connection of cr, in the same transaction
+        with closing(cr._cnx.cursor(
+                'account_export_csv_%d' % this.id)) as server_cr:
+            server_cr.execute(query, params)
+            rows = server_cr.fetchmany(self._columnar_batch_size)
+            # the description is known once rows are fetched
+            type_codes = [column[1] for column in server_cr.description]
+            schema = pyarrow.schema(
+                [pyarrow.field(name, _arrow_type(type_code))
+                 for name, type_code in zip(names, type_codes)])
+            if this.export_format == 'parquet':
+                writer = pyarrow.parquet.ParquetWriter(file_data, schema)
+            else:
+                writer = pyarrow.RecordBatchFileWriter(file_data, schema)
+            while rows:
+                batch = pyarrow.RecordBatch.from_arrays(
+                    [_arrow_column(values, type_code)
+                     for values, type_code in zip(zip(*rows), type_codes)],
+                    names)
+                if this.export_format == 'parquet':
+                    writer.write_table(pyarrow.Table.from_batches([batch]))
+                else:
+                    writer.write_batch(batch)
+                if progress is not None:
+                    progress.update(lines=len(rows))
+                rows = server_cr.fetchmany(self._columnar_batch_size)
+            writer.close()
@@ -27,6 +27,7 @@
 ##############################################################################
 
 import time
+from bisect import bisect_right
 from openerp.report import report_sxw
 from openerp.tools.translate import _
 from openerp.osv import osv
@@ -34,6 +35,10 @@ from openerp.osv import osv
 
 class account_balance(report_sxw.rml_parse):
 
+    # compute the period columns from one matrix of the moves (see lines),
+    # instead of browsing the accounts for each column
+    _period_matrix = True
+
     def __init__(self, cr, uid, name, context):
         super(account_balance, self).__init__(cr, uid, name, context)
         self.sum_debit = 0.00
@@ -413,6 +418,25 @@ class account_balance(report_sxw.rml_parse):
                                                     det['am_id']).name
         return res
 
+    def _get_period_matrix(self, account_ids, ctx):
+        """
+        Returns the debit and credit of the accounts per period, read with
+        one query, as {account_id: {period_id: (debit, credit)}}
+        """
+        aml_obj = self.pool.get('account.move.line')
+        query = aml_obj._query_get(self.cr, self.uid, obj='l', context=ctx)
+        self.cr.execute(
+            "SELECT l.account_id, l.period_id, "
+            "COALESCE(SUM(l.debit), 0.0), COALESCE(SUM(l.credit), 0.0) "
+            "FROM account_move_line l "
+            "WHERE l.account_id IN %s AND " + query + " "
+            "GROUP BY l.account_id, l.period_id",
+            (tuple(account_ids),))
+        res = {}
+        for account_id, period_id, debit, credit in self.cr.fetchall():
+            res.setdefault(account_id, {})[period_id] = (debit, credit)
+        return res
+
     def lines(self, form, level=0):
         """
         Returns all the data needed for the report lines
@@ -746,49 +770,14 @@ class account_balance(report_sxw.rml_parse):
         else:
             limit = 1
 
-        for p_act in range(limit):
-            if limit != 1:
-                if p_act == limit - 1:
-                    form['periods'] = period_ids
-                else:
-                    if form['columns'] == 'thirteen':
-                        form['periods'] = [period_ids[p_act]]
-                    elif form['columns'] == 'qtr':
-                        form['periods'] = p[p_act]
-
-            if form['inf_type'] == 'IS':
-                ctx_to_use = _ctx_end(self.context.copy())
-            else:
-                ctx_i = _ctx_init(self.context.copy())
-                ctx_to_use = _ctx_end(self.context.copy())
-
-            account_black = account_obj.browse(
-                self.cr, self.uid, account_black_ids, ctx_to_use)
-
-            if form['inf_type'] == 'BS':
-                account_black_init = account_obj.browse(
-                    self.cr, self.uid, account_black_ids, ctx_i)
-
-            # ~ Black
-            dict_black = {}
-            for i in account_black:
-                d = i.debit
-                c = i.credit
-                dict_black[i.id] = {
-                    'obj': i,
-                    'debit': d,
-                    'credit': c,
-                    'balance': d - c
-                }
-                if form['inf_type'] == 'BS':
-                    dict_black.get(i.id)['balanceinit'] = 0.0
-
-            # If the report is a balance sheet
-            # Balanceinit values are added to the dictionary
-            if form['inf_type'] == 'BS':
-                for i in account_black_init:
-                    dict_black.get(i.id)['balanceinit'] = i.balance
+        def _column_periods(p_act):
+            if p_act == limit - 1:
+                return period_ids
+            if form['columns'] == 'thirteen':
+                return [period_ids[p_act]]
+            return p[p_act]
 
+        def _roll_up(dict_black):
             # ~ Not black
             dict_not_black = {}
             for i in account_not_black:
@@ -818,14 +807,129 @@ class account_balance(report_sxw.rml_parse):
                         dict_not_black.get(acc_id)['balanceinit'] += \
                             all_account.get(child_id.id).get('balanceinit')
                 all_account[acc_id] = dict_not_black[acc_id]
+            return all_account
+
+        # The monthly and quarterly columns of a report by period are
+        # computed from one matrix of the moves per account and period
+        # instead of browsing the accounts once per column. The leaf
+        # accounts must not have children of their own, as their debit
+        # and credit would then include them.
+        use_matrix = self._period_matrix and limit != 1 \
+            and account_black_ids \
+            and form.get('filter', 'all') == 'byperiod' \
+            and not account_obj.search(
+                self.cr, self.uid,
+                [('parent_id', 'in', account_black_ids)], limit=1)
 
-            if p_act == limit - 1:
-                all_account_period['all'] = all_account
-            else:
-                if form['columns'] == 'thirteen':
-                    all_account_period[p_act] = all_account
-                elif form['columns'] == 'qtr':
-                    all_account_period[p_act] = all_account
+        if use_matrix:
+            fy_periods = period_obj.read(
+                self.cr, self.uid,
+                period_obj.search(self.cr, self.uid,
+                                  [('fiscalyear_id', '=', fiscalyear.id)]),
+                ['date_start', 'date_stop'])
+            fy_periods.sort(key=lambda x: (x['date_stop'], x['date_start']))
+            stops = [x['date_stop'] for x in fy_periods]
+            starts = dict((x['id'], x['date_start']) for x in fy_periods)
+
+            ctx_matrix = self.context.copy()
+            ctx_matrix['fiscalyear'] = fiscalyear.id
+            ctx_matrix['periods'] = [x['id'] for x in fy_periods]
+            matrix = self._get_period_matrix(account_black_ids, ctx_matrix)
+
+            # Balances at the end of each period of the year, to give the
+            # initial balance of a column with one lookup
+            cumulated = {}
+            if form['inf_type'] == 'BS':
+                for acc_id in account_black_ids:
+                    acc_periods = matrix.get(acc_id, {})
+                    total = 0.0
+                    cumulated[acc_id] = acc_cum = []
+                    for x in fy_periods:
+                        d, c = acc_periods.get(x['id'], (0.0, 0.0))
+                        total += d - c
+                        acc_cum.append(total)
+
+            account_black = account_obj.browse(
+                self.cr, self.uid, account_black_ids)
+
+            for p_act in range(limit):
+                col_periods = _column_periods(p_act)
+                # The initial balance covers the periods of the year ended
+                # before the column, or the whole year when there is none,
+                # as an empty list of periods means for _query_get
+                init_pos = bisect_right(
+                    stops, min([starts[x] for x in col_periods])) - 1
+
+                dict_black = {}
+                for i in account_black:
+                    acc_periods = matrix.get(i.id, {})
+                    d = c = 0.0
+                    for period_id in col_periods:
+                        if period_id in acc_periods:
+                            d += acc_periods[period_id][0]
+                            c += acc_periods[period_id][1]
+                    dict_black[i.id] = {
+                        'obj': i,
+                        'debit': d,
+                        'credit': c,
+                        'balance': d - c
+                    }
+                    if form['inf_type'] == 'BS':
+                        dict_black.get(i.id)['balanceinit'] = \
+                            cumulated[i.id][init_pos]
+
+                if p_act == limit - 1:
+                    all_account_period['all'] = _roll_up(dict_black)
+                else:
+                    all_account_period[p_act] = _roll_up(dict_black)
+            form['periods'] = period_ids
+        else:
+            for p_act in range(limit):
+                if limit != 1:
+                    form['periods'] = _column_periods(p_act)
+
+                if form['inf_type'] == 'IS':
+                    ctx_to_use = _ctx_end(self.context.copy())
+                else:
+                    ctx_i = _ctx_init(self.context.copy())
+                    ctx_to_use = _ctx_end(self.context.copy())
+
+                account_black = account_obj.browse(
+                    self.cr, self.uid, account_black_ids, ctx_to_use)
+
+                if form['inf_type'] == 'BS':
+                    account_black_init = account_obj.browse(
+                        self.cr, self.uid, account_black_ids, ctx_i)
+
+                # ~ Black
+                dict_black = {}
+                for i in account_black:
+                    d = i.debit
+                    c = i.credit
+                    dict_black[i.id] = {
+                        'obj': i,
+                        'debit': d,
+                        'credit': c,
+                        'balance': d - c
+                    }
+                    if form['inf_type'] == 'BS':
+                        dict_black.get(i.id)['balanceinit'] = 0.0
+
+                # If the report is a balance sheet
+                # Balanceinit values are added to the dictionary
+                if form['inf_type'] == 'BS':
+                    for i in account_black_init:
+                        dict_black.get(i.id)['balanceinit'] = i.balance
+
+                all_account = _roll_up(dict_black)
+
+                if p_act == limit - 1:
+                    all_account_period['all'] = all_account
+                else:
+                    if form['columns'] == 'thirteen':
+                        all_account_period[p_act] = all_account
+                    elif form['columns'] == 'qtr':
+                        all_account_period[p_act] = all_account
 
         ###############################################################
         # End of the calculations of credit, debit and balance
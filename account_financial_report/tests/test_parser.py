@@ -0,0 +1,101 @@
+# -*- encoding: utf-8 -*-
+##############################################################################
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+##############################################################################
+
+import copy
+
+import openerp.tests.common as common
+
+from ..report import parser
+
+
+def _rounded(lines):
+    """The report lines, with the amounts rounded as they are printed,
+    the columns being summed in another order by the two paths"""
+    return [dict((key, round(value, 2) if isinstance(value, float)
+                  else value)
+                 for key, value in line.iteritems())
+            for line in lines]
+
+
+class test_parser(common.TransactionCase):
+
+    def setUp(self):
+        super(test_parser, self).setUp()
+        cr, uid = self.cr, self.uid
+        self.wizard_obj = self.registry('wizard.report')
+        # moves in periods of different quarters, on a balance sheet and
+        # an income statement account
+        for period_xmlid, amount in (('account.period_1', 100.0),
+                                     ('account.period_5', 250.0),
+                                     ('account.period_8', 400.0)):
+            period = self.registry('account.period').browse(
+                cr, uid, self.ref(period_xmlid))
+            self.registry('account.move').create(cr, uid, {
+                'journal_id': self.ref('account.miscellaneous_journal'),
+                'period_id': period.id,
+                'date': period.date_start,
+                'line_id': [
+                    (0, 0, {'name': 'AFR %s' % period.code,
+                            'account_id': self.ref('account.a_recv'),
+                            'date': period.date_start,
+                            'debit': amount,
+                            'credit': 0.0}),
+                    (0, 0, {'name': 'AFR %s' % period.code,
+                            'account_id': self.ref('account.a_sale'),
+                            'date': period.date_start,
+                            'debit': 0.0,
+                            'credit': amount}),
+                ]})
+
+    def _form(self, columns, inf_type):
+        wizard_id = self.wizard_obj.create(self.cr, self.uid, {
+            'inf_type': inf_type,
+            'columns': columns,
+            'display_account': 'all',
+            'account_list': [(6, 0, [self.ref('account.chart0')])],
+            'fiscalyear': self.ref('account.data_fiscalyear'),
+            'filter': 'byperiod',
+            'target_move': 'all',
+        })
+        return self.wizard_obj.print_report(
+            self.cr, self.uid, [wizard_id], {})['datas']['form']
+
+    def _lines(self, form, period_matrix):
+        report = parser.account_balance(self.cr, self.uid, 'afr', {})
+        report._period_matrix = period_matrix
+        matrix_calls = []
+        get_period_matrix = report._get_period_matrix
+
+        def _get_period_matrix(account_ids, ctx):
+            matrix_calls.append(account_ids)
+            return get_period_matrix(account_ids, ctx)
+
+        report._get_period_matrix = _get_period_matrix
+        # lines() changes the form it is given
+        lines = report.lines(copy.deepcopy(form))
+        self.assertEqual(bool(matrix_calls), period_matrix)
+        return _rounded(lines)
+
+    def test_period_matrix(self):
+        for columns in ('thirteen', 'qtr'):
+            for inf_type in ('BS', 'IS'):
+                form = self._form(columns, inf_type)
+                matrix_lines = self._lines(form, True)
+                self.assertTrue(matrix_lines)
+                self.assertEqual(
+                    matrix_lines, self._lines(form, False),
+                    'The %s columns of the %s differ between the matrix and '
+                    'the browse of each column' % (columns, inf_type))
@@ -199,7 +199,9 @@ wkhtmltopdf. The texts are defined inside the report classes.
              'tests/trial_balance.yml',
              'tests/partner_balance.yml',
              'tests/open_invoices.yml',
-             'tests/aged_trial_balance.yml'],
+             'tests/aged_trial_balance.yml',
+             'tests/print_journal.yml',
+             'tests/split_render.yml'],
     # 'tests/account_move_line.yml'
     'active': False,
     'installable': True,
@@ -1,3 +1,4 @@
+from . import report_session
 from . import common_reports
 from . import common_partner_reports
 from . import common_balance_reports
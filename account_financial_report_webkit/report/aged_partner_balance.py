@@ -74,8 +74,7 @@ class AccountAgedTrialBalanceWebkit(PartnersOpenInvoicesWebkit):
                                                             context=context)
         self.pool = pooler.get_pool(self.cr.dbname)
         self.cursor = self.cr
-        company = self.pool.get('res.users').browse(self.cr, uid, uid,
-                                                    context=context).company_id
+        company = self.report_session.company
 
         header_report_name = ' - '.join((_('Aged Partner Balance'),
                                          company.currency_id.name))
@@ -102,6 +101,8 @@ class AccountAgedTrialBalanceWebkit(PartnersOpenInvoicesWebkit):
                  ' '.join((_('Page'), '[page]', _('of'), '[topage]'))),
                 ('--footer-line',),
             ],
+            # the totals and percents are computed over all the accounts
+            'split_render': False,
         })
 
     def _get_ranges(self):
@@ -212,14 +213,12 @@ class AccountAgedTrialBalanceWebkit(PartnersOpenInvoicesWebkit):
         if date_to:
             end_date = date_to
         elif period_to_id:
-            period_to = self.pool['account.period'].browse(self.cr,
-                                                           self.uid,
-                                                           period_to_id)
+            period_to = self.report_session.browse('account.period',
+                                                   period_to_id)
             end_date = period_to.date_stop
         elif fiscal_to_id:
-            fiscal_to = self.pool['account.fiscalyear'].browse(self.cr,
-                                                               self.uid,
-                                                               fiscal_to_id)
+            fiscal_to = self.report_session.browse('account.fiscalyear',
+                                                   fiscal_to_id)
             end_date = fiscal_to.date_stop
         else:
             raise ValueError('End date and end period not available')
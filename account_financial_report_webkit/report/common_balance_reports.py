@@ -20,8 +20,11 @@
 #
 ##############################################################################
 
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
 from operator import add
 
+from openerp import api, sql_db
 from .common_reports import CommonReportHeaderWebkit
 
 
@@ -33,13 +36,407 @@ class CommonBalanceReportHeaderWebkit(CommonReportHeaderWebkit):
     def _get_numbers_display(self, data):
         return self._get_form_param('numbers_display', data)
 
+    def _get_balance_reader(self, data):
+        return self._get_form_param('balance_reader', data, default='orm')
+
     @staticmethod
     def find_key_by_value_in_list(dic, value):
         return [key for key, val in dic.iteritems() if value in val][0]
 
+    ######################################################################
+    # Direct SQL balance reader                                          #
+    ######################################################################
+
+    def _get_account_tree(self, account_ids, context=None):
+        """Return the accounts of the tree under account_ids, with their
+        direct children (regular and consolidation) and company currency.
+
+        The tree is built once from the accounts structure and cached on
+        the parser, so the main columns and the comparisons of a report
+        share it.
+
+        @return: dict of {'account_ids': all the accounts of the tree,
+                          'children': {account id: [children ids]},
+                          'consol_children': {account id:
+                                              [consolidated children ids]},
+                          'company': {account id: company id},
+                          'currency': {account id: currency id},
+                          'descendants': memoized descendants by account}
+        """
+        cache = getattr(self, '_account_tree_cache', None)
+        if cache is None:
+            cache = self._account_tree_cache = {}
+        key = tuple(sorted(account_ids))
+        if key in cache:
+            return cache[key]
+        # a tree containing all the accounts also contains all their
+        # children, it can be used as is
+        for tree in cache.itervalues():
+            if all(account_id in tree['children']
+                   for account_id in account_ids):
+                cache[key] = tree
+                return tree
+
+        structure = self._get_accounts_structure()
+        tree_ids = []
+        for account_id in account_ids:
+            tree_ids += self._get_children_and_consol_ids(account_id)
+        tree_ids = list(set(tree_ids))
+        accounts = [structure['accounts'][account_id]
+                    for account_id in tree_ids]
+
+        company_ids = list(set(account['company_id']
+                               for account in accounts
+                               if account['company_id']))
+        currency_by_company = {}
+        if company_ids:
+            self.cursor.execute("SELECT id, currency_id FROM res_company"
+                                " WHERE id IN %s", (tuple(company_ids),))
+            currency_by_company = dict(self.cursor.fetchall())
+
+        children = dict((account['id'], []) for account in accounts)
+        consol_children = {}
+        company = {}
+        currency = {}
+        for account in accounts:
+            if account['parent_id'] in children:
+                children[account['parent_id']].append(account['id'])
+            consol_children[account['id']] = [
+                child_id for child_id
+                in structure['consol_children'].get(account['id'], [])
+                if child_id in children]
+            children[account['id']].extend(consol_children[account['id']])
+            company[account['id']] = account['company_id']
+            currency[account['id']] = currency_by_company.get(
+                account['company_id'])
+
+        cache[key] = {'account_ids': tree_ids,
+                      'children': children,
+                      'consol_children': consol_children,
+                      'company': company,
+                      'currency': currency,
+                      'descendants': {}}
+        return cache[key]
+
+    def _get_tree_descendants(self, tree, account_id):
+        """Return the set of account_id and all its descendants in the tree,
+        consolidation children included, like _get_children_and_consol.
+
+        The sets are memoized by subtree root, so a subtree consolidated
+        several times is walked only once.
+        """
+        memo = tree['descendants']
+        visiting = set()
+        # iterative post-order walk, charts can be deeper than the python
+        # recursion limit allows with consolidations
+        stack = [(account_id, False)]
+        while stack:
+            current_id, children_done = stack.pop()
+            if current_id in memo:
+                continue
+            children = tree['children'].get(current_id, [])
+            if not children_done:
+                if current_id in visiting:
+                    continue
+                visiting.add(current_id)
+                stack.append((current_id, True))
+                stack.extend((child_id, False) for child_id in children
+                             if child_id not in memo)
+                continue
+            descendants = set([current_id])
+            for child_id in children:
+                # a child still missing is in a consolidation loop
+                descendants.update(memo.get(child_id, ()))
+            memo[current_id] = frozenset(descendants)
+        return memo[account_id]
+
+    def _read_leaf_balances_sql(self, account_ids, ctx, cursor=None):
+        """Sum debit and credit of the move lines of account_ids with one
+        grouped query, using the same move lines filter as the ORM
+        computation of account.account (built from the context)"""
+        cursor = cursor or self.cursor
+        move_line_obj = self.pool.get('account.move.line')
+        query = move_line_obj._query_get(
+            cursor, self.uid, obj='l', context=ctx)
+        sql = ("SELECT l.account_id, "
+               "       COALESCE(SUM(l.debit), 0.0) AS debit, "
+               "       COALESCE(SUM(l.credit), 0.0) AS credit "
+               "FROM account_move_line l "
+               "WHERE l.account_id IN %s ")
+        if query.strip():
+            sql += " AND " + query
+        sql += " GROUP BY l.account_id"
+        cursor.execute(sql, (tuple(account_ids),))
+        return dict((row[0], {'debit': row[1], 'credit': row[2]})
+                    for row in cursor.fetchall())
+
+    def _get_balance_workers(self):
+        """Number of companies computed at the same time by the parallel
+        SQL balance reader, from the system parameter
+        'account_financial_report_webkit.balance_workers' (defaults to the
+        number of processors)"""
+        workers = self.pool.get('ir.config_parameter').get_param(
+            self.cursor, self.uid,
+            'account_financial_report_webkit.balance_workers')
+        try:
+            return max(int(workers), 1)
+        except (TypeError, ValueError):
+            return cpu_count()
+
+    def _get_balance_slices(self, tree):
+        """Split the accounts of the tree in the lists of accounts summed
+        each in its own thread by the parallel SQL balance reader, one per
+        company"""
+        account_ids_by_company = {}
+        for account_id in tree['account_ids']:
+            account_ids_by_company.setdefault(
+                tree['company'].get(account_id), []).append(account_id)
+        return account_ids_by_company.values()
+
+    @staticmethod
+    def _has_written(cursor):
+        """Whether the transaction of cursor has changed the database"""
+        if cursor._cnx.server_version >= 100000:
+            cursor.execute("SELECT txid_current_if_assigned() IS NOT NULL")
+        else:
+            # pg_stat_activity is read once per transaction otherwise
+            cursor.execute("SELECT pg_stat_clear_snapshot()")
+            cursor.execute("SELECT backend_xid IS NOT NULL "
+                           "FROM pg_stat_activity "
+                           "WHERE pid = pg_backend_pid()")
+        return cursor.fetchone()[0]
+
+    def _read_leaf_balances_parallel(self, tree, ctx):
+        """Same as _read_leaf_balances_sql for all the accounts of the tree,
+        with the accounts of each company summed in its own thread and
+        database cursor.
+
+        The cursors of the threads import the snapshot of the report
+        cursor, so all the companies are read from the same state of the
+        database as the rest of the report. The changes of the report
+        transaction are not in its snapshot: when it has any, the accounts
+        are summed by the report cursor alone.
+        """
+        slices = self._get_balance_slices(tree)
+        workers = min(self._get_balance_workers(), len(slices))
+        # snapshots can be exported since PostgreSQL 9.2, the transaction
+        # id of a backend is known since 9.4
+        if workers < 2 or self.cursor._cnx.server_version < 90400 or \
+                self._has_written(self.cursor):
+            return self._read_leaf_balances_sql(tree['account_ids'], ctx)
+
+        self.cursor.execute("SELECT pg_export_snapshot()")
+        snapshot_id = self.cursor.fetchone()[0]
+        dbname = self.cursor.dbname
+
+        def read_slice(account_ids):
+            with api.Environment.manage():
+                cursor = sql_db.db_connect(dbname).cursor()
+                try:
+                    # must be the first statement of the transaction
+                    cursor.execute("SET TRANSACTION SNAPSHOT %s",
+                                   (snapshot_id,))
+                    return self._read_leaf_balances_sql(account_ids, ctx,
+                                                        cursor=cursor)
+                finally:
+                    cursor.rollback()
+                    cursor.close()
+
+        thread_pool = ThreadPool(workers)
+        try:
+            results = thread_pool.map(read_slice, slices)
+        finally:
+            thread_pool.close()
+            thread_pool.join()
+
+        res = {}
+        for result in results:
+            res.update(result)
+        return res
+
+    def _get_accounts_balances_sql(self, account_ids, ctx, parallel=False):
+        """Compute debit, credit and balance of account_ids with their
+        children and consolidated children, like the ORM does, but with
+        one grouped query on the move lines and a roll up through the
+        cached account tree.
+
+        Amounts of children belonging to a company with another currency
+        are converted in the currency of the parent.
+
+        @param parallel: sum the move lines of each company in parallel
+        """
+        tree = self._get_account_tree(account_ids, context=ctx)
+        if parallel:
+            leaf_sums = self._read_leaf_balances_parallel(tree, ctx)
+        else:
+            leaf_sums = self._read_leaf_balances_sql(tree['account_ids'],
+                                                     ctx)
+        currency_obj = self.pool.get('res.currency')
+
+        sums = {}
+        visiting = set()
+        for account_id in account_ids:
+            # iterative post-order walk, each account of the tree is
+            # summed only once
+            stack = [(account_id, False)]
+            while stack:
+                current_id, children_done = stack.pop()
+                if current_id in sums:
+                    continue
+                children = tree['children'].get(current_id, [])
+                if not children_done:
+                    if current_id in visiting:
+                        continue
+                    visiting.add(current_id)
+                    stack.append((current_id, True))
+                    stack.extend((child_id, False) for child_id in children
+                                 if child_id not in sums)
+                    continue
+                own = leaf_sums.get(current_id, {})
+                debit = own.get('debit', 0.0)
+                credit = own.get('credit', 0.0)
+                for child_id in children:
+                    child_debit, child_credit = sums.get(child_id, (0.0, 0.0))
+                    from_currency = tree['currency'].get(child_id)
+                    to_currency = tree['currency'].get(current_id)
+                    if from_currency != to_currency:
+                        child_debit = currency_obj.compute(
+                            self.cursor, self.uid, from_currency, to_currency,
+                            child_debit, context=ctx)
+                        child_credit = currency_obj.compute(
+                            self.cursor, self.uid, from_currency, to_currency,
+                            child_credit, context=ctx)
+                    debit += child_debit
+                    credit += child_credit
+                sums[current_id] = (debit, credit)
+
+        res = {}
+        for account_id in account_ids:
+            debit, credit = sums[account_id]
+            res[account_id] = {'debit': debit,
+                               'credit': credit,
+                               'balance': debit - credit}
+        return res
+
+    def _read_accounts_sql(self, account_ids, ctx, parallel=False):
+        """Same result as the read of the accounts done by
+        _get_account_details, with the amounts computed by the SQL balance
+        reader instead of the function fields of account.account"""
+        account_obj = self.pool.get('account.account')
+        tree = self._get_account_tree(account_ids, context=ctx)
+        balances = self._get_accounts_balances_sql(account_ids, ctx,
+                                                   parallel=parallel)
+        accounts = account_obj.read(
+            self.cursor, self.uid, account_ids,
+            ['type', 'code', 'name', 'parent_id', 'level'],
+            context=ctx)
+        for account in accounts:
+            account.update(balances[account['id']])
+            account['child_id'] = tree['children'].get(account['id'], [])
+        return accounts
+
+    ######################################################################
+    # Dormant accounts pruning                                           #
+    ######################################################################
+
+    def _get_initial_balance_period_ids(self, start, fiscalyear,
+                                        initial_balance_mode):
+        """Return the ids of the periods read to compute the initial
+        balances (see _read_opening_balance and _compute_initial_balances)"""
+        if initial_balance_mode == 'opening_balance':
+            return self.get_included_opening_period(start)
+        elif initial_balance_mode:
+            return self._get_period_range_from_start_period(
+                start, fiscalyear=fiscalyear, include_opening=True) + \
+                self._get_period_range_from_start_period(
+                    start, include_opening=True,
+                    stop_at_previous_opening=True)
+        return []
+
+    def _get_column_period_ids(self, main_filter, start, stop,
+                               initial_balance_mode, fiscalyear):
+        """Return the ids of all the periods whose move lines can have an
+        amount in a column of the report, its initial balance included"""
+        period_obj = self.pool.get('account.period')
+        if main_filter == 'filter_opening':
+            period_ids = [start.id]
+        else:
+            period_ids = period_obj.build_ctx_periods(
+                self.cursor, self.uid, start.id, stop.id)
+        return period_ids + self._get_initial_balance_period_ids(
+            start, fiscalyear, initial_balance_mode)
+
+    def _get_active_accounts(self, account_ids, columns):
+        """Return the ids of the accounts having debit or credit in at least
+        one of the columns of the report.
+
+        @param columns: list of (filter, start, stop, initial balance mode,
+                        fiscalyear) of the main column and the comparisons
+        """
+        period_ids = set()
+        conditions = []
+        params = [tuple(account_ids)]
+        for main_filter, start, stop, initial_balance_mode, fiscalyear \
+                in columns:
+            if main_filter == 'filter_date':
+                conditions.append("l.date BETWEEN %s AND %s")
+                params += [start, stop]
+            else:
+                period_ids.update(self._get_column_period_ids(
+                    main_filter, start, stop, initial_balance_mode,
+                    fiscalyear))
+        if period_ids:
+            conditions.append("l.period_id IN %s")
+            params.append(tuple(period_ids))
+        if not conditions:
+            return []
+        sql = ("SELECT l.account_id FROM account_move_line l "
+               "WHERE l.account_id IN %s "
+               "AND (" + " OR ".join(conditions) + ") "
+               "GROUP BY l.account_id "
+               "HAVING SUM(l.debit) <> 0 OR SUM(l.credit) <> 0")
+        self.cursor.execute(sql, params)
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def _prune_dormant_accounts(self, account_ids, root_ids, columns):
+        """Remove from account_ids the accounts with no amount in any column,
+        so their amounts are not computed at all.
+
+        A regular account is kept when it has move lines in the columns, a
+        view or consolidation account when one of its descendants is kept,
+        the accounts printed from (root_ids) are always kept.
+        """
+        if not account_ids:
+            return account_ids
+        if not isinstance(root_ids, list):
+            root_ids = [root_ids]
+        self.cursor.execute("SELECT id FROM account_account"
+                            " WHERE id IN %s"
+                            " AND type NOT IN ('view', 'consolidation')",
+                            (tuple(account_ids),))
+        leaf_ids = [row[0] for row in self.cursor.fetchall()]
+        kept_ids = set(root_ids)
+        if leaf_ids:
+            kept_ids.update(self._get_active_accounts(leaf_ids, columns))
+
+        # keep the ancestors of the kept accounts for the structure
+        tree = self._get_account_tree(account_ids)
+        parents = {}
+        for parent_id, child_ids in tree['children'].iteritems():
+            for child_id in child_ids:
+                parents.setdefault(child_id, []).append(parent_id)
+        stack = list(kept_ids)
+        while stack:
+            for parent_id in parents.get(stack.pop(), []):
+                if parent_id not in kept_ids:
+                    kept_ids.add(parent_id)
+                    stack.append(parent_id)
+        return [account_id for account_id in account_ids
+                if account_id in kept_ids]
+
     def _get_account_details(self, account_ids, target_move, fiscalyear,
                              main_filter, start, stop, initial_balance_mode,
-                             context=None):
+                             context=None, balance_reader='orm'):
         """
         Get details of accounts to display on the report
         @param account_ids: ids of accounts to get details
@@ -51,6 +448,11 @@ class CommonBalanceReportHeaderWebkit(CommonReportHeaderWebkit):
         @param initial_balance_mode: False: no calculation,
                'opening_balance': from the opening period,
                'initial_balance': computed from previous year / periods
+        @param balance_reader: 'orm': amounts computed by the function
+               fields of account.account,
+               'sql': amounts computed by the direct SQL balance reader,
+               'sql_parallel': same as 'sql' with the companies computed
+               in parallel
         @return: dict of list containing accounts details, keys are
                  the account ids
         """
@@ -88,25 +490,34 @@ class CommonBalanceReportHeaderWebkit(CommonReportHeaderWebkit):
             ctx.update({'date_from': start,
                         'date_to': stop})
 
-        accounts = account_obj.read(
-            self.cursor,
-            self.uid,
-            account_ids,
-            ['type', 'code', 'name', 'debit', 'credit',
-                'balance', 'parent_id', 'level', 'child_id'],
-            context=ctx)
+        use_sql = balance_reader in ('sql', 'sql_parallel')
+        if use_sql:
+            accounts = self._read_accounts_sql(
+                account_ids, ctx, parallel=balance_reader == 'sql_parallel')
+            tree = self._get_account_tree(account_ids, context=ctx)
+        else:
+            accounts = account_obj.read(
+                self.cursor,
+                self.uid,
+                account_ids,
+                ['type', 'code', 'name', 'debit', 'credit',
+                    'balance', 'parent_id', 'level', 'child_id'],
+                context=ctx)
 
         accounts_by_id = {}
         for account in accounts:
             if init_balance:
                 # sum for top level views accounts
-                child_ids = account_obj._get_children_and_consol(
-                    self.cursor, self.uid, account['id'], ctx)
+                if use_sql:
+                    child_ids = self._get_tree_descendants(
+                        tree, account['id'])
+                else:
+                    child_ids = set(account_obj._get_children_and_consol(
+                        self.cursor, self.uid, account['id'], ctx))
                 if child_ids:
                     child_init_balances = [
-                        init_bal['init_balance']
-                        for acnt_id, init_bal in init_balance.iteritems()
-                        if acnt_id in child_ids]
+                        init_balance[acnt_id]['init_balance']
+                        for acnt_id in child_ids if acnt_id in init_balance]
                     top_init_balance = reduce(add, child_init_balances)
                     account['init_balance'] = top_init_balance
                 else:
@@ -116,18 +527,16 @@ class CommonBalanceReportHeaderWebkit(CommonReportHeaderWebkit):
             accounts_by_id[account['id']] = account
         return accounts_by_id
 
-    def _get_comparison_details(self, data, account_ids, target_move,
-                                comparison_filter, index):
+    def _get_comparison_params(self, data, comparison_filter, index):
         """
-
         @param data: data of the wizard form
-        @param account_ids: ids of the accounts to get details
         @param comparison_filter: selected filter on the form for
                the comparison (filter_no, filter_year, filter_period,
                                filter_date)
         @param index: index of the fields to get
                 (ie. comp1_fiscalyear_id where 1 is the index)
-        @return: dict of account details (key = account id)
+        @return: dict of the parameters of the comparison, empty when
+                 there is no comparison
         """
         fiscalyear = self._get_info(
             data, "comp%s_fiscalyear_id" % (index,), 'account.fiscalyear')
@@ -139,7 +548,6 @@ class CommonBalanceReportHeaderWebkit(CommonReportHeaderWebkit):
         stop_date = self._get_form_param("comp%s_date_to" % (index,), data)
         init_balance = self.is_initial_balance_enabled(comparison_filter)
 
-        accounts_by_ids = {}
         comp_params = {}
         details_filter = comparison_filter
         if comparison_filter != 'filter_no':
@@ -152,18 +560,55 @@ class CommonBalanceReportHeaderWebkit(CommonReportHeaderWebkit):
 
             initial_balance_mode = init_balance \
                 and self._get_initial_balance_mode(start) or False
-            accounts_by_ids = self._get_account_details(
-                account_ids, target_move, fiscalyear, details_filter,
-                start, stop, initial_balance_mode)
             comp_params = {
                 'comparison_filter': comparison_filter,
+                'details_filter': details_filter,
                 'fiscalyear': fiscalyear,
                 'start': start,
                 'stop': stop,
                 'initial_balance': init_balance,
                 'initial_balance_mode': initial_balance_mode,
             }
+        return comp_params
+
+    def _get_comparison_columns(self, data, comp_filters):
+        """Return the columns of the used comparisons, as expected by
+        _prune_dormant_accounts"""
+        columns = []
+        for index, comp_filter in enumerate(comp_filters):
+            comp_params = self._get_comparison_params(data, comp_filter,
+                                                      index)
+            if comp_params:
+                columns.append((comp_params['details_filter'],
+                                comp_params['start'],
+                                comp_params['stop'],
+                                comp_params['initial_balance_mode'],
+                                comp_params['fiscalyear']))
+        return columns
+
+    def _get_comparison_details(self, data, account_ids, target_move,
+                                comparison_filter, index):
+        """
 
+        @param data: data of the wizard form
+        @param account_ids: ids of the accounts to get details
+        @param comparison_filter: selected filter on the form for
+               the comparison (filter_no, filter_year, filter_period,
+                               filter_date)
+        @param index: index of the fields to get
+                (ie. comp1_fiscalyear_id where 1 is the index)
+        @return: dict of account details (key = account id)
+        """
+        balance_reader = self._get_balance_reader(data)
+        comp_params = self._get_comparison_params(
+            data, comparison_filter, index)
+        accounts_by_ids = {}
+        if comp_params:
+            accounts_by_ids = self._get_account_details(
+                account_ids, target_move, comp_params['fiscalyear'],
+                comp_params['details_filter'], comp_params['start'],
+                comp_params['stop'], comp_params['initial_balance_mode'],
+                balance_reader=balance_reader)
         return accounts_by_ids, comp_params
 
     def _get_diff(self, balance, previous_balance):
@@ -175,9 +620,7 @@ class CommonBalanceReportHeaderWebkit(CommonReportHeaderWebkit):
         """
         diff = balance - previous_balance
 
-        obj_precision = self.pool.get('decimal.precision')
-        precision = obj_precision.precision_get(
-            self.cursor, self.uid, 'Account')
+        precision = self.report_session.precision('Account')
         # round previous balance with account precision to avoid big numbers
         # if previous balance is 0.0000001 or a any very small number
         if round(previous_balance, precision) == 0:
@@ -248,6 +691,7 @@ class CommonBalanceReportHeaderWebkit(CommonReportHeaderWebkit):
         start_date = self._get_form_param('date_from', data)
         stop_date = self._get_form_param('date_to', data)
         chart_account = self._get_chart_account_id_br(data)
+        balance_reader = self._get_balance_reader(data)
 
         start_period, stop_period, start, stop = \
             self._get_start_stop_for_filter(main_filter, fiscalyear,
@@ -262,10 +706,17 @@ class CommonBalanceReportHeaderWebkit(CommonReportHeaderWebkit):
         account_ids = self.get_all_accounts(
             new_ids, only_type=filter_report_type)
 
+        # accounts without amount are not displayed, do not compute them
+        columns = [(main_filter, start, stop, initial_balance_mode,
+                    fiscalyear)]
+        columns += self._get_comparison_columns(data, comp_filters)
+        account_ids = self._prune_dormant_accounts(account_ids, new_ids,
+                                                   columns)
+
         # get details for each accounts, total of debit / credit / balance
         accounts_by_ids = self._get_account_details(
             account_ids, target_move, fiscalyear, main_filter, start, stop,
-            initial_balance_mode)
+            initial_balance_mode, balance_reader=balance_reader)
 
         comparison_params = []
         comp_accounts_by_ids = []
@@ -287,15 +738,18 @@ class CommonBalanceReportHeaderWebkit(CommonReportHeaderWebkit):
         credit_accounts = dict.fromkeys(account_ids, False)
         balance_accounts = dict.fromkeys(account_ids, False)
 
+        # children are taken from the accounts tree, already loaded, instead
+        # of browsing the subtrees of every account again
+        tree = self._get_account_tree(account_ids)
         for account in objects:
             if not account.parent_id:  # hide top level account
                 continue
             if account.type == 'consolidation':
-                to_display_accounts.update(
-                    dict([(a.id, False) for a in account.child_consol_ids]))
+                to_display_accounts.update(dict.fromkeys(
+                    tree['consol_children'].get(account.id, []), False))
             elif account.type == 'view':
-                to_display_accounts.update(
-                    dict([(a.id, True) for a in account.child_id]))
+                to_display_accounts.update(dict.fromkeys(
+                    tree['children'].get(account.id, []), True))
             debit_accounts[account.id] = \
                 accounts_by_ids[account.id]['debit']
             credit_accounts[account.id] = \
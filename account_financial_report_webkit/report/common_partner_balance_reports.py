@@ -84,6 +84,18 @@ class CommonPartnerBalanceReportHeaderWebkit(CommonBalanceReportHeaderWebkit,
 
         return res
 
+    def _get_initial_balance_period_ids(self, start, fiscalyear,
+                                        initial_balance_mode):
+        """The initial balances of the partners are computed on all the
+        previous periods (see _partners_initial_balance_line_ids)"""
+        period_ids = super(CommonPartnerBalanceReportHeaderWebkit, self).\
+            _get_initial_balance_period_ids(start, fiscalyear,
+                                            initial_balance_mode)
+        if initial_balance_mode == 'initial_balance':
+            period_ids += self._get_period_range_from_start_period(
+                start, fiscalyear=False, include_opening=False)
+        return period_ids
+
     def _get_partners_initial_balances(self, account_ids, start_period,
                                        initial_balance_mode,
                                        partner_filter_ids=None,
@@ -170,33 +182,21 @@ class CommonPartnerBalanceReportHeaderWebkit(CommonBalanceReportHeaderWebkit,
         @param partner_filter_ids: list of ids of partners to select
         @return: dict of account details (key = account id)
         """
-        fiscalyear = self._get_info(
-            data, "comp%s_fiscalyear_id" % (index,), 'account.fiscalyear')
-        start_period = self._get_info(
-            data, "comp%s_period_from" % (index,), 'account.period')
-        stop_period = self._get_info(
-            data, "comp%s_period_to" % (index,), 'account.period')
-        start_date = self._get_form_param("comp%s_date_from" % (index,), data)
-        stop_date = self._get_form_param("comp%s_date_to" % (index,), data)
-        init_balance = self.is_initial_balance_enabled(comparison_filter)
-
-        comp_params = {}
+        balance_reader = self._get_balance_reader(data)
+        comp_params = self._get_comparison_params(
+            data, comparison_filter, index)
+
         accounts_details_by_ids = defaultdict(dict)
-        if comparison_filter != 'filter_no':
-            start_period, stop_period, start, stop = \
-                self._get_start_stop_for_filter(
-                    comparison_filter, fiscalyear, start_date, stop_date,
-                    start_period, stop_period)
-            details_filter = comparison_filter
-            if comparison_filter == 'filter_year':
-                details_filter = 'filter_no'
-
-            initial_balance_mode = init_balance \
-                and self._get_initial_balance_mode(start) or False
+        if comp_params:
+            fiscalyear = comp_params['fiscalyear']
+            details_filter = comp_params['details_filter']
+            start = comp_params['start']
+            stop = comp_params['stop']
+            initial_balance_mode = comp_params['initial_balance_mode']
 
             accounts_by_ids = self._get_account_details(
                 account_ids, target_move, fiscalyear, details_filter, start,
-                stop, initial_balance_mode)
+                stop, initial_balance_mode, balance_reader=balance_reader)
 
             partner_details_by_ids = self._get_account_partners_details(
                 accounts_by_ids, details_filter,
@@ -209,14 +209,6 @@ class CommonPartnerBalanceReportHeaderWebkit(CommonBalanceReportHeaderWebkit,
                 accounts_details_by_ids[account_id][
                     'partners_amounts'] = partner_details_by_ids[account_id]
 
-            comp_params = {
-                'comparison_filter': comparison_filter,
-                'fiscalyear': fiscalyear,
-                'start': start,
-                'stop': stop,
-                'initial_balance_mode': initial_balance_mode,
-            }
-
         return accounts_details_by_ids, comp_params
 
     def compute_partner_balance_data(self, data, filter_report_type=None):
@@ -239,6 +231,7 @@ class CommonPartnerBalanceReportHeaderWebkit(CommonBalanceReportHeaderWebkit,
         chart_account = self._get_chart_account_id_br(data)
         result_selection = self._get_form_param('result_selection', data)
         partner_ids = self._get_form_param('partner_ids', data)
+        balance_reader = self._get_balance_reader(data)
 
         filter_type = self._get_filter_type(result_selection)
 
@@ -256,10 +249,18 @@ class CommonPartnerBalanceReportHeaderWebkit(CommonBalanceReportHeaderWebkit,
             new_ids, only_type=filter_type,
             filter_report_type=filter_report_type)
 
+        # accounts without amount have no partner to display, do not
+        # compute them
+        columns = [(main_filter, start, stop, initial_balance_mode,
+                    fiscalyear)]
+        columns += self._get_comparison_columns(data, comp_filters)
+        account_ids = self._prune_dormant_accounts(account_ids, new_ids,
+                                                   columns)
+
         # get details for each accounts, total of debit / credit / balance
         accounts_by_ids = self._get_account_details(
             account_ids, target_move, fiscalyear, main_filter, start, stop,
-            initial_balance_mode)
+            initial_balance_mode, balance_reader=balance_reader)
 
         partner_details_by_ids = self._get_account_partners_details(
             accounts_by_ids, main_filter, target_move, start, stop,
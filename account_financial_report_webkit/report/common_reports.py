@@ -23,11 +23,13 @@
 # By using properties we will have a more simple signature in fuctions
 
 import logging
+from bisect import bisect_left, bisect_right
 
 from openerp.osv import osv
 from openerp.tools.translate import _
 from openerp.addons.account.report.common_report_header \
     import common_report_header
+from .report_session import ReportSession
 
 _logger = logging.getLogger('financial.reports.webkit')
 
@@ -38,6 +40,19 @@ class CommonReportHeaderWebkit(common_report_header):
 
     """Define common helper for financial report"""
 
+    @property
+    def report_session(self):
+        """Reference data of the report run, loaded on first use"""
+        session = getattr(self, '_report_session', None)
+        if session is None:
+            session = self._report_session = ReportSession(
+                self.cursor, self.uid, self.pool, context=self.localcontext)
+            if session.lang_dict:
+                # formatLang of rml_parse reads the language from there
+                self.lang_dict.update(session.lang_dict)
+                self.lang_dict_called = True
+        return session
+
     ######################################################################
     # From getter helper                                                 #
     ######################################################################
@@ -60,7 +75,7 @@ class CommonReportHeaderWebkit(common_report_header):
     def _get_info(self, data, field, model):
         info = data.get('form', {}).get(field)
         if info:
-            return self.pool.get(model).browse(self.cursor, self.uid, info)
+            return self.report_session.browse(model, info)
         return False
 
     def _get_journals_br(self, data):
@@ -177,6 +192,85 @@ class CommonReportHeaderWebkit(common_report_header):
 
         return sorted_accounts
 
+    def _get_accounts_structure(self):
+        """Return the structure of the charts of accounts, read once per
+        report: for each active account its parent, nested set bounds,
+        company and type, and the children of the consolidation accounts.
+        """
+        structure = getattr(self, '_accounts_structure', None)
+        if structure is not None:
+            return structure
+
+        account_obj = self.pool.get('account.account')
+        # search to apply the same active and access rules as child_of
+        account_ids = account_obj.search(self.cursor, self.uid, [])
+        accounts = {}
+        if account_ids:
+            self.cursor.execute(
+                "SELECT id, parent_id, parent_left, parent_right,"
+                "       company_id, type"
+                " FROM account_account"
+                " WHERE id IN %s AND parent_left IS NOT NULL"
+                " ORDER BY parent_left",
+                (tuple(account_ids),))
+            accounts = dict((row['id'], row)
+                            for row in self.cursor.dictfetchall())
+        consol_ids = [account_id for account_id, account in accounts.items()
+                      if account['type'] == 'consolidation']
+        consol_children = {}
+        if consol_ids:
+            for account in account_obj.read(
+                    self.cursor, self.uid, consol_ids, ['child_consol_ids']):
+                consol_children[account['id']] = account['child_consol_ids']
+
+        ordered = sorted(accounts.itervalues(),
+                         key=lambda account: account['parent_left'])
+        structure = self._accounts_structure = {
+            'accounts': accounts,
+            'lefts': [account['parent_left'] for account in ordered],
+            'ordered_ids': [account['id'] for account in ordered],
+            'consol_children': consol_children,
+            # memoized children and consolidated children of subtrees,
+            # by subtree root
+            'subtrees': {},
+        }
+        return structure
+
+    def _get_children_and_consol_ids(self, account_id):
+        """Return account_id with all its children and consolidated children
+        (recursively), like _get_children_and_consol of account.account.
+
+        A subtree is expanded only once per report and reused wherever it
+        appears, i.e. the chart of a company consolidated several times.
+        """
+        structure = self._get_accounts_structure()
+        subtrees = structure['subtrees']
+        if account_id in subtrees:
+            return subtrees[account_id]
+        # guards against loops in the consolidations
+        subtrees[account_id] = []
+
+        account = structure['accounts'].get(account_id)
+        if account:
+            left, right = account['parent_left'], account['parent_right']
+        else:
+            # inactive account: its children are still searched
+            self.cursor.execute("SELECT parent_left, parent_right"
+                                " FROM account_account WHERE id = %s",
+                                (account_id,))
+            left, right = self.cursor.fetchone() or (None, None)
+        if left is None:
+            return []
+        lefts = structure['lefts']
+        ids = structure['ordered_ids'][bisect_left(lefts, left):
+                                       bisect_right(lefts, right)]
+        res = list(ids)
+        for sub_id in ids:
+            for child_id in structure['consol_children'].get(sub_id, []):
+                res += self._get_children_and_consol_ids(child_id)
+        subtrees[account_id] = res
+        return res
+
     def get_all_accounts(self, account_ids, exclude_type=None, only_type=None,
                          filter_report_type=None, context=None):
         """Get all account passed in params with their childrens
@@ -191,11 +285,9 @@ class CommonReportHeaderWebkit(common_report_header):
         accounts = []
         if not isinstance(account_ids, list):
             account_ids = [account_ids]
-        acc_obj = self.pool.get('account.account')
         for account_id in account_ids:
             accounts.append(account_id)
-            accounts += acc_obj._get_children_and_consol(
-                self.cursor, self.uid, account_id, context=context)
+            accounts += self._get_children_and_consol_ids(account_id)
         res_ids = list(set(accounts))
         res_ids = self.sort_accounts_with_structure(
             account_ids, res_ids, context=context)
@@ -236,24 +328,20 @@ class CommonReportHeaderWebkit(common_report_header):
         entries.
         We actually filter on this instead of opening period as older version
         of OpenERP did not have this notion"""
-        return self.pool.get('account.period').search(self.cursor, self.uid,
-                                                      [('special', '=', True)])
+        return self.report_session.search_periods(special=True)
 
     def exclude_opening_periods(self, period_ids):
-        period_obj = self.pool.get('account.period')
-        return period_obj.search(self.cr, self.uid, [['special', '=', False],
-                                                     ['id', 'in', period_ids]])
+        return self.report_session.search_periods(special=False,
+                                                  period_ids=period_ids)
 
     def get_included_opening_period(self, period):
         """Return the opening included in normal period we use the assumption
         that there is only one opening period per fiscal year"""
-        period_obj = self.pool.get('account.period')
-        return period_obj.search(self.cursor, self.uid,
-                                 [('special', '=', True),
-                                  ('date_start', '>=', period.date_start),
-                                  ('date_stop', '<=', period.date_stop),
-                                  ('company_id', '=', period.company_id.id)],
-                                 limit=1)
+        return self.report_session.search_periods(
+            special=True,
+            date_start_from=period.date_start,
+            date_stop_to=period.date_stop,
+            company_id=period.company_id.id)[:1]
 
     def periods_contains_move_lines(self, period_ids):
         if not period_ids:
@@ -340,16 +428,11 @@ class CommonReportHeaderWebkit(common_report_header):
 
     def _get_st_fiscalyear_period(self, fiscalyear, special=False,
                                   order='ASC'):
-        period_obj = self.pool.get('account.period')
-        p_id = period_obj.search(self.cursor,
-                                 self.uid,
-                                 [('special', '=', special),
-                                  ('fiscalyear_id', '=', fiscalyear.id)],
-                                 limit=1,
-                                 order='date_start %s' % (order,))
+        p_id = self.report_session.search_periods(
+            special=special, fiscalyear_id=fiscalyear.id, order=order)
         if not p_id:
             raise osv.except_osv(_('No period found'), '')
-        return period_obj.browse(self.cursor, self.uid, p_id[0])
+        return self.report_session.browse('account.period', p_id[0])
 
     ###############################
     # Initial Balance helper      #
@@ -38,8 +38,7 @@ class GeneralLedgerWebkit(report_sxw.rml_parse, CommonReportHeaderWebkit):
         self.pool = pooler.get_pool(self.cr.dbname)
         self.cursor = self.cr
 
-        company = self.pool.get('res.users').browse(
-            self.cr, uid, uid, context=context).company_id
+        company = self.report_session.company
         header_report_name = ' - '.join(
             (_('GENERAL LEDGER'), company.name, company.currency_id.name))
 
@@ -70,6 +69,7 @@ class GeneralLedgerWebkit(report_sxw.rml_parse, CommonReportHeaderWebkit):
                  ' '.join((_('Page'), '[page]', _('of'), '[topage]'))),
                 ('--footer-line',),
             ],
+            'split_render': True,
         })
 
     def set_context(self, objects, data, ids, report_type=None):
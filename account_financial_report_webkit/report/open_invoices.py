@@ -23,7 +23,6 @@ from collections import defaultdict
 from datetime import datetime
 from itertools import groupby
 from operator import itemgetter
-from mako.template import Template
 
 
 from openerp import pooler
@@ -32,13 +31,14 @@ from openerp.report import report_sxw
 from openerp.tools.translate import _
 from openerp.addons.report_webkit import report_helper
 from .common_partner_reports import CommonPartnersReportHeaderWebkit
-from .webkit_parser_header_fix import HeaderFooterTextWebKitParser
+from .webkit_parser_header_fix import HeaderFooterTextWebKitParser, \
+    mako_template_file
 from openerp.modules.module import get_module_resource
 
 
 def get_mako_template(obj, *args):
     template_path = get_module_resource(*args)
-    return Template(filename=template_path, input_encoding='utf-8')
+    return mako_template_file(template_path)
 
 report_helper.WebKitHelper.get_mako_template = get_mako_template
 
@@ -52,8 +52,7 @@ class PartnersOpenInvoicesWebkit(report_sxw.rml_parse,
         self.pool = pooler.get_pool(self.cr.dbname)
         self.cursor = self.cr
 
-        company = self.pool.get('res.users').browse(
-            self.cr, uid, uid, context=context).company_id
+        company = self.report_session.company
         header_report_name = ' - '.join((_('OPEN INVOICES REPORT'),
                                         company.name,
                                         company.currency_id.name))
@@ -83,6 +82,7 @@ class PartnersOpenInvoicesWebkit(report_sxw.rml_parse,
                  ' '.join((_('Page'), '[page]', _('of'), '[topage]'))),
                 ('--footer-line',),
             ],
+            'split_render': True,
         })
 
     def _group_lines_by_currency(self, account_br):
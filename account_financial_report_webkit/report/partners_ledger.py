@@ -39,8 +39,7 @@ class PartnersLedgerWebkit(report_sxw.rml_parse,
         self.pool = pooler.get_pool(self.cr.dbname)
         self.cursor = self.cr
 
-        company = self.pool.get('res.users').browse(
-            self.cr, uid, uid, context=context).company_id
+        company = self.report_session.company
         header_report_name = ' - '.join((_('PARTNER LEDGER'),
                                         company.name,
                                         company.currency_id.name))
@@ -71,6 +70,7 @@ class PartnersLedgerWebkit(report_sxw.rml_parse,
                  ' '.join((_('Page'), '[page]', _('of'), '[topage]'))),
                 ('--footer-line',),
             ],
+            'split_render': True,
         })
 
     def _get_initial_balance_mode(self, start_period):
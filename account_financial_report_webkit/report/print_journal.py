@@ -32,6 +32,39 @@ from .common_reports import CommonReportHeaderWebkit
 from .webkit_parser_header_fix import HeaderFooterTextWebKitParser
 
 
+class JournalMove(object):
+
+    """Move printed by the journal report, with its lines in line_id"""
+
+    __slots__ = ('id', 'name', 'date', 'line_id')
+
+    def __init__(self, id, name, date):
+        self.id = id
+        self.name = name
+        self.date = date
+        self.line_id = []
+
+
+class JournalMoveLine(object):
+
+    """Move line printed by the journal report"""
+
+    __slots__ = ('name', 'date_maturity', 'debit', 'credit',
+                 'amount_currency', 'account_code', 'partner_name',
+                 'currency_symbol')
+
+    def __init__(self, name, date_maturity, debit, credit, amount_currency,
+                 account_code, partner_name, currency_symbol):
+        self.name = name
+        self.date_maturity = date_maturity
+        self.debit = debit
+        self.credit = credit
+        self.amount_currency = amount_currency
+        self.account_code = account_code
+        self.partner_name = partner_name
+        self.currency_symbol = currency_symbol
+
+
 class PrintJournalWebkit(report_sxw.rml_parse, CommonReportHeaderWebkit):
 
     def __init__(self, cursor, uid, name, context):
@@ -76,6 +109,7 @@ class PrintJournalWebkit(report_sxw.rml_parse, CommonReportHeaderWebkit):
                                              '[topage]'))),
                 ('--footer-line',),
             ],
+            'split_render': True,
         })
 
     def set_context(self, objects, data, ids, report_type=None):
@@ -126,24 +160,9 @@ class PrintJournalWebkit(report_sxw.rml_parse, CommonReportHeaderWebkit):
         objects = account_journal_period_obj.browse(self.cursor, self.uid,
                                                     new_ids)
         # Sort by journal and period
-        objects.sorted(key=lambda a: (a.journal_id.code,
-                                      a.period_id.date_start))
-        move_obj = self.pool.get('account.move')
-        moves = {}
-        for journal_period in objects:
-            domain_arg = [
-                ('journal_id', '=', journal_period.journal_id.id),
-                ('period_id', '=', journal_period.period_id.id),
-            ]
-            if target_move == 'posted':
-                domain_arg += [('state', '=', 'posted')]
-            move_ids = move_obj.search(self.cursor, self.uid, domain_arg,
-                                       order="name")
-            moves[journal_period.id] = move_obj.browse(self.cursor, self.uid,
-                                                       move_ids)
-            # Sort account move line by account accountant
-            for move in moves[journal_period.id]:
-                move.line_id.sorted(key=lambda a: (a.date, a.account_id.code))
+        objects = objects.sorted(key=lambda a: (a.journal_id.code,
+                                                a.period_id.date_start))
+        moves = self._get_journal_moves(objects, target_move)
 
         self.localcontext.update({
             'fiscalyear': fiscalyear,
@@ -158,6 +177,55 @@ class PrintJournalWebkit(report_sxw.rml_parse, CommonReportHeaderWebkit):
         return super(PrintJournalWebkit, self).set_context(
             objects, data, new_ids, report_type=report_type)
 
+    def _get_journal_moves(self, journal_periods, target_move):
+        """Return the moves of each journal period, sorted by name, with
+        their lines sorted by date and account code, as
+        {journal period id: [JournalMove]}
+
+        All the moves and lines are read with one query, the moves being
+        filtered by the access rules of account.move as a search would."""
+        move_obj = self.pool.get('account.move')
+        moves = dict((journal_period.id, [])
+                     for journal_period in journal_periods)
+        if not journal_periods:
+            return moves
+        journal_period_ids = dict(
+            ((journal_period.journal_id.id, journal_period.period_id.id),
+             journal_period.id)
+            for journal_period in journal_periods)
+        domain = [
+            ('journal_id', 'in', [key[0] for key in journal_period_ids]),
+            ('period_id', 'in', [key[1] for key in journal_period_ids]),
+        ]
+        if target_move == 'posted':
+            domain += [('state', '=', 'posted')]
+        query = move_obj._where_calc(self.cursor, self.uid, domain)
+        move_obj._apply_ir_rules(self.cursor, self.uid, query, 'read')
+        from_clause, where_clause, where_params = query.get_sql()
+        self.cursor.execute(
+            "SELECT am.journal_id, am.period_id, am.id, am.name, am.date, "
+            "       l.name, l.date_maturity, l.debit, l.credit, "
+            "       l.amount_currency, aa.code, rp.name, rc.symbol "
+            "FROM account_move am "
+            "JOIN account_move_line l ON l.move_id = am.id "
+            "JOIN account_account aa ON aa.id = l.account_id "
+            "LEFT JOIN res_partner rp ON rp.id = l.partner_id "
+            "LEFT JOIN res_currency rc ON rc.id = l.currency_id "
+            "WHERE am.id IN (SELECT \"account_move\".id FROM " +
+            from_clause + " WHERE " + where_clause + ") "
+            "ORDER BY am.journal_id, am.period_id, am.name, am.id, "
+            "         l.date, aa.code, l.id", where_params)
+        move = None
+        for row in self.cursor.fetchall():
+            journal_period_id = journal_period_ids.get((row[0], row[1]))
+            if journal_period_id is None:
+                continue
+            if move is None or move.id != row[2]:
+                move = JournalMove(*row[2:5])
+                moves[journal_period_id].append(move)
+            move.line_id.append(JournalMoveLine(*row[5:]))
+        return moves
+
 HeaderFooterTextWebKitParser(
     'report.account.account_report_print_journal_webkit',
     'account.journal.period',
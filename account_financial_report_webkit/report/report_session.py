@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    Copyright Camptocamp SA 2011
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+import logging
+
+_logger = logging.getLogger('financial.reports.webkit')
+
+
+class ReportSession(object):
+
+    """Reference data of one report run
+
+    Loads once the company of the user, the currencies, the decimal
+    precisions, the language settings, the fiscal years and the periods,
+    so the helpers of the webkit reports read them from memory instead of
+    looking them up again and again.
+
+    :attr:`saved_lookups` counts the lookups served from the session.
+    """
+
+    def __init__(self, cursor, uid, pool, context=None):
+        self.cursor = cursor
+        self.uid = uid
+        self.pool = pool
+        self.context = context or {}
+        self.saved_lookups = 0
+        self._records = {}
+        self._load()
+
+    def _load(self):
+        cursor, uid, pool, context = (self.cursor, self.uid, self.pool,
+                                      self.context)
+
+        self.company = pool.get('res.users').browse(
+            cursor, uid, uid, context=context).company_id
+
+        currency_obj = pool.get('res.currency')
+        currency_ids = currency_obj.search(cursor, uid, [], context=context)
+        for currency in currency_obj.browse(cursor, uid, currency_ids,
+                                            context=context):
+            self._records[('res.currency', currency.id)] = currency
+
+        cursor.execute("SELECT name, digits FROM decimal_precision")
+        self.precisions = dict(cursor.fetchall())
+
+        lang_code = context.get('lang') or 'en_US'
+        lang_obj = pool.get('res.lang')
+        lang_ids = lang_obj.search(cursor, uid, [('code', '=', lang_code)],
+                                   context=context)
+        self.lang_dict = {}
+        if lang_ids:
+            lang = lang_obj.browse(cursor, uid, lang_ids[0], context=context)
+            self.lang_dict = {'lang_obj': lang,
+                              'date_format': lang.date_format,
+                              'time_format': lang.time_format}
+
+        fiscalyear_obj = pool.get('account.fiscalyear')
+        fiscalyear_ids = fiscalyear_obj.search(cursor, uid, [],
+                                               context=context)
+        for fiscalyear in fiscalyear_obj.browse(cursor, uid, fiscalyear_ids,
+                                                context=context):
+            self._records[('account.fiscalyear', fiscalyear.id)] = fiscalyear
+
+        period_obj = pool.get('account.period')
+        period_ids = period_obj.search(cursor, uid, [], context=context)
+        # keep the default order of account.period (date_start, special
+        # desc) to give the same results as a search
+        self.periods = period_obj.read(
+            cursor, uid, period_ids,
+            ['code', 'date_start', 'date_stop', 'special', 'fiscalyear_id',
+             'company_id'],
+            context=context)
+        for period in period_obj.browse(cursor, uid, period_ids,
+                                        context=context):
+            self._records[('account.period', period.id)] = period
+
+    def browse(self, model, ids):
+        """Return the browse record(s) of model for ids, browsing them only
+        the first time they are asked for"""
+        key = (model, tuple(ids) if isinstance(ids, list) else ids)
+        if key in self._records:
+            self.saved_lookups += 1
+        else:
+            self._records[key] = self.pool.get(model).browse(
+                self.cursor, self.uid, ids, context=self.context)
+        return self._records[key]
+
+    def precision(self, application):
+        """Return the digits of the decimal precision application"""
+        if application in self.precisions:
+            self.saved_lookups += 1
+        else:
+            self.precisions[application] = self.pool.get(
+                'decimal.precision').precision_get(self.cursor, self.uid,
+                                                   application)
+        return self.precisions[application]
+
+    def search_periods(self, special=None, fiscalyear_id=None,
+                       company_id=None, date_start_from=None,
+                       date_stop_to=None, period_ids=None, order='ASC'):
+        """Return the ids of the loaded periods matching all the given
+        criteria, sorted by start date"""
+        res = []
+        for period in self.periods:
+            if special is not None and bool(period['special']) != special:
+                continue
+            if fiscalyear_id is not None and \
+                    (period['fiscalyear_id'] and
+                     period['fiscalyear_id'][0]) != fiscalyear_id:
+                continue
+            if company_id is not None and \
+                    (period['company_id'] and
+                     period['company_id'][0]) != company_id:
+                continue
+            if date_start_from is not None and \
+                    period['date_start'] < date_start_from:
+                continue
+            if date_stop_to is not None and \
+                    period['date_stop'] > date_stop_to:
+                continue
+            if period_ids is not None and period['id'] not in period_ids:
+                continue
+            res.append(period)
+        if order == 'DESC':
+            # sorted() is stable, so equal dates keep the default order
+            res = sorted(res, key=lambda period: period['date_start'],
+                         reverse=True)
+        self.saved_lookups += 1
+        return [period['id'] for period in res]
+
+    def log_summary(self, report_name):
+        _logger.debug('%s: %s lookups served by the report session',
+                      report_name, self.saved_lookups)
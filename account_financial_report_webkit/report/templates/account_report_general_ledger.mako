@@ -23,6 +23,7 @@
         initial_balance_text = {'initial_balance': _('Computed'), 'opening_balance': _('Opening Entries'), False: _('No')}
         %>
 
+        %if render_header:
         %if amount_currency(data):
         <div class="act_as_table data_table" style="width: 1205px;">
         %else:
@@ -71,6 +72,7 @@
                 <div class="act_as_cell">${ initial_balance_text[initial_balance_mode] }</div>
             </div>
         </div>
+        %endif
 
         <!-- we use div with css instead of table for tabular data because div do not cut rows at half at page breaks -->
         %for account in objects:
@@ -28,6 +28,7 @@
     <% context.lookup.put_template('grouped_by_curr_open_invoices_inclusion.mako.html', template2) %>
         <%setLang(user.lang)%>
 
+        %if render_header:
         <div class="act_as_table data_table">
             <div class="act_as_row labels">
                 <div class="act_as_cell">${_('Chart of Account')}</div>
@@ -72,6 +73,7 @@
                 <div class="act_as_cell">${ display_target_move(data) }</div>
             </div>
         </div>
+        %endif
         %for acc in objects:
             %if 'grouped_ledger_lines' in acc:
                <% fl = formatLang %>
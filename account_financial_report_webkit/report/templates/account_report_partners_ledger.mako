@@ -24,6 +24,7 @@
         initial_balance_text = {'initial_balance': _('Computed'), 'opening_balance': _('Opening Entries'), False: _('No')}
         %>
 
+        %if render_header:
         <div class="act_as_table data_table">
             <div class="act_as_row labels">
                 <div class="act_as_cell">${_('Chart of Account')}</div>
@@ -67,6 +68,7 @@
                 <div class="act_as_cell">${ initial_balance_text[initial_balance_mode] }</div>
             </div>
         </div>
+        %endif
 
         %for account in objects:
             %if ledger_lines[account.id] or init_balance[account.id]:
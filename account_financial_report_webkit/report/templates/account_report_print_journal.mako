@@ -19,6 +19,7 @@
 
         <%setLang(user.lang)%>
 
+        %if render_header:
         <div class="act_as_table data_table">
             <div class="act_as_row labels">
                 <div class="act_as_cell">${_('Chart of Account')}</div>
@@ -61,6 +62,7 @@
                 <div class="act_as_cell">${ display_target_move(data) }</div>
             </div>
         </div>
+        %endif
 
         %for journal_period in objects:
         <%
@@ -116,11 +118,11 @@
                         ## move
                         <div class="act_as_cell">${move.name if new_move else ''}</div>
                         ## account code
-                        <div class="act_as_cell">${line.account_id.code}</div>
+                        <div class="act_as_cell">${line.account_code}</div>
                         ## date
                         <div class="act_as_cell">${formatLang(line.date_maturity or '', date=True)}</div>
                         ## partner
-                        <div class="act_as_cell overflow_ellipsis" style="width: 280px;">${line.partner_id.name if new_move else ''}</div>
+                        <div class="act_as_cell overflow_ellipsis" style="width: 280px;">${(line.partner_name or '') if new_move else ''}</div>
                         ## label
                         <div class="act_as_cell overflow_ellipsis" style="width: 310px;">${line.name}</div>
                         ## debit
@@ -131,7 +133,7 @@
                             ## currency balance
                             <div class="act_as_cell amount sep_left">${formatLang(line.amount_currency) if line.amount_currency else ''}</div>
                             ## curency code
-                            <div class="act_as_cell amount" style="text-align: right;">${line.currency_id.symbol or ''}</div>
+                            <div class="act_as_cell amount" style="text-align: right;">${line.currency_symbol or ''}</div>
                         %endif
                     </div>
                     <%
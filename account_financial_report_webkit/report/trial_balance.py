@@ -42,8 +42,7 @@ class TrialBalanceWebkit(report_sxw.rml_parse,
         self.pool = pooler.get_pool(self.cr.dbname)
         self.cursor = self.cr
 
-        company = self.pool.get('res.users').browse(self.cr, uid, uid,
-                                                    context=context).company_id
+        company = self.report_session.company
         header_report_name = ' - '.join((_('TRIAL BALANCE'), company.name,
                                          company.currency_id.name))
 
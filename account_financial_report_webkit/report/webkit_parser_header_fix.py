@@ -28,13 +28,17 @@
 #
 ##############################################################################
 import os
+import hashlib
 import subprocess
 import tempfile
+import threading
 import logging
 from functools import partial
+from multiprocessing.pool import ThreadPool
 
 
 from mako import exceptions
+from pyPdf import PdfFileReader, PdfFileWriter
 from openerp.osv.orm import except_orm
 from openerp.tools.translate import _
 from openerp import pooler
@@ -72,11 +76,51 @@ _logger = logging.getLogger('financial.reports.webkit')
 #            ],
 #        })
 
+# long reports can be rendered by several wkhtmltopdf processes at the same
+# time: set the system parameter 'webkit_render_workers' to the number of
+# processes to run and add a key 'split_render' set to True in the
+# localcontext of the reports whose objects can be printed independently
+# (each object starts its own section and no total spans several objects).
+# The objects are then split in contiguous chunks rendered in parallel, the
+# PDFs are merged in order and the page numbers ([page], [topage]) are
+# stamped afterwards so they stay continuous over the whole document. The
+# templates of these reports print their filter header only when the
+# 'render_header' key of the localcontext is True, which is the case for
+# the first chunk only.
+
+# text header and footer variables which need the whole document
+PAGE_VARIABLES = ('[page]', '[frompage]', '[topage]')
+# number of chunks given to each wkhtmltopdf process, more chunks than
+# processes balances the load when the objects have different sizes
+CHUNKS_PER_WORKER = 2
+
 
 # redefine mako_template as this is overriden by jinja since saas-1
 # from openerp.addons.report_webkit.webkit_report import mako_template
 from mako.template import Template
 from mako.lookup import TemplateLookup
+from mako.runtime import Context
+
+# compiled templates shared by all the reports of the process, the
+# templates read from files are also compiled as python modules in
+# MODULE_DIRECTORY so a new worker does not compile them again
+_template_cache = {}
+_template_cache_lock = threading.Lock()
+MODULE_DIRECTORY = os.path.join(
+    tools.config.get('data_dir') or tempfile.gettempdir(),
+    'mako_modules', 'account_financial_report_webkit')
+
+
+def _cached_template(key, version, build):
+    """Return the template cached under key, building it when it is missing
+    or when it has been cached for another version of its source"""
+    cached = _template_cache.get(key)
+    if cached is None or cached[0] != version:
+        with _template_cache_lock:
+            cached = _template_cache.get(key)
+            if cached is None or cached[0] != version:
+                cached = _template_cache[key] = (version, build())
+    return cached[1]
 
 
 def mako_template(text):
@@ -84,22 +128,229 @@ def mako_template(text):
 
     This template uses UTF-8 encoding
     """
-    tmp_lookup = TemplateLookup(
-    )  # we need it in order to allow inclusion and inheritance
-    return Template(text, input_encoding='utf-8', output_encoding='utf-8',
-                    lookup=tmp_lookup)
+    if isinstance(text, unicode):
+        text = text.encode('utf-8')
+    digest = hashlib.md5(text).hexdigest()
+    return _cached_template(
+        ('text', digest), None,
+        # we need a lookup in order to allow inclusion and inheritance
+        lambda: Template(text, input_encoding='utf-8',
+                         output_encoding='utf-8', lookup=TemplateLookup()))
+
+
+def mako_template_file(path, **kwargs):
+    """Build a Mako template from a file, compiled again only when the file
+    is modified
+
+    This template uses UTF-8 encoding
+    """
+    return _cached_template(
+        ('file', path, tuple(sorted(kwargs.items()))),
+        os.path.getmtime(path),
+        lambda: Template(filename=path, input_encoding='utf-8',
+                         lookup=TemplateLookup(),
+                         module_directory=MODULE_DIRECTORY, **kwargs))
+
+
+class RenderedHtmlFile(object):
+
+    """File-like buffer given to mako to write a rendered html page in a
+    temporary file, encoded in UTF-8, instead of keeping it in memory
+
+    The beginning of the page goes through sanitize as wkhtmltopdf expects
+    a doctype.
+    """
+
+    def __init__(self, sanitize, suffix):
+        self.file = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+        self.name = self.file.name
+        self._sanitize = sanitize
+        self._head = u''
+
+    def write(self, text):
+        if self._head is not None:
+            self._head += text
+            if len(self._head) < 9:
+                return
+            text, self._head = self._sanitize(self._head), None
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        self.file.write(text)
+
+    def close(self):
+        if self._head is not None:
+            head, self._head = self._head, None
+            self.write(self._sanitize(head))
+        self.file.close()
 
 
 class HeaderFooterTextWebKitParser(webkit_report.WebKitParser):
 
-    def generate_pdf(self, comm_path, report_xml, header, footer, html_list,
-                     webkit_header=False, parser_instance=False):
-        """Call webkit in order to generate pdf"""
-        if not webkit_header:
-            webkit_header = report_xml.webkit_header
-        fd, out_filename = tempfile.mkstemp(suffix=".pdf",
-                                            prefix="webkit.tmp.")
-        file_to_del = [out_filename]
+    def _get_render_workers(self, cursor, uid):
+        """Number of wkhtmltopdf processes allowed to run at the same time
+        for one report, 1 (no parallel rendering) when not configured"""
+        workers = self.pool.get('ir.config_parameter').get_param(
+            cursor, uid, 'webkit_render_workers')
+        try:
+            return max(int(workers), 1)
+        except (TypeError, ValueError):
+            return 1
+
+    @staticmethod
+    def _split_chunks(items, count):
+        """Split items in at most count contiguous chunks of similar size"""
+        count = min(count, len(items))
+        if count < 2:
+            return [items]
+        size, extra = divmod(len(items), count)
+        chunks = []
+        start = 0
+        for index in range(count):
+            stop = start + size + (1 if index < extra else 0)
+            chunks.append(items[start:stop])
+            start = stop
+        return chunks
+
+    @staticmethod
+    def _split_numbering_args(additional_args):
+        """Split the additional arguments of wkhtmltopdf between the ones
+        used to render the chunks and the ones used to stamp the page
+        numbers on the merged document
+
+        The texts using the page variables are only printed on the
+        numbering overlay, the fonts and spacings are given to both so the
+        texts are laid out at the same place.
+        """
+        content_args = []
+        numbering_args = []
+        page_numbers = False
+        for arg in additional_args:
+            if any(variable in value for value in arg[1:]
+                   for variable in PAGE_VARIABLES):
+                numbering_args.append(arg)
+                page_numbers = True
+            elif arg[0].endswith(('-font-name', '-font-size', '-spacing')):
+                content_args.append(arg)
+                numbering_args.append(arg)
+            else:
+                content_args.append(arg)
+        if not page_numbers:
+            numbering_args = []
+        return content_args, numbering_args
+
+    @staticmethod
+    def _remove_files(paths):
+        for path in paths:
+            try:
+                os.unlink(path)
+            except (OSError, IOError), exc:
+                _logger.error('cannot remove file %s: %s', path, exc)
+
+    def _call_wkhtmltopdf(self, command, html_paths, out_filename):
+        """Run wkhtmltopdf on the html files, writing the PDF in
+        out_filename"""
+        command = list(command) + list(html_paths) + [out_filename]
+        stderr_fd, stderr_path = tempfile.mkstemp(text=True)
+        try:
+            status = subprocess.call(command, stderr=stderr_fd)
+            os.close(stderr_fd)  # ensure flush before reading
+            stderr_fd = None  # avoid closing again in finally block
+            fobj = open(stderr_path, 'r')
+            error_message = fobj.read()
+            fobj.close()
+            if not error_message:
+                error_message = _('No diagnosis message was provided')
+            else:
+                error_message = _(
+                    'The following diagnosis message was provided:\n') + \
+                    error_message
+            if status:
+                raise except_orm(_('Webkit error'),
+                                 _("The command 'wkhtmltopdf' failed with \
+                                 error code = %s. Message: %s") %
+                                 (status, error_message))
+        finally:
+            if stderr_fd is not None:
+                os.close(stderr_fd)
+            self._remove_files([stderr_path])
+
+    def _generate_pdf_parallel(self, command, additional_args, html_paths,
+                               workers, out_filename):
+        """Render the html files by chunks in parallel wkhtmltopdf
+        processes, then merge the PDFs and stamp the page numbers"""
+        content_args, numbering_args = self._split_numbering_args(
+            additional_args)
+        content_command = list(command)
+        for arg in content_args:
+            content_command.extend(arg)
+        chunks = self._split_chunks(html_paths, workers * CHUNKS_PER_WORKER)
+
+        file_to_del = []
+        pdf_files = []
+        pool = ThreadPool(min(workers, len(chunks)))
+        try:
+            chunk_filenames = []
+            for chunk in chunks:
+                fd, chunk_filename = tempfile.mkstemp(suffix=".pdf",
+                                                      prefix="webkit.tmp.")
+                os.close(fd)
+                file_to_del.append(chunk_filename)
+                chunk_filenames.append(chunk_filename)
+            pool.map(lambda args: self._call_wkhtmltopdf(content_command,
+                                                         *args),
+                     zip(chunks, chunk_filenames))
+
+            pages = []
+            for chunk_filename in chunk_filenames:
+                pdf_file = open(chunk_filename, 'rb')
+                pdf_files.append(pdf_file)
+                reader = PdfFileReader(pdf_file)
+                pages.extend(reader.getPage(index)
+                             for index in range(reader.getNumPages()))
+
+            if numbering_args:
+                # blank document with the same number of pages, only
+                # printing the texts with the page numbers, laid over the
+                # merged pages
+                numbering_command = list(command) + ['--no-background']
+                for arg in numbering_args:
+                    numbering_command.extend(arg)
+                with tempfile.NamedTemporaryFile(suffix=".blank.html",
+                                                 delete=False) as blank:
+                    blank.write('<!DOCTYPE html>\n<html><body>')
+                    for index in range(len(pages) - 1):
+                        blank.write('<div style="page-break-after: always;">'
+                                    '&nbsp;</div>')
+                    blank.write('<div>&nbsp;</div></body></html>')
+                file_to_del.append(blank.name)
+                fd, overlay_filename = tempfile.mkstemp(suffix=".pdf",
+                                                        prefix="webkit.tmp.")
+                os.close(fd)
+                file_to_del.append(overlay_filename)
+                self._call_wkhtmltopdf(numbering_command, [blank.name],
+                                       overlay_filename)
+                pdf_file = open(overlay_filename, 'rb')
+                pdf_files.append(pdf_file)
+                overlay = PdfFileReader(pdf_file)
+                for index in range(min(len(pages), overlay.getNumPages())):
+                    pages[index].mergePage(overlay.getPage(index))
+
+            writer = PdfFileWriter()
+            for page in pages:
+                writer.addPage(page)
+            with open(out_filename, 'wb') as out:
+                writer.write(out)
+        finally:
+            pool.close()
+            pool.join()
+            for pdf_file in pdf_files:
+                pdf_file.close()
+            self._remove_files(file_to_del)
+        _logger.debug('%s: rendered %s pages in %s chunks',
+                      self.name, len(pages), len(chunks))
+
+    def _get_command(self, comm_path, webkit_header):
+        """Return the wkhtmltopdf command line options of the header"""
         if comm_path:
             command = [comm_path]
         else:
@@ -133,66 +384,104 @@ class HeaderFooterTextWebKitParser(webkit_report.WebKitParser):
             command.extend(
                 ['--page-size',
                  str(webkit_header.format).replace(',', '.')])
+        return command
 
-        if parser_instance.localcontext.get('additional_args', False):
-            for arg in parser_instance.localcontext['additional_args']:
-                command.extend(arg)
-
-        count = 0
-        for html in html_list:
-            with tempfile.NamedTemporaryFile(suffix="%d.body.html" % count,
-                                             delete=False) as html_file:
-                count += 1
-                html_file.write(self._sanitize_html(html))
-            file_to_del.append(html_file.name)
-            command.append(html_file.name)
-        command.append(out_filename)
-        stderr_fd, stderr_path = tempfile.mkstemp(text=True)
-        file_to_del.append(stderr_path)
+    def generate_pdf_from_files(self, comm_path, report_xml, html_paths,
+                                webkit_header=False, parser_instance=False):
+        """Call webkit in order to generate pdf from html files"""
+        if not webkit_header:
+            webkit_header = report_xml.webkit_header
+        command = self._get_command(comm_path, webkit_header)
+        additional_args = parser_instance.localcontext.get(
+            'additional_args') or []
+        workers = self._get_render_workers(parser_instance.cr,
+                                           parser_instance.uid)
+
+        fd, out_filename = tempfile.mkstemp(suffix=".pdf",
+                                            prefix="webkit.tmp.")
+        os.close(fd)
         try:
-            status = subprocess.call(command, stderr=stderr_fd)
-            os.close(stderr_fd)  # ensure flush before reading
-            stderr_fd = None  # avoid closing again in finally block
-            fobj = open(stderr_path, 'r')
-            error_message = fobj.read()
-            fobj.close()
-            if not error_message:
-                error_message = _('No diagnosis message was provided')
+            if workers > 1 and len(html_paths) > 1:
+                self._generate_pdf_parallel(command, additional_args,
+                                            html_paths, workers,
+                                            out_filename)
             else:
-                error_message = _(
-                    'The following diagnosis message was provided:\n') + \
-                    error_message
-            if status:
-                raise except_orm(_('Webkit error'),
-                                 _("The command 'wkhtmltopdf' failed with \
-                                 error code = %s. Message: %s") %
-                                 (status, error_message))
+                for arg in additional_args:
+                    command.extend(arg)
+                self._call_wkhtmltopdf(command, html_paths, out_filename)
+            # the report service returns the document as a string, it is
+            # read only once wkhtmltopdf is done
             with open(out_filename, 'rb') as pdf_file:
                 pdf = pdf_file.read()
-            os.close(fd)
         finally:
-            if stderr_fd is not None:
-                os.close(stderr_fd)
-            for f_to_del in file_to_del:
-                try:
-                    os.unlink(f_to_del)
-                except (OSError, IOError), exc:
-                    _logger.error('cannot remove file %s: %s', f_to_del, exc)
+            self._remove_files([out_filename])
         return pdf
 
-    # override needed to keep the attachments' storing procedure
-    def create_single_pdf(self, cursor, uid, ids, data, report_xml,
-                          context=None):
-        """generate the PDF"""
+    def generate_pdf(self, comm_path, report_xml, header, footer, html_list,
+                     webkit_header=False, parser_instance=False):
+        """Call webkit in order to generate pdf"""
+        html_paths = []
+        try:
+            count = 0
+            for html in html_list:
+                with tempfile.NamedTemporaryFile(
+                        suffix="%d.body.html" % count,
+                        delete=False) as html_file:
+                    count += 1
+                    html_file.write(self._sanitize_html(html))
+                html_paths.append(html_file.name)
+            return self.generate_pdf_from_files(
+                comm_path, report_xml, html_paths,
+                webkit_header=webkit_header, parser_instance=parser_instance)
+        finally:
+            self._remove_files(html_paths)
 
-        if context is None:
-            context = {}
+    def _render_to_file(self, body_mako_tpl, count, **kwargs):
+        """Render the template directly in a temporary html file and return
+        its path"""
+        html_file = RenderedHtmlFile(self._sanitize_html,
+                                     suffix="%d.body.html" % count)
+        try:
+            body_mako_tpl.render_context(Context(html_file, **kwargs))
+        except Exception:
+            html_file.close()
+            self._remove_files([html_file.name])
+            msg = exceptions.text_error_template().render()
+            _logger.error(msg)
+            raise except_orm(_('Webkit render'), msg)
+        html_file.close()
+        return html_file.name
+
+    def _render_htmls(self, body_mako_tpl, parser_instance, groups=None,
+                      split=True, **kwargs):
+        """Render the body template in temporary html files and return
+        their paths, one for all the objects or one per group of objects
+
+        When a report is split, the templates print the filter header of
+        the report (``render_header``) in the first file only, so the
+        files put together give the same document as one render.
+        """
+        localcontext = parser_instance.localcontext
+        objects = localcontext.get('objects')
         htmls = []
-        if report_xml.report_type != 'webkit':
-            return super(HeaderFooterTextWebKitParser, self
-                         ).create_single_pdf(cursor, uid, ids, data,
-                                             report_xml, context=context)
+        try:
+            for index, group in enumerate(groups or [objects]):
+                localcontext['objects'] = group
+                localcontext['render_header'] = index == 0 or not split
+                htmls.append(self._render_to_file(
+                    body_mako_tpl, index, **dict(localcontext, **kwargs)))
+        except Exception:
+            self._remove_files(htmls)
+            raise
+        finally:
+            localcontext['objects'] = objects
+            localcontext['render_header'] = True
+        return htmls
 
+    def _prepare_render(self, cursor, uid, ids, data, report_xml,
+                        context=None):
+        """Return the parser set on the objects to print, the body template
+        and the other arguments of the template of a webkit report"""
         parser_instance = self.parser(cursor,
                                       uid,
                                       self.name2,
@@ -202,16 +491,17 @@ class HeaderFooterTextWebKitParser(webkit_report.WebKitParser):
         objs = self.getObjects(cursor, uid, ids, context)
         parser_instance.set_context(objs, data, ids, report_xml.report_type)
 
-        template = False
+        body_mako_tpl = False
 
         if report_xml.report_file:
             path = get_module_resource(
                 *report_xml.report_file.split(os.path.sep))
             if os.path.exists(path):
-                template = file(path).read()
-        if not template and report_xml.report_webkit_data:
-            template = report_xml.report_webkit_data
-        if not template:
+                body_mako_tpl = mako_template_file(path,
+                                                   output_encoding='utf-8')
+        if not body_mako_tpl and report_xml.report_webkit_data:
+            body_mako_tpl = mako_template(report_xml.report_webkit_data)
+        if not body_mako_tpl:
             raise except_orm(
                 _('Error!'), _('Webkit Report template not found !'))
         header = report_xml.webkit_header.html
@@ -226,53 +516,78 @@ class HeaderFooterTextWebKitParser(webkit_report.WebKitParser):
         if not css:
             css = ''
 
-        translate_call = partial(self.translate_call, parser_instance)
-        # default_filters=['unicode', 'entity'] can be used to set global
-        # filter
-        body_mako_tpl = mako_template(template)
-        helper = WebKitHelper(cursor, uid, report_xml.id, context)
+        render_kwargs = {
+            'helper': WebKitHelper(cursor, uid, report_xml.id, context),
+            'css': css,
+            '_': partial(self.translate_call, parser_instance),
+        }
+        return parser_instance, body_mako_tpl, render_kwargs
+
+    # override needed to keep the attachments' storing procedure
+    def create_single_pdf(self, cursor, uid, ids, data, report_xml,
+                          context=None):
+        """generate the PDF"""
+
+        if context is None:
+            context = {}
+        htmls = []
+        if report_xml.report_type != 'webkit':
+            return super(HeaderFooterTextWebKitParser, self
+                         ).create_single_pdf(cursor, uid, ids, data,
+                                             report_xml, context=context)
+
+        parser_instance, body_mako_tpl, render_kwargs = \
+            self._prepare_render(cursor, uid, ids, data, report_xml,
+                                 context=context)
+        helper = render_kwargs['helper']
+        css = render_kwargs['css']
+        translate_call = render_kwargs['_']
+        groups = None
         if report_xml.precise_mode:
-            for obj in objs:
-                parser_instance.localcontext['objects'] = [obj]
+            groups = [[obj] for obj in
+                      self.getObjects(cursor, uid, ids, context)]
+        elif parser_instance.localcontext.get('split_render') and \
+                not report_xml.webkit_debug:
+            workers = self._get_render_workers(cursor, uid)
+            if workers > 1:
+                objects = parser_instance.localcontext.get('objects') or []
+                groups = self._split_chunks(
+                    list(objects), workers * CHUNKS_PER_WORKER)
+                if len(groups) < 2:
+                    groups = None
+
+        # the rendered html is streamed to temporary files, only their
+        # paths are kept in memory
+        try:
+            htmls = self._render_htmls(
+                body_mako_tpl, parser_instance, groups,
+                split=not report_xml.precise_mode, **render_kwargs)
+
+            if getattr(parser_instance, '_report_session', None):
+                parser_instance._report_session.log_summary(self.name)
+
+            if report_xml.webkit_debug:
+                debug_htmls = []
+                for html_path in htmls:
+                    with open(html_path, 'rb') as html_file:
+                        debug_htmls.append(html_file.read())
                 try:
-                    html = body_mako_tpl.render(helper=helper,
-                                                css=css,
-                                                _=translate_call,
-                                                **parser_instance.localcontext)
-                    htmls.append(html)
+                    deb = body_mako_tpl.render(
+                        helper=helper,
+                        css=css,
+                        _debug=tools.ustr("\n".join(debug_htmls)),
+                        _=translate_call,
+                        **parser_instance.localcontext)
                 except Exception:
                     msg = exceptions.text_error_template().render()
                     _logger.error(msg)
                     raise except_orm(_('Webkit render'), msg)
-        else:
-            try:
-                html = body_mako_tpl.render(helper=helper,
-                                            css=css,
-                                            _=translate_call,
-                                            **parser_instance.localcontext)
-                htmls.append(html)
-            except Exception:
-                msg = exceptions.text_error_template().render()
-                _logger.error(msg)
-                raise except_orm(_('Webkit render'), msg)
-
-        # NO html footer and header because we write them as text with
-        # wkhtmltopdf
-        head = foot = False
-
-        if report_xml.webkit_debug:
-            try:
-                deb = body_mako_tpl.render(helper=helper,
-                                           css=css,
-                                           _debug=tools.ustr("\n".join(htmls)),
-                                           _=translate_call,
-                                           **parser_instance.localcontext)
-            except Exception:
-                msg = exceptions.text_error_template().render()
-                _logger.error(msg)
-                raise except_orm(_('Webkit render'), msg)
-            return (deb, 'html')
-        bin = self.get_lib(cursor, uid)
-        pdf = self.generate_pdf(bin, report_xml, head, foot, htmls,
-                                parser_instance=parser_instance)
+                return (deb, 'html')
+            # NO html footer and header because we write them as text with
+            # wkhtmltopdf
+            bin = self.get_lib(cursor, uid)
+            pdf = self.generate_pdf_from_files(
+                bin, report_xml, htmls, parser_instance=parser_instance)
+        finally:
+            self._remove_files(htmls)
         return (pdf, 'pdf')
@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+import openerp.tests.common as common
+
+from ..report.trial_balance import TrialBalanceWebkit
+
+
+class test_balance_reader(common.TransactionCase):
+
+    def setUp(self):
+        super(test_balance_reader, self).setUp()
+        if self.cr._cnx.server_version < 90400:
+            self.skipTest('The parallel balance reader needs PostgreSQL '
+                          '9.4 or later')
+        self.fiscalyear = self.registry('account.fiscalyear').browse(
+            self.cr, self.uid, self.ref('account.data_fiscalyear'))
+
+    def _parser(self, cr):
+        """Return a trial balance parser on cr of which the parallel
+        balance reader sums the accounts in two threads, the demo data
+        having a single company, and the cursors it read from"""
+        parser = TrialBalanceWebkit(cr, self.uid, 'trial_balance_webkit',
+                                    {})
+        parser._get_balance_workers = lambda: 2
+        parser._get_balance_slices = lambda tree: [
+            tree['account_ids'][::2], tree['account_ids'][1::2]]
+        cursors = []
+        read_leaf_balances_sql = parser._read_leaf_balances_sql
+
+        def _read_leaf_balances_sql(account_ids, ctx, cursor=None):
+            cursors.append(cursor)
+            return read_leaf_balances_sql(account_ids, ctx, cursor=cursor)
+
+        parser._read_leaf_balances_sql = _read_leaf_balances_sql
+        return parser, cursors
+
+    def _details(self, parser, balance_reader):
+        account_ids = parser.get_all_accounts([self.ref('account.chart0')])
+        return parser._get_account_details(
+            account_ids, 'all', self.fiscalyear, 'filter_no',
+            parser.get_first_fiscalyear_period(self.fiscalyear),
+            parser.get_last_fiscalyear_period(self.fiscalyear),
+            'initial_balance', balance_reader=balance_reader)
+
+    def _assert_same_details(self, details, expected):
+        self.assertEqual(sorted(details), sorted(expected))
+        for account_id in expected:
+            for field in ('debit', 'credit', 'balance', 'init_balance'):
+                self.assertAlmostEqual(
+                    details[account_id][field], expected[account_id][field],
+                    places=2,
+                    msg='%s of account %s differs' % (field, account_id))
+
+    def _create_move(self, cr, amount):
+        period = self.registry('account.period').browse(
+            cr, self.uid, self.ref('account.period_2'))
+        return self.registry('account.move').create(cr, self.uid, {
+            'journal_id': self.ref('account.miscellaneous_journal'),
+            'period_id': period.id,
+            'date': period.date_start,
+            'line_id': [
+                (0, 0, {'name': 'Balance reader',
+                        'account_id': self.ref('account.a_recv'),
+                        'date': period.date_start,
+                        'debit': amount,
+                        'credit': 0.0}),
+                (0, 0, {'name': 'Balance reader',
+                        'account_id': self.ref('account.a_sale'),
+                        'date': period.date_start,
+                        'debit': 0.0,
+                        'credit': amount}),
+            ]})
+
+    def test_parallel_threads(self):
+        # the threads only read what is committed: the entry of this test
+        # is committed by a cursor of its own, and removed at the end
+        cr = self.registry.cursor()
+        self.addCleanup(cr.close)
+        move_id = self._create_move(cr, 1234.56)
+        cr.commit()
+
+        def remove_move():
+            self.registry('account.move').unlink(cr, self.uid, [move_id])
+            cr.commit()
+
+        self.addCleanup(remove_move)
+        # the report cursor is opened after the commit to read the entry
+        report_cr = self.registry.cursor()
+        self.addCleanup(report_cr.close)
+        parser, cursors = self._parser(report_cr)
+        self.assertFalse(parser._has_written(report_cr))
+        expected = self._details(parser, 'sql')
+        self.assertGreaterEqual(
+            expected[self.ref('account.a_recv')]['debit'], 1234.56)
+        del cursors[:]
+        details = self._details(parser, 'sql_parallel')
+        # each slice is read by a thread, with a cursor of its own
+        thread_cursors = [cursor for cursor in cursors
+                          if cursor is not None]
+        self.assertEqual(len(thread_cursors), 2)
+        self._assert_same_details(details, expected)
+
+    def test_parallel_written(self):
+        # the threads would not read the changes of the report
+        # transaction, the report cursor reads all the accounts then
+        parser, cursors = self._parser(self.cr)
+        before = self._details(parser, 'sql')
+        self._create_move(self.cr, 1234.56)
+        expected = self._details(parser, 'sql')
+        account_id = self.ref('account.a_recv')
+        self.assertAlmostEqual(
+            expected[account_id]['debit'] - before[account_id]['debit'],
+            1234.56, places=2)
+        del cursors[:]
+        details = self._details(parser, 'sql_parallel')
+        self.assertEqual(set(cursors), set([None]))
+        self._assert_same_details(details, expected)
@@ -96,6 +96,20 @@ class AccountBalanceCommonWizard(orm.TransientModel):
             help='Filter by date: no opening balance will be displayed. '
             '(opening balance can only be computed based on period to be \
             correct).'),
+        'balance_reader': fields.selection(
+            [('sql', 'Direct SQL'),
+             ('sql_parallel', 'Direct SQL, companies in parallel'),
+             ('orm', 'Standard computation')],
+            "Balance Computation",
+            required=True,
+            help='Direct SQL: the balances are computed with one grouped '
+            'query and summed through the accounts tree (fast). '
+            'Direct SQL, companies in parallel: same, with the accounts of '
+            'each company computed at the same time (consolidated charts, '
+            'see the system parameter '
+            'account_financial_report_webkit.balance_workers). '
+            'Standard computation: the balances are computed by the '
+            'accounts themselves, use it to validate the figures.'),
     }
 
     for index in range(COMPARISON_LEVEL):
@@ -116,6 +130,7 @@ class AccountBalanceCommonWizard(orm.TransientModel):
 
     _defaults = {
         'account_ids': _get_account_ids,
+        'balance_reader': 'sql',
     }
 
     def _check_fiscalyear(self, cr, uid, ids, context=None):
@@ -394,7 +409,7 @@ class AccountBalanceCommonWizard(orm.TransientModel):
         # will be used to attach the report on the main account
         data['ids'] = [data['form']['chart_account_id']]
 
-        fields_to_read = ['account_ids', ]
+        fields_to_read = ['account_ids', 'balance_reader']
         fields_to_read += self.DYNAMIC_FIELDS
         vals = self.read(cr, uid, ids, fields_to_read, context=context)[0]
 
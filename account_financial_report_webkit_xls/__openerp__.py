@@ -34,8 +34,13 @@
         - partner balance
         - open invoices
 
+    The reports can also be exported in the xlsx format (requires the
+    python library xlsxwriter), written with a bounded memory usage and
+    without the row limit of the xls format.
+
     """,
-    'depends': ['report_xls', 'account_financial_report_webkit'],
+    'depends': ['report_xls', 'report_xls_style',
+                'account_financial_report_webkit'],
     'demo': [],
     'data': [
         'wizard/general_ledger_wizard_view.xml',
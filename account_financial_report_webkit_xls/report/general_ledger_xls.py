@@ -20,10 +20,10 @@
 #
 ##############################################################################
 
-import xlwt
 from datetime import datetime
 from openerp.addons.report_xls.report_xls import report_xls
 from openerp.addons.report_xls.utils import rowcol_to_cell
+from .report_xlsx import report_xlsx
 from openerp.addons.account_financial_report_webkit.report.general_ledger \
     import GeneralLedgerWebkit
 from openerp.tools.translate import _
@@ -47,7 +47,7 @@ _column_sizes = [
 ]
 
 
-class general_ledger_xls(report_xls):
+class general_ledger_xls(report_xlsx):
     column_sizes = [x[1] for x in _column_sizes]
 
     def generate_xls_report(self, _p, _xs, data, objects, wb):
@@ -69,7 +69,7 @@ class general_ledger_xls(report_xls):
                                 False: _('No')}
 
         # Title
-        cell_style = xlwt.easyxf(_xs['xls_title'])
+        cell_style = self.xls_style(_xs['xls_title'])
         report_name = ' - '.join([_p.report_name.upper(),
                                  _p.company.partner_id.name,
                                  _p.company.currency_id.name])
@@ -90,8 +90,8 @@ class general_ledger_xls(report_xls):
 
         # Header Table
         cell_format = _xs['bold'] + _xs['fill_blue'] + _xs['borders_all']
-        cell_style = xlwt.easyxf(cell_format)
-        cell_style_center = xlwt.easyxf(cell_format + _xs['center'])
+        cell_style = self.xls_style(cell_format)
+        cell_style_center = self.xls_style(cell_format + _xs['center'])
         c_specs = [
             ('coa', 2, 0, 'text', _('Chart of Account')),
             ('fy', 1, 0, 'text', _('Fiscal Year')),
@@ -107,8 +107,8 @@ class general_ledger_xls(report_xls):
             ws, row_pos, row_data, row_style=cell_style_center)
 
         cell_format = _xs['borders_all']
-        cell_style = xlwt.easyxf(cell_format)
-        cell_style_center = xlwt.easyxf(cell_format + _xs['center'])
+        cell_style = self.xls_style(cell_format)
+        cell_style_center = self.xls_style(cell_format + _xs['center'])
         c_specs = [
             ('coa', 2, 0, 'text', _p.chart_account.name),
             ('fy', 1, 0, 'text', _p.fiscalyear.name if _p.fiscalyear else '-'),
@@ -139,21 +139,21 @@ class general_ledger_xls(report_xls):
 
         # Column Title Row
         cell_format = _xs['bold']
-        c_title_cell_style = xlwt.easyxf(cell_format)
+        c_title_cell_style = self.xls_style(cell_format)
 
         # Column Header Row
         cell_format = _xs['bold'] + _xs['fill'] + _xs['borders_all']
-        c_hdr_cell_style = xlwt.easyxf(cell_format)
-        c_hdr_cell_style_right = xlwt.easyxf(cell_format + _xs['right'])
-        c_hdr_cell_style_center = xlwt.easyxf(cell_format + _xs['center'])
-        c_hdr_cell_style_decimal = xlwt.easyxf(
+        c_hdr_cell_style = self.xls_style(cell_format)
+        c_hdr_cell_style_right = self.xls_style(cell_format + _xs['right'])
+        c_hdr_cell_style_center = self.xls_style(cell_format + _xs['center'])
+        c_hdr_cell_style_decimal = self.xls_style(
             cell_format + _xs['right'],
             num_format_str=report_xls.decimal_format)
 
         # Column Initial Balance Row
         cell_format = _xs['italic'] + _xs['borders_all']
-        c_init_cell_style = xlwt.easyxf(cell_format)
-        c_init_cell_style_decimal = xlwt.easyxf(
+        c_init_cell_style = self.xls_style(cell_format)
+        c_init_cell_style_decimal = self.xls_style(
             cell_format + _xs['right'],
             num_format_str=report_xls.decimal_format)
 
@@ -185,12 +185,12 @@ class general_ledger_xls(report_xls):
 
         # cell styles for ledger lines
         ll_cell_format = _xs['borders_all']
-        ll_cell_style = xlwt.easyxf(ll_cell_format)
-        ll_cell_style_center = xlwt.easyxf(ll_cell_format + _xs['center'])
-        ll_cell_style_date = xlwt.easyxf(
+        ll_cell_style = self.xls_style(ll_cell_format)
+        ll_cell_style_center = self.xls_style(ll_cell_format + _xs['center'])
+        ll_cell_style_date = self.xls_style(
             ll_cell_format + _xs['left'],
             num_format_str=report_xls.date_format)
-        ll_cell_style_decimal = xlwt.easyxf(
+        ll_cell_style_decimal = self.xls_style(
             ll_cell_format + _xs['right'],
             num_format_str=report_xls.decimal_format)
 
@@ -24,6 +24,7 @@ import xlwt
 from datetime import datetime
 from openerp.addons.report_xls.report_xls import report_xls
 from openerp.addons.report_xls.utils import rowcol_to_cell
+from .report_xlsx import report_xlsx
 from openerp.addons.account_financial_report_webkit.report.open_invoices \
     import PartnersOpenInvoicesWebkit
 from openerp.tools.translate import _
@@ -31,7 +32,7 @@ from openerp.tools.translate import _
 # _logger = logging.getLogger(__name__)
 
 
-class open_invoices_xls(report_xls):
+class open_invoices_xls(report_xlsx):
     column_sizes = [12, 12, 20, 15, 30, 30, 14, 14, 14, 14, 14, 14, 10]
 
     def global_initializations(self, wb, _p, xlwt, _xs, objects, data):
@@ -62,70 +63,70 @@ class open_invoices_xls(report_xls):
             self.nbr_columns = 11
         # -------------------------------------------------------
         # cell style for report title
-        self.style_font12 = xlwt.easyxf(_xs['xls_title'])
+        self.style_font12 = self.xls_style(_xs['xls_title'])
         # -------------------------------------------------------
-        self.style_default = xlwt.easyxf(_xs['borders_all'])
+        self.style_default = self.xls_style(_xs['borders_all'])
         # -------------------------------------------------------
-        self.style_default_italic = xlwt.easyxf(
+        self.style_default_italic = self.xls_style(
             _xs['borders_all'] + _xs['italic'])
         # -------------------------------------------------------
-        self.style_bold = xlwt.easyxf(_xs['bold'] + _xs['borders_all'])
+        self.style_bold = self.xls_style(_xs['bold'] + _xs['borders_all'])
         # -------------------------------------------------------
         # cell style for header titles: 'Chart of accounts' - 'Fiscal year' ...
-        self.style_bold_blue_center = xlwt.easyxf(
+        self.style_bold_blue_center = self.xls_style(
             _xs['bold'] + _xs['fill_blue'] + _xs['borders_all'] +
             _xs['center'])
         # -------------------------------------------------------
         # cell style for header data: 'Chart of accounts' - 'Fiscal year' ...
-        self.style_center = xlwt.easyxf(
+        self.style_center = self.xls_style(
             _xs['borders_all'] + _xs['wrap'] + _xs['center'])
         # -------------------------------------------------------
         # cell style for columns titles 'Date'- 'Period' - 'Entry'...
-        self.style_yellow_bold = xlwt.easyxf(
+        self.style_yellow_bold = self.xls_style(
             _xs['bold'] + _xs['fill'] + _xs['borders_all'])
         # -------------------------------------------------------
         # cell style for columns titles 'Date'- 'Period' - 'Entry'...
-        self.style_yellow_bold_right = xlwt.easyxf(
+        self.style_yellow_bold_right = self.xls_style(
             _xs['bold'] + _xs['fill'] + _xs['borders_all'] + _xs['right'])
         # -------------------------------------------------------
-        self.style_right = xlwt.easyxf(_xs['borders_all'] + _xs['right'])
+        self.style_right = self.xls_style(_xs['borders_all'] + _xs['right'])
         # -------------------------------------------------------
-        self.style_right_italic = xlwt.easyxf(
+        self.style_right_italic = self.xls_style(
             _xs['borders_all'] + _xs['right'] + _xs['italic'])
         # -------------------------------------------------------
-        self.style_decimal = xlwt.easyxf(
+        self.style_decimal = self.xls_style(
             _xs['borders_all'] + _xs['right'],
             num_format_str=report_xls.decimal_format)
         # -------------------------------------------------------
-        self.style_decimal_italic = xlwt.easyxf(
+        self.style_decimal_italic = self.xls_style(
             _xs['borders_all'] + _xs['right'] + _xs['italic'],
             num_format_str=report_xls.decimal_format)
         # -------------------------------------------------------
-        self.style_date = xlwt.easyxf(
+        self.style_date = self.xls_style(
             _xs['borders_all'] + _xs['left'],
             num_format_str=report_xls.date_format)
         # -------------------------------------------------------
-        self.style_date_italic = xlwt.easyxf(
+        self.style_date_italic = self.xls_style(
             _xs['borders_all'] + _xs['left'] + _xs['italic'],
             num_format_str=report_xls.date_format)
         # -------------------------------------------------------
         cell_format = _xs['xls_title'] + _xs['bold'] + \
             _xs['fill'] + _xs['borders_all']
-        self.style_account_title = xlwt.easyxf(cell_format)
-        self.style_account_title_right = xlwt.easyxf(
+        self.style_account_title = self.xls_style(cell_format)
+        self.style_account_title_right = self.xls_style(
             cell_format + _xs['right'])
-        self.style_account_title_decimal = xlwt.easyxf(
+        self.style_account_title_decimal = self.xls_style(
             cell_format + _xs['right'],
             num_format_str=report_xls.decimal_format)
         # -------------------------------------------------------
         cell_format = _xs['bold']
-        self.style_partner_row = xlwt.easyxf(cell_format)
+        self.style_partner_row = self.xls_style(cell_format)
         # -------------------------------------------------------
         cell_format = _xs['bold'] + _xs['fill'] + _xs['borders_all']
-        self.style_partner_cumul = xlwt.easyxf(cell_format)
-        self.style_partner_cumul_right = xlwt.easyxf(
+        self.style_partner_cumul = self.xls_style(cell_format)
+        self.style_partner_cumul_right = self.xls_style(
             cell_format + _xs['right'])
-        self.style_partner_cumul_decimal = xlwt.easyxf(
+        self.style_partner_cumul_decimal = self.xls_style(
             cell_format + _xs['right'],
             num_format_str=report_xls.decimal_format)
 
@@ -23,6 +23,7 @@
 import xlwt
 from openerp.addons.report_xls.report_xls import report_xls
 from openerp.addons.report_xls.utils import rowcol_to_cell
+from .report_xlsx import report_xlsx
 from openerp.addons.account_financial_report_webkit.report.partner_balance \
     import PartnerBalanceWebkit
 from openerp.tools.translate import _
@@ -34,11 +35,11 @@ def display_line(all_comparison_lines):
     return any([line.get('balance') for line in all_comparison_lines])
 
 
-class partners_balance_xls(report_xls):
+class partners_balance_xls(report_xlsx):
     column_sizes = [12, 40, 25, 17, 17, 17, 17, 17]
 
     def print_title(self, ws, _p, row_position, xlwt, _xs):
-        cell_style = xlwt.easyxf(_xs['xls_title'])
+        cell_style = self.xls_style(_xs['xls_title'])
         report_name = ' - '.join([_p.report_name.upper(),
                                  _p.company.partner_id.name,
                                  _p.company.currency_id.name])
@@ -61,8 +62,8 @@ class partners_balance_xls(report_xls):
 
     def print_header_titles(self, ws, _p, data, row_position, xlwt, _xs):
         cell_format = _xs['bold'] + _xs['fill_blue'] + _xs['borders_all']
-        cell_style = xlwt.easyxf(cell_format)
-        cell_style_center = xlwt.easyxf(cell_format + _xs['center'])
+        cell_style = self.xls_style(cell_format)
+        cell_style_center = self.xls_style(cell_format + _xs['center'])
 
         c_specs = [
             ('fy', 1, 0, 'text', _('Fiscal Year'), None, cell_style_center),
@@ -87,8 +88,8 @@ class partners_balance_xls(report_xls):
     def print_header_data(self, ws, _p, data, row_position, xlwt, _xs,
                           initial_balance_text):
         cell_format = _xs['borders_all'] + _xs['wrap'] + _xs['top']
-        cell_style = xlwt.easyxf(cell_format)
-        cell_style_center = xlwt.easyxf(cell_format + _xs['center'])
+        cell_style = self.xls_style(cell_format)
+        cell_style_center = self.xls_style(cell_format + _xs['center'])
         c_specs = [
             ('fy', 1, 0, 'text', _p.fiscalyear.name if _p.fiscalyear else '-',
              None, cell_style_center),
@@ -125,13 +126,13 @@ class partners_balance_xls(report_xls):
     def print_comparison_header(self, _xs, xlwt, row_position, _p, ws,
                                 initial_balance_text):
         cell_format_ct = _xs['bold'] + _xs['fill_blue'] + _xs['borders_all']
-        cell_style_ct = xlwt.easyxf(cell_format_ct)
+        cell_style_ct = self.xls_style(cell_format_ct)
         c_specs = [('ct', 7, 0, 'text', _('Comparisons'))]
         row_data = self.xls_row_template(c_specs, [x[0] for x in c_specs])
         row_position = self.xls_write_row(
             ws, row_position, row_data, row_style=cell_style_ct)
         cell_format = _xs['borders_all'] + _xs['wrap'] + _xs['top']
-        cell_style_center = xlwt.easyxf(cell_format)
+        cell_style_center = self.xls_style(cell_format)
         for index, params in enumerate(_p.comp_params):
             c_specs = [
                 ('c', 2, 0, 'text', _('Comparison') + str(index + 1) +
@@ -158,9 +159,9 @@ class partners_balance_xls(report_xls):
     def print_account_header(self, ws, _p, _xs, xlwt, row_position):
         cell_format = _xs['bold'] + _xs['fill'] + \
             _xs['borders_all'] + _xs['wrap'] + _xs['top']
-        cell_style = xlwt.easyxf(cell_format)
-        cell_style_right = xlwt.easyxf(cell_format + _xs['right'])
-        cell_style_center = xlwt.easyxf(cell_format + _xs['center'])
+        cell_style = self.xls_style(cell_format)
+        cell_style_right = self.xls_style(cell_format + _xs['right'])
+        cell_style_center = self.xls_style(cell_format + _xs['center'])
         if len(_p.comp_params) == 2:
             account_span = 3
         else:
@@ -213,7 +214,7 @@ class partners_balance_xls(report_xls):
                                xlwt):
         cell_format = _xs['xls_title'] + _xs['bold'] + \
             _xs['fill'] + _xs['borders_all']
-        cell_style = xlwt.easyxf(cell_format)
+        cell_style = self.xls_style(cell_format)
         c_specs = [
             ('acc_title', 7, 0, 'text', ' - '.join([current_account.code,
                                                     current_account.name])), ]
@@ -226,8 +227,8 @@ class partners_balance_xls(report_xls):
                              row_position, current_account, _p):
         cell_format = _xs['bold'] + _xs['fill'] + \
             _xs['borders_all'] + _xs['wrap'] + _xs['top']
-        cell_style = xlwt.easyxf(cell_format)
-        cell_style_decimal = xlwt.easyxf(
+        cell_style = self.xls_style(cell_format)
+        cell_style_decimal = self.xls_style(
             cell_format + _xs['right'],
             num_format_str=report_xls.decimal_format)
         c_specs = [
@@ -292,8 +293,8 @@ class partners_balance_xls(report_xls):
 
         # cell styles for account data
         regular_cell_format = _xs['borders_all']
-        regular_cell_style = xlwt.easyxf(regular_cell_format)
-        regular_cell_style_decimal = xlwt.easyxf(
+        regular_cell_style = self.xls_style(regular_cell_format)
+        regular_cell_style_decimal = self.xls_style(
             regular_cell_format + _xs['right'],
             num_format_str=report_xls.decimal_format)
 
@@ -0,0 +1,341 @@
+# -*- encoding: utf-8 -*-
+##############################################################################
+#
+#    OpenERP, Open Source Management Solution
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+import re
+import tempfile
+import xlwt
+from datetime import datetime
+from openerp.osv import orm, fields
+from openerp.tools import DEFAULT_SERVER_DATETIME_FORMAT
+from openerp.tools.translate import _
+from openerp.addons.report_xls.report_xls import report_xls
+from openerp.addons.report_xls_style.report_xls_style import \
+    report_xls_style
+import logging
+_logger = logging.getLogger(__name__)
+
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+# rows of a worksheet in the xlsx format, the rows written after the last
+# one go on a new worksheet
+XLSX_MAX_ROWS = 1048576
+
+# default palette of the xls format, indexed by xlwt colour index
+_XLS_PALETTE = [
+    '#000000', '#FFFFFF', '#FF0000', '#00FF00', '#0000FF', '#FFFF00',
+    '#FF00FF', '#00FFFF',
+    '#000000', '#FFFFFF', '#FF0000', '#00FF00', '#0000FF', '#FFFF00',
+    '#FF00FF', '#00FFFF', '#800000', '#008000', '#000080', '#808000',
+    '#800080', '#008080', '#C0C0C0', '#808080', '#9999FF', '#993366',
+    '#FFFFCC', '#CCFFFF', '#660066', '#FF8080', '#0066CC', '#CCCCFF',
+    '#000080', '#FF00FF', '#FFFF00', '#00FFFF', '#800080', '#800000',
+    '#008080', '#0000FF', '#00CCFF', '#CCFFFF', '#CCFFCC', '#FFFF99',
+    '#99CCFF', '#FF99CC', '#CC99FF', '#FFCC99', '#3366FF', '#33CCCC',
+    '#99CC00', '#FFCC00', '#FF9900', '#FF6600', '#666699', '#969696',
+    '#003366', '#339966', '#003300', '#333300', '#993300', '#993366',
+    '#333399', '#333333',
+]
+
+_XLS_HORZ = {1: 'left', 2: 'center', 3: 'right', 4: 'fill', 5: 'justify',
+             6: 'center_across'}
+_XLS_VERT = {0: 'top', 1: 'vcenter', 3: 'vjustify'}
+
+# cell references of a formula, with an optional second cell for ranges
+_CELL_REF = re.compile(
+    r"(?<![\w'!$.])(\$?[A-Z]{1,3}\$?)(\d+)"
+    r"(?::(\$?[A-Z]{1,3}\$?)(\d+))?(?![\w(])")
+
+
+def _xls_colour(index):
+    if 0 <= index < len(_XLS_PALETTE):
+        return _XLS_PALETTE[index]
+    return None  # automatic colour
+
+
+def xlsx_format_properties(style):
+    """Translate an xlwt style in the format properties of xlsxwriter"""
+    font = style.font
+    props = {'font_name': font.name, 'font_size': font.height / 20.0}
+    if font.bold:
+        props['bold'] = True
+    if font.italic:
+        props['italic'] = True
+    if font.underline:
+        props['underline'] = 1
+    if _xls_colour(font.colour_index):
+        props['font_color'] = _xls_colour(font.colour_index)
+    alignment = style.alignment
+    if alignment.horz in _XLS_HORZ:
+        props['align'] = _XLS_HORZ[alignment.horz]
+    if alignment.vert in _XLS_VERT:
+        props['valign'] = _XLS_VERT[alignment.vert]
+    if alignment.wrap:
+        props['text_wrap'] = True
+    borders = style.borders
+    for side in ('left', 'right', 'top', 'bottom'):
+        line = getattr(borders, side)
+        if line:
+            props[side] = line
+            colour = _xls_colour(getattr(borders, side + '_colour'))
+            if colour:
+                props[side + '_color'] = colour
+    pattern = style.pattern
+    if pattern.pattern:
+        props['pattern'] = pattern.pattern
+        if _xls_colour(pattern.pattern_fore_colour):
+            props['bg_color'] = _xls_colour(pattern.pattern_fore_colour)
+    if style.num_format_str and style.num_format_str != 'General':
+        props['num_format'] = style.num_format_str
+    return props
+
+
+class AttrDict(dict):
+
+    def __init__(self, *args, **kwargs):
+        super(AttrDict, self).__init__(*args, **kwargs)
+        self.__dict__ = self
+
+
+class XlsxColumn(object):
+
+    def __init__(self, sheet, col):
+        self._sheet = sheet
+        self._col = col
+
+    def _set_width(self, width):
+        self._sheet.widths[self._col] = width
+
+    width = property(lambda self: self._sheet.widths.get(self._col),
+                     _set_width)
+
+
+class XlsxSheet(object):
+
+    """Worksheet of an XlsxWorkbook, accepting the calls the report
+    generators make on xlwt worksheets
+
+    The rows are flushed to disk as soon as a following row is written, so
+    they must be written in ascending order. When the rows of the report
+    do not fit in one worksheet, the next rows go on a continuation
+    worksheet and the references of the formulas are translated to the
+    worksheets holding the cells.
+    """
+
+    def __init__(self, workbook, name):
+        self.workbook = workbook
+        self.name = name
+        self.sheets = []  # (worksheet, first row of the report)
+        self.widths = {}
+        self.panes_frozen = False
+        self.remove_splits = False
+        self.portrait = 1
+        self.fit_width_to_pages = 0
+        self.header_str = ''
+        self.footer_str = ''
+        self.horz_split_pos = 0
+        self._add_worksheet(0)
+
+    def _add_worksheet(self, offset):
+        name = self.name
+        if self.sheets:
+            suffix = ' (%d)' % (len(self.sheets) + 1)
+            name = name[:31 - len(suffix)] + suffix
+        self.sheets.append((self.workbook.book.add_worksheet(name), offset))
+
+    def _worksheet(self, row):
+        worksheet, offset = self.sheets[-1]
+        if row - offset >= XLSX_MAX_ROWS:
+            self._add_worksheet(row)
+            worksheet, offset = self.sheets[-1]
+        return worksheet, row - offset
+
+    def _translate_formula(self, formula):
+        current = len(self.sheets) - 1
+
+        def translate(match):
+            col_first, row_first, col_last, row_last = match.groups()
+            first = int(row_first) - 1
+            last = int(row_last) - 1 if row_last else first
+            refs = []
+            for index, (worksheet, offset) in enumerate(self.sheets):
+                end = (self.sheets[index + 1][1] - 1
+                       if index + 1 < len(self.sheets) else last)
+                start, stop = max(first, offset), min(last, end)
+                if start > stop:
+                    continue
+                ref = '%s%d' % (col_first, start - offset + 1)
+                if row_last:
+                    ref += ':%s%d' % (col_last, stop - offset + 1)
+                if index != current:
+                    ref = "'%s'!%s" % (worksheet.name.replace("'", "''"), ref)
+                refs.append(ref)
+            return ','.join(refs) or match.group(0)
+
+        if len(self.sheets) == 1:
+            return formula
+        return _CELL_REF.sub(translate, formula)
+
+    def set_horz_split_pos(self, row):
+        self.horz_split_pos = row
+
+    def col(self, col):
+        return XlsxColumn(self, col)
+
+    def write_cell(self, row, col, size, cell_type, data, formula, style):
+        worksheet, row = self._worksheet(row)
+        cell_format = self.workbook.get_format(style)
+        if size != 1:
+            worksheet.merge_range(row, col, row, col + size - 1, '',
+                                  cell_format)
+        if formula:
+            worksheet.write_formula(row, col,
+                                    '=' + self._translate_formula(formula),
+                                    cell_format)
+        elif data is None or data == '':
+            worksheet.write_blank(row, col, None, cell_format)
+        elif cell_type == 'number':
+            worksheet.write_number(row, col, data, cell_format)
+        elif cell_type == 'date':
+            worksheet.write_datetime(row, col, data, cell_format)
+        elif cell_type == 'bool':
+            worksheet.write_boolean(row, col, data, cell_format)
+        else:
+            if isinstance(data, str):
+                data = data.decode('utf-8')
+            worksheet.write_string(row, col, data, cell_format)
+
+    def apply_settings(self):
+        for index, (worksheet, offset) in enumerate(self.sheets):
+            for col, width in self.widths.iteritems():
+                # xlwt widths are in 1/256 of the width of a character
+                worksheet.set_column(col, col, width / 256.0)
+            if not self.portrait:
+                worksheet.set_landscape()
+            if self.fit_width_to_pages:
+                worksheet.fit_to_pages(self.fit_width_to_pages, 0)
+            if self.header_str:
+                worksheet.set_header(self.header_str)
+            if self.footer_str:
+                worksheet.set_footer(self.footer_str)
+            if index == 0 and self.panes_frozen and self.horz_split_pos:
+                worksheet.freeze_panes(self.horz_split_pos, 0)
+
+
+class XlsxWorkbook(object):
+
+    """Workbook written with xlsxwriter in constant memory mode, accepting
+    the calls the report generators make on xlwt workbooks
+
+    The xlwt styles are translated once in xlsxwriter formats, the same
+    style used by many cells adds only one format to the workbook.
+    """
+
+    def __init__(self, stream):
+        self.book = xlsxwriter.Workbook(stream, {'constant_memory': True})
+        self.sheets = []
+        self._formats = {}
+        self._style_formats = {}
+
+    def add_sheet(self, name):
+        sheet = XlsxSheet(self, name)
+        self.sheets.append(sheet)
+        return sheet
+
+    def get_format(self, style):
+        if id(style) in self._style_formats:
+            return self._style_formats[id(style)][1]
+        props = xlsx_format_properties(style)
+        key = tuple(sorted(props.items()))
+        cell_format = self._formats.get(key)
+        if cell_format is None:
+            cell_format = self._formats[key] = self.book.add_format(props)
+        # keep the style so its id is not reused by another style
+        self._style_formats[id(style)] = (style, cell_format)
+        return cell_format
+
+    def close(self):
+        for sheet in self.sheets:
+            sheet.apply_settings()
+        self.book.close()
+
+
+class report_xlsx(report_xls_style):
+
+    """report_xls generating the same report in the xlsx format when the
+    wizard asks for it (xls_format of the form)
+
+    The xlsx workbook is written in constant memory, so reports with more
+    rows than an xls worksheet can hold are exported with bounded memory.
+    """
+
+    def create_source_xls(self, cr, uid, ids, data, context=None):
+        if data.get('form', {}).get('xls_format') != 'xlsx':
+            return super(report_xlsx, self).create_source_xls(
+                cr, uid, ids, data, context=context)
+        if xlsxwriter is None:
+            raise orm.except_orm(
+                _('Error!'),
+                _('The python library xlsxwriter is required to export '
+                  'in the xlsx format.'))
+        if not context:
+            context = {}
+        parser_instance = self.parser(cr, uid, self.name2, context)
+        self.parser_instance = parser_instance
+        objs = self.getObjects(cr, uid, ids, context)
+        parser_instance.set_context(objs, data, ids, 'xls')
+        objs = parser_instance.localcontext['objects']
+        _p = AttrDict(parser_instance.localcontext)
+        _xs = self.xls_styles
+        self.xls_headers = {'standard': ''}
+        report_date = fields.datetime.context_timestamp(
+            cr, uid, datetime.now(), context).strftime(
+            DEFAULT_SERVER_DATETIME_FORMAT)
+        self.xls_footers = {
+            'standard': ('&L&%(font_size)s&%(font_style)s' + report_date +
+                         '&R&%(font_size)s&%(font_style)s&P / &N')
+            % self.hf_params,
+        }
+        with tempfile.TemporaryFile() as stream:
+            wb = XlsxWorkbook(stream)
+            self.generate_xls_report(_p, _xs, data, objs, wb)
+            wb.close()
+            stream.seek(0)
+            return (stream.read(), 'xlsx')
+
+    def xls_write_row(self, ws, row_pos, row_data,
+                      row_style=xlwt.Style.default_style,
+                      set_column_size=False):
+        if not isinstance(ws, XlsxSheet):
+            return super(report_xlsx, self).xls_write_row(
+                ws, row_pos, row_data, row_style=row_style,
+                set_column_size=set_column_size)
+        for col, size, spec in row_data:
+            data = spec[4]
+            if not data:
+                # if no data, use default values
+                data = report_xls.xls_types_default[spec[3]]
+            ws.write_cell(row_pos, col, size, spec[3], data,
+                          spec[5].get('formula'), spec[6] or row_style)
+            if set_column_size:
+                ws.col(col).width = spec[2] * 256
+        return row_pos + 1
@@ -20,9 +20,9 @@
 #
 ##############################################################################
 
-import xlwt
 from openerp.addons.report_xls.report_xls import report_xls
 from openerp.addons.report_xls.utils import rowcol_to_cell
+from .report_xlsx import report_xlsx
 from openerp.addons.account_financial_report_webkit.report.trial_balance \
     import TrialBalanceWebkit
 from openerp.tools.translate import _
@@ -30,7 +30,7 @@ from openerp.tools.translate import _
 # _logger = logging.getLogger(__name__)
 
 
-class trial_balance_xls(report_xls):
+class trial_balance_xls(report_xlsx):
     column_sizes = [12, 60, 17, 17, 17, 17, 17, 17]
 
     def generate_xls_report(self, _p, _xs, data, objects, wb):
@@ -52,7 +52,7 @@ class trial_balance_xls(report_xls):
                                 False: _('No')}
 
         # Title
-        cell_style = xlwt.easyxf(_xs['xls_title'])
+        cell_style = self.xls_style(_xs['xls_title'])
         report_name = ' - '.join([_p.report_name.upper(),
                                  _p.company.partner_id.name,
                                  _p.company.currency_id.name])
@@ -73,8 +73,8 @@ class trial_balance_xls(report_xls):
 
         # Header Table
         cell_format = _xs['bold'] + _xs['fill_blue'] + _xs['borders_all']
-        cell_style = xlwt.easyxf(cell_format)
-        cell_style_center = xlwt.easyxf(cell_format + _xs['center'])
+        cell_style = self.xls_style(cell_format)
+        cell_style_center = self.xls_style(cell_format + _xs['center'])
         c_specs = [
             ('fy', 1, 0, 'text', _('Fiscal Year')),
             ('af', 2, 0, 'text', _('Accounts Filter')),
@@ -91,8 +91,8 @@ class trial_balance_xls(report_xls):
             ws, row_pos, row_data, row_style=cell_style)
 
         cell_format = _xs['borders_all'] + _xs['wrap'] + _xs['top']
-        cell_style = xlwt.easyxf(cell_format)
-        cell_style_center = xlwt.easyxf(cell_format + _xs['center'])
+        cell_style = self.xls_style(cell_format)
+        cell_style_center = self.xls_style(cell_format + _xs['center'])
         c_specs = [
             ('fy', 1, 0, 'text', _p.fiscalyear.name if _p.fiscalyear else '-'),
             ('af', 2, 0, 'text', _p.accounts(data) and ', '.join(
@@ -126,12 +126,12 @@ class trial_balance_xls(report_xls):
             row_pos += 1
             cell_format_ct = _xs['bold'] + \
                 _xs['fill_blue'] + _xs['borders_all']
-            cell_style_ct = xlwt.easyxf(cell_format_ct)
+            cell_style_ct = self.xls_style(cell_format_ct)
             c_specs = [('ct', 8, 0, 'text', _('Comparisons'))]
             row_data = self.xls_row_template(c_specs, [x[0] for x in c_specs])
             row_pos = self.xls_write_row(
                 ws, row_pos, row_data, row_style=cell_style_ct)
-            cell_style_center = xlwt.easyxf(cell_format)
+            cell_style_center = self.xls_style(cell_format)
             for index, params in enumerate(_p.comp_params):
                 c_specs = [
                     ('c', 3, 0, 'text', _('Comparison') + str(index + 1) +
@@ -162,9 +162,9 @@ class trial_balance_xls(report_xls):
         # Column Header Row
         cell_format = _xs['bold'] + _xs['fill_blue'] + \
             _xs['borders_all'] + _xs['wrap'] + _xs['top']
-        cell_style = xlwt.easyxf(cell_format)
-        cell_style_right = xlwt.easyxf(cell_format + _xs['right'])
-        cell_style_center = xlwt.easyxf(cell_format + _xs['center'])
+        cell_style = self.xls_style(cell_format)
+        cell_style_right = self.xls_style(cell_format + _xs['right'])
+        cell_style_center = self.xls_style(cell_format + _xs['center'])
         if len(_p.comp_params) == 2:
             account_span = 3
         else:
@@ -218,21 +218,22 @@ class trial_balance_xls(report_xls):
 
         # cell styles for account data
         view_cell_format = _xs['bold'] + _xs['fill'] + _xs['borders_all']
-        view_cell_style = xlwt.easyxf(view_cell_format)
-        view_cell_style_center = xlwt.easyxf(view_cell_format + _xs['center'])
-        view_cell_style_decimal = xlwt.easyxf(
+        view_cell_style = self.xls_style(view_cell_format)
+        view_cell_style_center = self.xls_style(
+            view_cell_format + _xs['center'])
+        view_cell_style_decimal = self.xls_style(
             view_cell_format + _xs['right'],
             num_format_str=report_xls.decimal_format)
-        view_cell_style_pct = xlwt.easyxf(
+        view_cell_style_pct = self.xls_style(
             view_cell_format + _xs['center'], num_format_str='0')
         regular_cell_format = _xs['borders_all']
-        regular_cell_style = xlwt.easyxf(regular_cell_format)
-        regular_cell_style_center = xlwt.easyxf(
+        regular_cell_style = self.xls_style(regular_cell_format)
+        regular_cell_style_center = self.xls_style(
             regular_cell_format + _xs['center'])
-        regular_cell_style_decimal = xlwt.easyxf(
+        regular_cell_style_decimal = self.xls_style(
             regular_cell_format + _xs['right'],
             num_format_str=report_xls.decimal_format)
-        regular_cell_style_pct = xlwt.easyxf(
+        regular_cell_style_pct = self.xls_style(
             regular_cell_format + _xs['center'], num_format_str='0')
 
         for current_account in objects:
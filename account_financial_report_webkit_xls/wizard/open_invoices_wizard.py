@@ -20,7 +20,7 @@
 #
 ##############################################################################
 
-from openerp.osv import orm
+from openerp.osv import fields, orm
 # import logging
 # _logger = logging.getLogger(__name__)
 
@@ -28,6 +28,20 @@ from openerp.osv import orm
 class open_invoices_webkit_wizard(orm.TransientModel):
     _inherit = 'open.invoices.webkit'
 
+    _columns = {
+        'xls_format': fields.selection(
+            [('xls', 'Excel 97-2003 (.xls)'),
+             ('xlsx', 'Excel 2007 and later (.xlsx)')],
+            'Export Format', required=True,
+            help="The xlsx format holds more than 65536 rows per sheet "
+                 "and is written with a bounded memory usage, use it for "
+                 "large exports."),
+    }
+
+    _defaults = {
+        'xls_format': 'xls',
+    }
+
     def xls_export(self, cr, uid, ids, context=None):
         return self.check_report(cr, uid, ids, context=context)
 
@@ -36,6 +50,8 @@ class open_invoices_webkit_wizard(orm.TransientModel):
         if context.get('xls_export'):
             # we update form with display account value
             data = self.pre_print_report(cr, uid, ids, data, context=context)
+            data['form']['xls_format'] = self.browse(
+                cr, uid, ids[0], context=context).xls_format
             return {'type': 'ir.actions.report.xml',
                     'report_name': 'account.account_report_open_invoices_xls',
                     'datas': data}
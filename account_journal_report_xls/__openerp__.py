@@ -29,6 +29,7 @@
     'depends': [
         'account_voucher',
         'report_xls',
+        'report_xls_style',
     ],
     'demo': [],
     'data': [
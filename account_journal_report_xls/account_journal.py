@@ -22,6 +22,9 @@
 
 from openerp.osv import orm
 
+# compiled document reference expressions, by expression
+_document_extra_code = {}
+
 
 class account_journal(orm.Model):
     _inherit = 'account.journal'
@@ -37,6 +40,34 @@ class account_journal(orm.Model):
     def _report_xls_document_extra(self, cr, uid, context):
         return "''"
 
+    def _report_xls_document_names(self, cr, uid, lines, eval_context,
+                                   context=None):
+        """
+        Return the origin document references of lines (a batch of the
+        dicts of the journal report query) of the journals other than sale,
+        purchase, bank and cash, one per line.
+
+        By default, the expression of _report_xls_document_extra is compiled
+        once and evaluated for every line, as 'x', with the names of
+        eval_context: the globals of the report module (e.g. 'time') and
+        'self' (the report parser, also 'parser'), 'object', 'j_obj',
+        '_', 'journal', 'journal_id', 'period_ids', 'period' and
+        'period_id' or 'fiscalyear', and 'lines' (the batch).
+        Override this method to compute the references of all the lines of
+        the batch at once, e.g. with a single query.
+        """
+        code_string = self._report_xls_document_extra(cr, uid, context)
+        code = _document_extra_code.get(code_string)
+        if code is None:
+            code = _document_extra_code[code_string] = compile(
+                code_string, '<_report_xls_document_extra>', 'eval')
+        eval_context = dict(eval_context)
+        res = []
+        for x in lines:
+            eval_context['x'] = x
+            res.append(eval(code, eval_context))
+        return res
+
     # override list in inherited module to add/drop columns or change order
     def _report_xls_fields(self, cr, uid, context=None):
         res = [
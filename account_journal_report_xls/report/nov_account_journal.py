@@ -21,6 +21,7 @@
 ##############################################################################
 
 import time
+from contextlib import closing
 from openerp.report import report_sxw
 from openerp.tools.translate import translate
 import logging
@@ -31,6 +32,9 @@ _ir_translation_name = 'nov.account.journal.print'
 
 class nov_journal_print(report_sxw.rml_parse):
 
+    # lines fetched at once from the database
+    _fetch_size = 2000
+
     def set_context(self, objects, data, ids, report_type=None):
         # _logger.warn('set_context, objects = %s, data = %s,
         # ids = %s', objects, data, ids)
@@ -47,6 +51,7 @@ class nov_journal_print(report_sxw.rml_parse):
             'display_currency'] = data['display_currency']
         self.group_entries = data['group_entries']
         self.print_by = data['print_by']
+        self._totals_cache = None
         self.report_type = report_type
         if self.print_by == 'period':
             journal_period_ids = data['journal_period_ids']
@@ -75,6 +80,7 @@ class nov_journal_print(report_sxw.rml_parse):
             'title': self._title,
             'amount_title': self._amount_title,
             'lines': self._lines,
+            'iter_lines': self._iter_lines,
             'sum1': self._sum1,
             'sum2': self._sum2,
             'tax_codes': self._tax_codes,
@@ -82,11 +88,26 @@ class nov_journal_print(report_sxw.rml_parse):
             '_': self._,
         })
         self.context = context
+        self._translations = None
 
-    def _(self, src):
+    def _load_translations(self):
+        """Read the translations of all the terms of the report in the
+        language of the report, the same as translate() would return"""
         lang = self.context.get('lang', 'en_US')
-        return translate(self.cr, _ir_translation_name, 'report', lang, src) \
-            or src
+        self.cr.execute(
+            "SELECT src, value FROM ir_translation "
+            "WHERE lang=%s AND type=%s AND name=%s ORDER BY id",
+            (lang, 'report', _ir_translation_name))
+        translations = {}
+        for src, value in self.cr.fetchall():
+            translations.setdefault(src, value)
+        return translations
+
+    def _(self, src):
+        # called for every line, so the terms are read once per report
+        if self._translations is None:
+            self._translations = self._load_translations()
+        return self._translations.get(src) or src
 
     def _title(self, object):
         return ((self.print_by == 'period' and self._('Period') or
@@ -97,41 +118,32 @@ class nov_journal_print(report_sxw.rml_parse):
             (self._('Amount'), self._('Currency')) or (
                 self._('Debit'), self._('Credit'))
 
-    def _lines(self, object):
-        j_obj = self.pool['account.journal']
-        _ = self._
-        journal = object[0]
-        journal_id = journal.id
-        if self.print_by == 'period':
-            period = object[1]
-            period_id = period.id
-            period_ids = [period_id]
-            # update status period
-            ids_journal_period = self.pool['account.journal.period'].\
-                search(self.cr, self.uid, [('journal_id', '=', journal_id),
-                                           ('period_id', '=', period_id)])
-            if ids_journal_period:
-                self.cr.execute(
-                    '''update account_journal_period set state=%s
-                    where journal_id=%s and period_id=%s and state=%s''',
-                    ('printed', journal_id, period_id, 'draft'))
-            else:
-                self.pool.get('account.journal.period').create(
-                    self.cr, self.uid,
-                    {'name': (journal.code or journal.name) + ':' +
-                             (period.name or ''),
-                        'journal_id': journal.id,
-                        'period_id': period.id,
-                        'state': 'printed',
-                     })
-                _logger.error("""The Entry for Period '%s', Journal '%s' was
-                missing in 'account.journal.period' and
-                has been fixed now !""",
-                              period.name, journal.name)
+    def _update_journal_period(self, journal, period):
+        # update status period
+        ids_journal_period = self.pool['account.journal.period'].\
+            search(self.cr, self.uid, [('journal_id', '=', journal.id),
+                                       ('period_id', '=', period.id)])
+        if ids_journal_period:
+            self.cr.execute(
+                '''update account_journal_period set state=%s
+                where journal_id=%s and period_id=%s and state=%s''',
+                ('printed', journal.id, period.id, 'draft'))
         else:
-            fiscalyear = object[1]
-            period_ids = [x.id for x in fiscalyear.period_ids]
+            self.pool.get('account.journal.period').create(
+                self.cr, self.uid,
+                {'name': (journal.code or journal.name) + ':' +
+                         (period.name or ''),
+                    'journal_id': journal.id,
+                    'period_id': period.id,
+                    'state': 'printed',
+                 })
+            _logger.error("""The Entry for Period '%s', Journal '%s' was
+            missing in 'account.journal.period' and
+            has been fixed now !""",
+                          period.name, journal.name)
 
+    def _lines_query(self, journal, period_ids):
+        j_obj = self.pool['account.journal']
         select_extra, join_extra, where_extra = j_obj._report_xls_query_extra(
             self.cr, self.uid, self.context)
 
@@ -139,119 +151,197 @@ class nov_journal_print(report_sxw.rml_parse):
         # field value translations.
         # If performance is no issue, you can adapt the _report_xls_template in
         # an inherited module to add field value translations.
-        self.cr.execute("SELECT l.move_id AS move_id, l.id AS aml_id, "
-                        "am.name AS move_name, "
-                        "coalesce(am.ref,'') AS move_ref, "
-                        "am.date AS move_date, "
-                        "aa.id AS account_id, aa.code AS acc_code, "
-                        "aa.name AS acc_name, "
-                        "aj.name AS journal, aj.code AS journal_code, "
-                        "coalesce(rp.name,'') AS partner_name, "
-                        "coalesce(rp.ref,'') AS partner_ref, "
-                        "rp.id AS partner_id, "
-                        "coalesce(l.name,'') AS aml_name, "
-                        "l.date_maturity AS date_maturity, "
-                        "coalesce(ap.code, ap.name) AS period, "
-                        "coalesce(atc.code,'') AS tax_code, "
-                        "atc.id AS tax_code_id, "
-                        "coalesce(l.tax_amount,0.0) AS tax_amount, "
-                        "coalesce(l.debit,0.0) AS debit, "
-                        "coalesce(l.credit,0.0) AS credit, "
-                        "coalesce(amr.name,'') AS reconcile, "
-                        "coalesce(amrp.name,'') AS reconcile_partial, "
-                        "ana.name AS an_acc_name, "
-                        "coalesce(ana.code,'') AS an_acc_code, "
-                        "coalesce(l.amount_currency,0.0) AS amount_currency, "
-                        "rc.id AS currency_id, rc.name AS currency_name, "
-                        "rc.symbol AS currency_symbol, "
-                        "coalesce(ai.internal_number,'-') AS inv_number, "
-                        "coalesce(abs.name,'-') AS st_number, "
-                        "coalesce(av.number,'-') AS voucher_number "
-                        + select_extra +
-                        "FROM account_move_line l "
-                        "INNER JOIN account_move am ON l.move_id = am.id "
-                        "INNER JOIN account_account aa "
-                        "ON l.account_id = aa.id "
-                        "INNER JOIN account_journal aj "
-                        "ON l.journal_id = aj.id "
-                        "INNER JOIN account_period ap ON l.period_id = ap.id "
-                        "LEFT OUTER JOIN account_invoice ai "
-                        "ON ai.move_id = am.id "
-                        "LEFT OUTER JOIN account_voucher av "
-                        "ON av.move_id = am.id "
-                        "LEFT OUTER JOIN account_bank_statement abs "
-                        "ON l.statement_id = abs.id "
-                        "LEFT OUTER JOIN res_partner rp "
-                        "ON l.partner_id = rp.id "
-                        "LEFT OUTER JOIN account_tax_code atc "
-                        "ON l.tax_code_id = atc.id  "
-                        "LEFT OUTER JOIN account_move_reconcile amr "
-                        "ON l.reconcile_id = amr.id  "
-                        "LEFT OUTER JOIN account_move_reconcile amrp "
-                        "ON l.reconcile_partial_id = amrp.id  "
-                        "LEFT OUTER JOIN account_analytic_account ana "
-                        "ON l.analytic_account_id = ana.id  "
-                        "LEFT OUTER JOIN res_currency rc "
-                        "ON l.currency_id = rc.id  "
-                        + join_extra +
-                        "WHERE l.period_id IN %s AND l.journal_id = %s "
-                        "AND am.state IN %s "
-                        + where_extra +
-                        "ORDER BY " + self.sort_selection +
-                        ", move_date, move_id, acc_code",
-                        (tuple(period_ids), journal_id,
-                         tuple(self.move_states)))
-        lines = self.cr.dictfetchall()
+        return ("SELECT l.move_id AS move_id, l.id AS aml_id, "
+                "am.name AS move_name, "
+                "coalesce(am.ref,'') AS move_ref, "
+                "am.date AS move_date, "
+                "aa.id AS account_id, aa.code AS acc_code, "
+                "aa.name AS acc_name, "
+                "aj.name AS journal, aj.code AS journal_code, "
+                "coalesce(rp.name,'') AS partner_name, "
+                "coalesce(rp.ref,'') AS partner_ref, "
+                "rp.id AS partner_id, "
+                "coalesce(l.name,'') AS aml_name, "
+                "l.date_maturity AS date_maturity, "
+                "coalesce(ap.code, ap.name) AS period, "
+                "coalesce(atc.code,'') AS tax_code, "
+                "atc.id AS tax_code_id, "
+                "coalesce(l.tax_amount,0.0) AS tax_amount, "
+                "coalesce(l.debit,0.0) AS debit, "
+                "coalesce(l.credit,0.0) AS credit, "
+                "coalesce(amr.name,'') AS reconcile, "
+                "coalesce(amrp.name,'') AS reconcile_partial, "
+                "ana.name AS an_acc_name, "
+                "coalesce(ana.code,'') AS an_acc_code, "
+                "coalesce(l.amount_currency,0.0) AS amount_currency, "
+                "rc.id AS currency_id, rc.name AS currency_name, "
+                "rc.symbol AS currency_symbol, "
+                "coalesce(ai.internal_number,'-') AS inv_number, "
+                "coalesce(abs.name,'-') AS st_number, "
+                "coalesce(av.number,'-') AS voucher_number "
+                + select_extra +
+                "FROM account_move_line l "
+                "INNER JOIN account_move am ON l.move_id = am.id "
+                "INNER JOIN account_account aa "
+                "ON l.account_id = aa.id "
+                "INNER JOIN account_journal aj "
+                "ON l.journal_id = aj.id "
+                "INNER JOIN account_period ap ON l.period_id = ap.id "
+                "LEFT OUTER JOIN account_invoice ai "
+                "ON ai.move_id = am.id "
+                "LEFT OUTER JOIN account_voucher av "
+                "ON av.move_id = am.id "
+                "LEFT OUTER JOIN account_bank_statement abs "
+                "ON l.statement_id = abs.id "
+                "LEFT OUTER JOIN res_partner rp "
+                "ON l.partner_id = rp.id "
+                "LEFT OUTER JOIN account_tax_code atc "
+                "ON l.tax_code_id = atc.id  "
+                "LEFT OUTER JOIN account_move_reconcile amr "
+                "ON l.reconcile_id = amr.id  "
+                "LEFT OUTER JOIN account_move_reconcile amrp "
+                "ON l.reconcile_partial_id = amrp.id  "
+                "LEFT OUTER JOIN account_analytic_account ana "
+                "ON l.analytic_account_id = ana.id  "
+                "LEFT OUTER JOIN res_currency rc "
+                "ON l.currency_id = rc.id  "
+                + join_extra +
+                "WHERE l.period_id IN %s AND l.journal_id = %s "
+                "AND am.state IN %s "
+                + where_extra +
+                "ORDER BY " + self.sort_selection +
+                ", move_date, move_id, acc_code",
+                (tuple(period_ids), journal.id, tuple(self.move_states)))
 
+    def _set_docnames(self, journal, lines, eval_context):
+        j_obj = eval_context['j_obj']
+        _ = self._
         # add reference of corresponding origin document
         if journal.type in ('sale', 'sale_refund', 'purchase',
                             'purchase_refund'):
-            [x.update({'docname': (_('Invoice') + ': ' + x['inv_number'])
-                      or (_('Voucher') + ': ' + x['voucher_number']) or '-'})
+            invoice_label = _('Invoice') + ': '
+            [x.update({'docname': invoice_label + x['inv_number']})
              for x in lines]
         elif journal.type in ('bank', 'cash'):
-            [x.update({'docname': (_('Statement') + ': ' + x['st_number'])
-                      or (_('Voucher') + ': ' + x['voucher_number']) or '-'})
+            statement_label = _('Statement') + ': '
+            [x.update({'docname': statement_label + x['st_number']})
              for x in lines]
         else:
-            code_string = j_obj._report_xls_document_extra(
-                self.cr, self.uid, self.context)
-            # _logger.warn('code_string= %s', code_string)
-            [x.update({'docname': eval(code_string) or '-'}) for x in lines]
+            eval_context['lines'] = lines
+            docnames = j_obj._report_xls_document_names(
+                self.cr, self.uid, lines, eval_context, self.context)
+            for x, docname in zip(lines, docnames):
+                x['docname'] = docname or '-'
+
+    def _docname_eval_context(self, object, journal, period_ids):
+        """
+        Names available to the document reference expressions of
+        _report_xls_document_extra (account.journal), as when they were
+        evaluated inline: the globals of this module, the parser as 'self'
+        and the journal, period or fiscal year of object
+        """
+        eval_context = dict(globals())
+        eval_context.update({
+            'translate': translate,
+            'self': self,
+            'parser': self,
+            'object': object,
+            'j_obj': self.pool['account.journal'],
+            '_': self._,
+            'journal': journal,
+            'journal_id': journal.id,
+            'period_ids': period_ids,
+        })
+        if self.print_by == 'period':
+            eval_context.update({'period': object[1],
+                                 'period_id': object[1].id})
+        else:
+            eval_context['fiscalyear'] = object[1]
+        return eval_context
+
+    def _fetch_lines(self, object):
+        """
+        Generate the move lines of object with their document reference,
+        fetched by batches of _fetch_size lines from a server-side cursor
+        """
+        journal = object[0]
+        if self.print_by == 'period':
+            period = object[1]
+            period_ids = [period.id]
+            self._update_journal_period(journal, period)
+        else:
+            fiscalyear = object[1]
+            period_ids = [x.id for x in fiscalyear.period_ids]
+        query, params = self._lines_query(journal, period_ids)
+        eval_context = self._docname_eval_context(object, journal,
+                                                  period_ids)
+        # named cursor of the connection of the report, in its transaction
+        cursor_name = 'nov_journal_print_%s_%s' % (journal.id, object[1].id)
+        with closing(self.cr._cnx.cursor(cursor_name)) as server_cr:
+            server_cr.execute(query, params)
+            names = None
+            while True:
+                rows = server_cr.fetchmany(self._fetch_size)
+                if not rows:
+                    break
+                if names is None:
+                    names = [column[0] for column in server_cr.description]
+                lines = [dict(zip(names, row)) for row in rows]
+                self._set_docnames(journal, lines, eval_context)
+                for line in lines:
+                    yield line
+
+    def _format_lines(self, lines):
+        curr_obj = self.pool.get('res.currency')
+        for x in lines:
+            # format debit, credit, amount_currency for pdf report
+            if self.display_currency and self.report_type == 'pdf':
+                x.update({
+                    'amount1': self.formatLang(x['debit'] - x['credit']),
+                    'amount2': self.formatLang(
+                        x['amount_currency'], monetary=True,
+                        currency_obj=curr_obj.browse(self.cr, self.uid,
+                                                     x['currency_id'])),
+                })
+            elif self.report_type != 'xls':
+                x.update({'amount1': self.formatLang(x['debit']),
+                          'amount2': self.formatLang(x['credit'])})
+            yield x
+
+    def _iter_lines(self, object):
+        """
+        Generate the lines of object as the report shows them, processed as
+        they are fetched: only a batch of lines, the lines of the current
+        move when they are grouped and one line of lookahead are held in
+        memory.
+        """
+        lines = self._fetch_lines(object)
 
         # group lines
         if self.group_entries:
-            lines = self._group_lines(lines)
-
-        # format debit, credit, amount_currency for pdf report
-        if self.display_currency and self.report_type == 'pdf':
-            curr_obj = self.pool.get('res.currency')
-            [x.update({
-                'amount1': self.formatLang(x['debit'] - x['credit']),
-                'amount2': self.formatLang(
-                    x['amount_currency'], monetary=True,
-                    currency_obj=curr_obj.browse(self.cr,
-                                                 self.uid, x['currency_id'])),
-            }) for x in lines]
-        else:
-            [x.update({'amount1': self.formatLang(x['debit']),
-                       'amount2': self.formatLang(x['credit'])})
-             for x in lines]
+            lines = self._iter_group_lines(lines)
+
+        lines = self._format_lines(lines)
 
         # insert a flag in every move_line to indicate the end of a move
         # this flag will be used to draw a full line between moves
-        for cnt in range(len(lines) - 1):
-            if lines[cnt]['move_id'] != lines[cnt + 1]['move_id']:
-                lines[cnt]['draw_line'] = 1
-            else:
-                lines[cnt]['draw_line'] = 0
-        lines[-1]['draw_line'] = 1
+        previous = None
+        for line in lines:
+            if previous is not None:
+                previous['draw_line'] = \
+                    previous['move_id'] != line['move_id'] and 1 or 0
+                yield previous
+            previous = line
+        if previous is not None:
+            previous['draw_line'] = 1
+            yield previous
 
-        return lines
+    def _lines(self, object):
+        return list(self._iter_lines(object))
 
-    def _group_lines(self, lines_in):
+    def _iter_group_lines(self, lines_in):
 
-        _ = self._
+        grouped_label = self._('Grouped Entries')
 
         def group_move(lines_in):
             if len(lines_in) == 1:
@@ -267,70 +357,87 @@ class nov_journal_print(report_sxw.rml_parse):
                     lines_grouped[key]['debit'] += line['debit']
                     lines_grouped[key]['credit'] += line['credit']
                     lines_grouped[key]['tax_amount'] += line['tax_amount']
-                    lines_grouped[key]['aml_name'] = _('Grouped Entries')
+                    lines_grouped[key]['aml_name'] = grouped_label
             lines_out = lines_grouped.values()
             lines_out.sort(key=lambda x: x['acc_code'])
             return lines_out
 
-        lines_out = []
-        grouped_lines = [lines_in[0]]
-        move_id = lines_in[0]['move_id']
-        line_cnt = len(lines_in)
-        for i in range(1, line_cnt):
-            line = lines_in[i]
-            if line['move_id'] == move_id:
-                grouped_lines.append(line)
-                if i == line_cnt - 1:
-                    lines_out += group_move(grouped_lines)
-            else:
-                lines_out += group_move(grouped_lines)
-                grouped_lines = [line]
-                move_id = line['move_id']
-
-        return lines_out
+        grouped_lines = []
+        for line in lines_in:
+            if grouped_lines and \
+                    line['move_id'] != grouped_lines[0]['move_id']:
+                for grouped_line in group_move(grouped_lines):
+                    yield grouped_line
+                grouped_lines = []
+            grouped_lines.append(line)
+        if grouped_lines:
+            for grouped_line in group_move(grouped_lines):
+                yield grouped_line
 
-    def _tax_codes(self, object):
-        journal_id = object[0].id
+    def _group_lines(self, lines_in):
+        return list(self._iter_group_lines(lines_in))
+
+    def _compute_totals(self):
+        """
+        Return the totals of all the objects of the report, computed with one
+        query grouped by journal, period (or fiscal year) and tax code, as
+        {(journal id, period or fiscal year id):
+            {'debit': sum, 'credit': sum,
+             'tax_codes': [(tax code id, sum of tax amounts)] sorted by code}}
+        """
         if self.print_by == 'period':
-            period_id = object[1].id
-            period_ids = [period_id]
+            group = 'l.period_id'
         else:
-            fiscalyear = object[1]
-            period_ids = [x.id for x in fiscalyear.period_ids]
+            group = 'ap.fiscalyear_id'
+        journal_ids = set(o[0].id for o in self.objects)
+        group_ids = set(o[1].id for o in self.objects)
+        # the debit and credit totals are summed over the tax codes in SQL,
+        # to be exact
         self.cr.execute(
-            "SELECT distinct tax_code_id FROM account_move_line l "
+            "SELECT l.journal_id, " + group + ", l.tax_code_id, "
+            "sum(sum(l.debit)) OVER totals, "
+            "sum(sum(l.credit)) OVER totals, "
+            "sum(l.tax_amount) "
+            "FROM account_move_line l "
             "INNER JOIN account_move am ON l.move_id = am.id "
-            "WHERE l.period_id in %s AND l.journal_id=%s "
-            "AND l.tax_code_id IS NOT NULL AND am.state IN %s",
-            (tuple(period_ids), journal_id, tuple(self.move_states)))
-        ids = map(lambda x: x[0], self.cr.fetchall())
-        if ids:
-            self.cr.execute(
-                'SELECT id FROM account_tax_code WHERE id IN %s ORDER BY code',
-                (tuple(ids),))
-            tax_code_ids = map(lambda x: x[0], self.cr.fetchall())
-        else:
-            tax_code_ids = []
+            "INNER JOIN account_period ap ON l.period_id = ap.id "
+            "LEFT OUTER JOIN account_tax_code atc "
+            "ON l.tax_code_id = atc.id "
+            "WHERE l.journal_id IN %s AND " + group + " IN %s "
+            "AND am.state IN %s "
+            "GROUP BY l.journal_id, " + group + ", l.tax_code_id, atc.code "
+            "WINDOW totals AS (PARTITION BY l.journal_id, " + group + ") "
+            "ORDER BY atc.code",
+            (tuple(journal_ids), tuple(group_ids), tuple(self.move_states)))
+        totals = {}
+        for journal_id, group_id, tax_code_id, debit, credit, tax_amount \
+                in self.cr.fetchall():
+            total = totals.setdefault(
+                (journal_id, group_id),
+                {'debit': debit or 0.0, 'credit': credit or 0.0,
+                 'tax_codes': []})
+            if tax_code_id:
+                total['tax_codes'].append((tax_code_id, tax_amount or 0.0))
+        return totals
+
+    def _get_totals(self, object):
+        if self._totals_cache is None:
+            self._totals_cache = self._compute_totals()
+        return self._totals_cache.get(
+            (object[0].id, object[1].id),
+            {'debit': 0.0, 'credit': 0.0, 'tax_codes': []})
+
+    def _tax_codes(self, object):
+        tax_code_ids = [x[0] for x in self._get_totals(object)['tax_codes']]
         tax_codes = self.pool.get('account.tax.code').browse(
             self.cr, self.uid, tax_code_ids, self.context)
         return tax_codes
 
     def _totals(self, field, object, tax_code_id=None):
-        journal_id = object[0].id
-        if self.print_by == 'period':
-            period_id = object[1].id
-            period_ids = [period_id]
-        else:
-            fiscalyear = object[1]
-            period_ids = [x.id for x in fiscalyear.period_ids]
-        select = "SELECT sum(" + field + ") FROM account_move_line l " \
-            "INNER JOIN account_move am ON l.move_id = am.id " \
-            "WHERE l.period_id IN %s AND l.journal_id=%s AND am.state IN %s"
+        totals = self._get_totals(object)
         if field == 'tax_amount':
-            select += " AND tax_code_id=%s" % tax_code_id
-        self.cr.execute(
-            select, (tuple(period_ids), journal_id, tuple(self.move_states)))
-        return self.cr.fetchone()[0] or 0.0
+            return dict(totals['tax_codes']).get(tax_code_id, 0.0)
+        return totals[field]
 
     def _sum1(self, object):
         return self._totals('debit', object)
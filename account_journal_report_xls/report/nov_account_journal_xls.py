@@ -20,10 +20,11 @@
 #
 ##############################################################################
 
-import xlwt
 from datetime import datetime
 from openerp.osv import orm
 from openerp.addons.report_xls.report_xls import report_xls
+from openerp.addons.report_xls_style.report_xls_style import \
+    report_xls_style
 from openerp.addons.report_xls.utils import rowcol_to_cell, _render
 from .nov_account_journal import nov_journal_print
 from openerp.tools.translate import _
@@ -47,7 +48,7 @@ class account_journal_xls_parser(nov_journal_print):
         })
 
 
-class account_journal_xls(report_xls):
+class account_journal_xls(report_xls_style):
 
     def __init__(self, name, table, rml=False, parser=False, header=True,
                  store=False):
@@ -58,25 +59,28 @@ class account_journal_xls(report_xls):
         _xs = self.xls_styles
         # header
         rh_cell_format = _xs['bold'] + _xs['fill'] + _xs['borders_all']
-        self.rh_cell_style = xlwt.easyxf(rh_cell_format)
-        self.rh_cell_style_center = xlwt.easyxf(rh_cell_format + _xs['center'])
-        self.rh_cell_style_right = xlwt.easyxf(rh_cell_format + _xs['right'])
+        self.rh_cell_style = self.xls_style(rh_cell_format)
+        self.rh_cell_style_center = self.xls_style(
+            rh_cell_format + _xs['center'])
+        self.rh_cell_style_right = self.xls_style(
+            rh_cell_format + _xs['right'])
         # lines
         aml_cell_format = _xs['borders_all']
-        self.aml_cell_style = xlwt.easyxf(aml_cell_format)
-        self.aml_cell_style_center = xlwt.easyxf(
+        self.aml_cell_style = self.xls_style(aml_cell_format)
+        self.aml_cell_style_center = self.xls_style(
             aml_cell_format + _xs['center'])
-        self.aml_cell_style_date = xlwt.easyxf(
+        self.aml_cell_style_date = self.xls_style(
             aml_cell_format + _xs['left'],
             num_format_str=report_xls.date_format)
-        self.aml_cell_style_decimal = xlwt.easyxf(
+        self.aml_cell_style_decimal = self.xls_style(
             aml_cell_format + _xs['right'],
             num_format_str=report_xls.decimal_format)
         # totals
         rt_cell_format = _xs['bold'] + _xs['fill'] + _xs['borders_all']
-        self.rt_cell_style = xlwt.easyxf(rt_cell_format)
-        self.rt_cell_style_right = xlwt.easyxf(rt_cell_format + _xs['right'])
-        self.rt_cell_style_decimal = xlwt.easyxf(
+        self.rt_cell_style = self.xls_style(rt_cell_format)
+        self.rt_cell_style_right = self.xls_style(
+            rt_cell_format + _xs['right'])
+        self.rt_cell_style_decimal = self.xls_style(
             rt_cell_format + _xs['right'],
             num_format_str=report_xls.decimal_format)
 
@@ -236,7 +240,7 @@ class account_journal_xls(report_xls):
         }
 
     def _journal_title(self, o, ws, _p, row_pos, _xs):
-        cell_style = xlwt.easyxf(_xs['xls_title'])
+        cell_style = self.xls_style(_xs['xls_title'])
         report_name = (10 * ' ').join([
             _p.company.name,
             _p.title(o)[0],
@@ -267,12 +271,13 @@ class account_journal_xls(report_xls):
             set_column_size=True)
         ws.set_horz_split_pos(row_pos)
 
-        # account move lines
+        # account move lines, written as they are fetched
         aml_start_pos = row_pos
-        aml_cnt = len(_p.lines(o))
-        cnt = 0
-        for l in _p.lines(o):
-            cnt += 1
+        draw_line = False
+        for l in _p.iter_lines(o):
+            # a blank row between moves, none after the last one
+            if draw_line:
+                row_pos += 1
             debit_cell = rowcol_to_cell(row_pos, debit_pos)
             credit_cell = rowcol_to_cell(row_pos, credit_pos)
             bal_formula = debit_cell + '-' + credit_cell
@@ -283,8 +288,7 @@ class account_journal_xls(report_xls):
             row_data = self.xls_row_template(c_specs, [x[0] for x in c_specs])
             row_pos = self.xls_write_row(
                 ws, row_pos, row_data, row_style=self.aml_cell_style)
-            if l['draw_line'] and cnt != aml_cnt:
-                row_pos += 1
+            draw_line = l['draw_line']
 
         # Totals
         debit_start = rowcol_to_cell(aml_start_pos, debit_pos)
@@ -310,7 +314,7 @@ class account_journal_xls(report_xls):
         if not _p.tax_codes(o):
             return row_pos
 
-        title_cell_style = xlwt.easyxf(_xs['bold'])
+        title_cell_style = self.xls_style(_xs['bold'])
         c_specs = [('summary_title', 1, 0, 'text', _p._("VAT Declaration"))]
         row_data = self.xls_row_template(c_specs, [x[0] for x in c_specs])
         row_pos = self.xls_write_row(
@@ -97,13 +97,30 @@ class account_print_journal_xls(orm.TransientModel):
             fields_view_get(cr, uid, view_id, view_type, context, toolbar,
                             submenu)
 
+    def _journal_period_pairs(self, cr, uid, journal_ids, period_ids,
+                              move_states, context=None):
+        """ returns the set of (journal_id, period_id) with entries,
+        with one query applying the access rules of account.move """
+        move_obj = self.pool.get('account.move')
+        query = move_obj._where_calc(
+            cr, uid, [('journal_id', 'in', journal_ids),
+                      ('period_id', 'in', period_ids),
+                      ('state', 'in', move_states)],
+            context=context)
+        move_obj._apply_ir_rules(cr, uid, query, 'read', context=context)
+        from_clause, where_clause, where_params = query.get_sql()
+        cr.execute('SELECT DISTINCT "account_move".journal_id, '
+                   '"account_move".period_id '
+                   'FROM ' + from_clause + ' WHERE ' + where_clause,
+                   where_params)
+        return set(cr.fetchall())
+
     def xls_export(self, cr, uid, ids, context=None):
         return self.print_report(cr, uid, ids, context=context)
 
     def print_report(self, cr, uid, ids, context=None):
         if context is None:
             context = {}
-        move_obj = self.pool.get('account.move')
         print_by = context.get('print_by')
         wiz_form = self.browse(cr, uid, ids)[0]
         fiscalyear_id = wiz_form.fiscalyear_id.id
@@ -144,16 +161,16 @@ class account_print_journal_xls(orm.TransientModel):
             move_states = ['posted']
         else:
             move_states = ['draft', 'posted']
+        journal_period_pairs = self._journal_period_pairs(
+            cr, uid, wiz_journal_ids, wiz_period_ids, move_states,
+            context=context)
 
         if print_by == 'fiscalyear':
             journal_fy_ids = []
+            journals_with_entries = set(
+                x[0] for x in journal_period_pairs)
             for journal_id in wiz_journal_ids:
-                aml_ids = move_obj.search(cr, uid,
-                                          [('journal_id', '=', journal_id),
-                                           ('period_id', 'in', wiz_period_ids),
-                                           ('state', 'in', move_states)],
-                                          limit=1)
-                if aml_ids:
+                if journal_id in journals_with_entries:
                     journal_fy_ids.append((journal_id, fiscalyear_id))
             if not journal_fy_ids:
                 raise orm.except_orm(
@@ -168,15 +185,9 @@ class account_print_journal_xls(orm.TransientModel):
             # 'account.journal.period' since this table is not always reliable
             journal_period_ids = []
             for journal_id in wiz_journal_ids:
-                period_ids = []
-                for period_id in wiz_period_ids:
-                    aml_ids = move_obj.search(cr, uid,
-                                              [('journal_id', '=', journal_id),
-                                               ('period_id', '=', period_id),
-                                               ('state', 'in', move_states)],
-                                              limit=1)
-                    if aml_ids:
-                        period_ids.append(period_id)
+                period_ids = [period_id for period_id in wiz_period_ids
+                              if (journal_id, period_id)
+                              in journal_period_pairs]
                 if period_ids:
                     journal_period_ids.append((journal_id, period_ids))
             if not journal_period_ids:
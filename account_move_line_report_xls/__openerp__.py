@@ -27,7 +27,7 @@
     'author': "Noviat, Odoo Community Association (OCA)",
     'category': 'Accounting & Finance',
     'summary': 'Journal Items Excel export',
-    'depends': ['account', 'report_xls'],
+    'depends': ['account', 'report_xls', 'report_xls_style'],
     'data': [
         'report/move_line_list_xls.xml',
     ],
@@ -20,11 +20,14 @@
 #
 ##############################################################################
 
-import xlwt
+import dis
 from datetime import datetime
+from types import CodeType
 from openerp.osv import orm
 from openerp.report import report_sxw
 from openerp.addons.report_xls.report_xls import report_xls
+from openerp.addons.report_xls_style.report_xls_style import \
+    report_xls_style
 from openerp.addons.report_xls.utils import rowcol_to_cell, _render
 from openerp.tools.translate import translate, _
 import logging
@@ -33,6 +36,51 @@ _logger = logging.getLogger(__name__)
 _ir_translation_name = 'move.line.list.xls'
 
 
+def _attribute_chains(code, name):
+    """Return the chains of attributes read on the variable name by the
+    compiled expression code, e.g. ('partner_id', 'name') for
+    line.partner_id.name
+
+    The templates only keep the code objects of their expressions (see
+    report_xls.utils._render), so the chains are read from the bytecode,
+    in the format of CPython 2: an opcode byte, followed by a 2 bytes
+    argument when the opcode takes one, extended by a preceding
+    EXTENDED_ARG. A chain is a LOAD_NAME (or LOAD_GLOBAL) of name followed
+    by LOAD_ATTR instructions. The chains only serve to prefetch fields,
+    so a chain missed there is only read later, record by record.
+    """
+    chains = []
+    chain = None
+    co_code = code.co_code
+    extended_arg = 0
+    i = 0
+    while i < len(co_code):
+        op = ord(co_code[i])
+        arg = None
+        if op >= dis.HAVE_ARGUMENT:
+            arg = (ord(co_code[i + 1]) | ord(co_code[i + 2]) << 8 |
+                   extended_arg)
+            extended_arg = 0
+            i += 3
+        else:
+            i += 1
+        if op == dis.EXTENDED_ARG:
+            extended_arg = arg << 16
+            continue
+        if op == dis.opmap['LOAD_ATTR'] and chain is not None:
+            chain.append(code.co_names[arg])
+            continue
+        if chain:
+            chains.append(tuple(chain))
+        chain = None
+        if op in (dis.opmap['LOAD_NAME'], dis.opmap['LOAD_GLOBAL']) and \
+                code.co_names[arg] == name:
+            chain = []
+    if chain:
+        chains.append(tuple(chain))
+    return chains
+
+
 class move_line_xls_parser(report_sxw.rml_parse):
 
     def __init__(self, cr, uid, name, context):
@@ -55,7 +103,72 @@ class move_line_xls_parser(report_sxw.rml_parse):
             or src
 
 
-class move_line_xls(report_xls):
+class move_line_xls(report_xls_style):
+
+    # records of which the fields are read at once
+    _prefetch_size = 1000
+    # lines rendered between two clearings of the cache
+    _window_size = 10000
+
+    def _compile_row(self, col_specs, wanted_list, rowtype):
+        """
+        Return a function returning the row data of rowtype for a render
+        space, like the render() of each column and xls_row_template would,
+        with the column specs looked up once for all the rows
+        """
+        specs = []
+        expressions = []
+        for wanted in wanted_list:
+            spec = [wanted] + col_specs[wanted][rowtype]
+            expressions.extend((len(specs), i, value)
+                               for i, value in enumerate(spec)
+                               if isinstance(value, CodeType))
+            specs.append(spec)
+
+        def render_row(render_space):
+            c_specs = [spec[:] for spec in specs]
+            for col, i, code in expressions:
+                c_specs[col][i] = eval(code, render_space)
+            return self.xls_row_template(c_specs, wanted_list)
+
+        return render_row
+
+    def _prefetch_tree(self, model, col_specs, wanted_list, rowtype):
+        """
+        Return the fields of model read by the expressions of rowtype on
+        'line', as {field: {field of the related record: {...}}}
+        """
+        tree = {}
+        for wanted in wanted_list:
+            for value in col_specs[wanted][rowtype]:
+                if not isinstance(value, CodeType):
+                    continue
+                for chain in _attribute_chains(value, 'line'):
+                    node, node_model = tree, model
+                    for attribute in chain:
+                        field = node_model._fields.get(attribute)
+                        if field is None:
+                            break
+                        node = node.setdefault(attribute, {})
+                        if field.type != 'many2one':
+                            break
+                        node_model = node_model.env[field.comodel_name]
+        return tree
+
+    def _prefetch(self, records, tree):
+        """
+        Read the fields of tree for records by chunks, then the fields of
+        the records they link to, so the rendering reads them from the
+        cache instead of fetching them record by record
+        """
+        if not tree:
+            return
+        for index in xrange(0, len(records), self._prefetch_size):
+            chunk = records[index:index + self._prefetch_size]
+            chunk.read(list(tree), load='_classic_write')
+        for name, subtree in tree.iteritems():
+            if subtree:
+                self._prefetch(records.mapped(name), subtree)
 
     def __init__(self, name, table, rml=False, parser=False, header=True,
                  store=False):
@@ -66,25 +179,28 @@ class move_line_xls(report_xls):
         _xs = self.xls_styles
         # header
         rh_cell_format = _xs['bold'] + _xs['fill'] + _xs['borders_all']
-        self.rh_cell_style = xlwt.easyxf(rh_cell_format)
-        self.rh_cell_style_center = xlwt.easyxf(rh_cell_format + _xs['center'])
-        self.rh_cell_style_right = xlwt.easyxf(rh_cell_format + _xs['right'])
+        self.rh_cell_style = self.xls_style(rh_cell_format)
+        self.rh_cell_style_center = self.xls_style(
+            rh_cell_format + _xs['center'])
+        self.rh_cell_style_right = self.xls_style(
+            rh_cell_format + _xs['right'])
         # lines
         aml_cell_format = _xs['borders_all']
-        self.aml_cell_style = xlwt.easyxf(aml_cell_format)
-        self.aml_cell_style_center = xlwt.easyxf(
+        self.aml_cell_style = self.xls_style(aml_cell_format)
+        self.aml_cell_style_center = self.xls_style(
             aml_cell_format + _xs['center'])
-        self.aml_cell_style_date = xlwt.easyxf(
+        self.aml_cell_style_date = self.xls_style(
             aml_cell_format + _xs['left'],
             num_format_str=report_xls.date_format)
-        self.aml_cell_style_decimal = xlwt.easyxf(
+        self.aml_cell_style_decimal = self.xls_style(
             aml_cell_format + _xs['right'],
             num_format_str=report_xls.decimal_format)
         # totals
         rt_cell_format = _xs['bold'] + _xs['fill'] + _xs['borders_all']
-        self.rt_cell_style = xlwt.easyxf(rt_cell_format)
-        self.rt_cell_style_right = xlwt.easyxf(rt_cell_format + _xs['right'])
-        self.rt_cell_style_decimal = xlwt.easyxf(
+        self.rt_cell_style = self.xls_style(rt_cell_format)
+        self.rt_cell_style_right = self.xls_style(
+            rt_cell_format + _xs['right'])
+        self.rt_cell_style_decimal = self.xls_style(
             rt_cell_format + _xs['right'],
             num_format_str=report_xls.decimal_format)
 
@@ -315,7 +431,7 @@ class move_line_xls(report_xls):
         ws.footer_str = self.xls_footers['standard']
 
         # Title
-        cell_style = xlwt.easyxf(_xs['xls_title'])
+        cell_style = self.xls_style(_xs['xls_title'])
         c_specs = [
             ('report_name', 1, 0, 'text', report_name),
         ]
@@ -335,25 +451,45 @@ class move_line_xls(report_xls):
         ws.set_horz_split_pos(row_pos)
 
         # account move lines
-        for line in objects:
-            debit_cell = rowcol_to_cell(row_pos, debit_pos)
-            credit_cell = rowcol_to_cell(row_pos, credit_pos)
-            bal_formula = debit_cell + '-' + credit_cell
-            _logger.debug('dummy call - %s', bal_formula)
-            c_specs = map(
-                lambda x: self.render(x, self.col_specs_template, 'lines'),
-                wanted_list)
-            row_data = self.xls_row_template(c_specs, [x[0] for x in c_specs])
-            row_pos = self.xls_write_row(
-                ws, row_pos, row_data, row_style=self.aml_cell_style)
+        aml_start_pos = row_pos
+        render_line = self._compile_row(self.col_specs_template, wanted_list,
+                                        'lines')
+        prefetch_tree = self._prefetch_tree(
+            objects, self.col_specs_template, wanted_list, 'lines')
+        # the names render() gives to the expressions: the localcontext of
+        # the parser and the locals of this method, read once, the names
+        # which change with the line are updated for every line
+        render_space = dict(_p)
+        render_space.update(locals())
+        # the lines are rendered by windows, the records read for a window
+        # are dropped from the cache before the next one, so the cache does
+        # not grow with the selection
+        for index in xrange(0, len(objects), self._window_size):
+            window = objects[index:index + self._window_size]
+            self._prefetch(window, prefetch_tree)
+            for line in window:
+                debit_cell = rowcol_to_cell(row_pos, debit_pos)
+                credit_cell = rowcol_to_cell(row_pos, credit_pos)
+                render_space.update({'line': line,
+                                     'index': index,
+                                     'window': window,
+                                     'row_pos': row_pos,
+                                     'debit_cell': debit_cell,
+                                     'credit_cell': credit_cell,
+                                     'bal_formula': debit_cell + '-' +
+                                     credit_cell})
+                row_pos = self.xls_write_row(
+                    ws, row_pos, render_line(render_space),
+                    row_style=self.aml_cell_style)
+            render_space['line'] = None
+            objects.env.invalidate_all()
 
-        # Totals
-        aml_cnt = len(objects)
-        debit_start = rowcol_to_cell(row_pos - aml_cnt, debit_pos)
+        # Totals, over all the lines of the sheet
+        debit_start = rowcol_to_cell(aml_start_pos, debit_pos)
         debit_stop = rowcol_to_cell(row_pos - 1, debit_pos)
         debit_formula = 'SUM(%s:%s)' % (debit_start, debit_stop)
         _logger.debug('dummy call - %s', debit_formula)
-        credit_start = rowcol_to_cell(row_pos - aml_cnt, credit_pos)
+        credit_start = rowcol_to_cell(aml_start_pos, credit_pos)
         credit_stop = rowcol_to_cell(row_pos - 1, credit_pos)
         credit_formula = 'SUM(%s:%s)' % (credit_start, credit_stop)
         _logger.debug('dummy call - %s', credit_formula)
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+import xlwt
+
+import openerp.tests.common as common
+from openerp.report import interface
+from openerp.addons.report_xls.report_xls import AttrDict
+from openerp.addons.report_xls.utils import rowcol_to_cell, _render
+
+from ..report import move_line_list_xls
+
+
+class test_move_line_list_xls(common.TransactionCase):
+
+    def setUp(self):
+        super(test_move_line_list_xls, self).setUp()
+        self.service = interface.report_int._reports[
+            'report.move.line.list.xls']
+        period = self.env.ref('account.period_1')
+        move_ids = []
+        for amount in (100.0, 200.0, 300.0):
+            move = self.env['account.move'].create({
+                'journal_id': self.ref('account.miscellaneous_journal'),
+                'period_id': period.id,
+                'date': period.date_start,
+                'line_id': [
+                    (0, 0, {'name': 'Debit %s' % amount,
+                            'account_id': self.ref('account.a_recv'),
+                            'date': period.date_start,
+                            'debit': amount,
+                            'credit': 0.0}),
+                    (0, 0, {'name': 'Credit %s' % amount,
+                            'account_id': self.ref('account.a_sale'),
+                            'date': period.date_start,
+                            'debit': 0.0,
+                            'credit': amount}),
+                ]})
+            move_ids.append(move.id)
+        self.lines = self.env['account.move.line'].search(
+            [('move_id', 'in', move_ids)], order='id')
+
+    def _localcontext(self, lines):
+        parser = self.service.parser(self.cr, self.uid, self.service.name2,
+                                     {})
+        parser.set_context(lines, {}, lines.ids, 'xls')
+        return AttrDict(parser.localcontext)
+
+    def _generate(self, lines, template_changes=None):
+        """Write the export of lines in a new workbook, return its sheet
+        and the parser localcontext"""
+        _p = self._localcontext(lines)
+        if template_changes:
+            # the changes are applied to the template of the report
+            self.addCleanup(setattr, self.service, 'col_specs_template',
+                            dict(self.service.col_specs_template))
+            _p['template_changes'] = template_changes
+        wb = xlwt.Workbook(encoding='utf-8')
+        self.service.generate_xls_report(_p, self.service.xls_styles, {},
+                                         lines, wb)
+        return wb.get_sheet(0), _p
+
+    def test_totals_over_windows(self):
+        # windows smaller than the selection, the last one incomplete
+        self.service._window_size = 4
+        self.addCleanup(delattr, self.service, '_window_size')
+        self.assertEqual(len(self.lines), 6)
+        ws, _p = self._generate(self.lines)
+        totals_row = max(ws.get_rows())
+        first_row = totals_row - len(self.lines)
+        # every line is written, in its own row, with its balance formula
+        balance_pos = _p.wanted_list.index('balance')
+        debit_pos = _p.wanted_list.index('debit')
+        credit_pos = _p.wanted_list.index('credit')
+        for row in xrange(first_row, totals_row):
+            balance = ws.row(row)._Row__cells[balance_pos]
+            self.assertEqual(balance.frmla.text(),
+                             rowcol_to_cell(row, debit_pos) + '-' +
+                             rowcol_to_cell(row, credit_pos))
+        # the totals sum all the lines, of all the windows
+        totals = ws.row(totals_row)._Row__cells
+        for pos in (debit_pos, credit_pos):
+            self.assertEqual(totals[pos].frmla.text(),
+                             'SUM(%s:%s)' % (
+                                 rowcol_to_cell(first_row, pos),
+                                 rowcol_to_cell(totals_row - 1, pos)))
+
+    def test_render_space(self):
+        # the line expressions see the locals of generate_xls_report, as
+        # with render()
+        name_spec = dict(self.service.col_specs_template['name'])
+        name_spec['lines'] = [
+            1, 0, 'number',
+            _render("ws.name == report_name[:31] and self is not None "
+                    "and cell_style is not None and row_pos")]
+        ws, _p = self._generate(self.lines, {'name': name_spec})
+        totals_row = max(ws.get_rows())
+        name_pos = _p.wanted_list.index('name')
+        for row in xrange(totals_row - len(self.lines), totals_row):
+            self.assertEqual(ws.row(row)._Row__cells[name_pos].number, row)
+
+    def test_attribute_chains(self):
+        code = _render("line.partner_id and line.partner_id.name or "
+                       "datetime.strptime(line.date, '%Y-%m-%d') or "
+                       "line.company_id.currency_id.name or other.name")
+        self.assertEqual(
+            move_line_list_xls._attribute_chains(code, 'line'),
+            [('partner_id',), ('partner_id', 'name'), ('date',),
+             ('company_id', 'currency_id', 'name')])
+        # names and attributes beyond the 65536th need an EXTENDED_ARG
+        code = _render(' + '.join(['x%d' % i for i in xrange(70000)] +
+                                  ['line.move_id.name']))
+        self.assertEqual(
+            move_line_list_xls._attribute_chains(code, 'line'),
+            [('move_id', 'name')])
+
+    def test_prefetch_tree(self):
+        _p = self._localcontext(self.lines)
+        tree = self.service._prefetch_tree(
+            self.lines, self.service.col_specs_template, _p.wanted_list,
+            'lines')
+        self.assertEqual(tree, {
+            'move_id': {'name': {}},
+            'name': {},
+            'date': {},
+            'journal_id': {'code': {}},
+            'period_id': {'code': {}, 'name': {}},
+            'partner_id': {'name': {}},
+            'account_id': {'code': {}},
+            'date_maturity': {},
+            'debit': {},
+            'credit': {},
+            'reconcile_id': {'name': {}},
+            'reconcile_partial_id': {'name': {}},
+            'analytic_account_id': {'code': {}},
+        })
+        # the fields of the tree are read for all the lines at once
+        self.env.invalidate_all()
+        self.service._prefetch(self.lines, tree)
+        for line in self.lines:
+            self.assertIn(line.id, self.env.cache[
+                self.lines._fields['move_id']])
+
+    def test_compiled_rows(self):
+        # the compiled rows are the rows render() gives for every column
+        _p = self._localcontext(self.lines)
+        col_specs = self.service.col_specs_template
+        wanted_list = _p.wanted_list
+        debit_pos = wanted_list.index('debit')
+        credit_pos = wanted_list.index('credit')
+        render_line = self.service._compile_row(col_specs, wanted_list,
+                                                'lines')
+        for row_pos, line in enumerate(self.lines):
+            debit_cell = rowcol_to_cell(row_pos, debit_pos)
+            credit_cell = rowcol_to_cell(row_pos, credit_pos)
+            render_space = dict(_p, line=line, debit_cell=debit_cell,
+                                credit_cell=credit_cell,
+                                bal_formula=debit_cell + '-' + credit_cell)
+            c_specs = [self.service.render(wanted, col_specs, 'lines',
+                                           render_space=render_space)
+                       for wanted in wanted_list]
+            self.assertEqual(
+                render_line(render_space),
+                self.service.xls_row_template(c_specs, wanted_list))
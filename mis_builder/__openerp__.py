@@ -35,6 +35,7 @@
     'depends': [
         'account',
         'report_xls',  # OCA/reporting-engine
+        'report_xls_style',
     ],
     'data': [
         'wizard/mis_builder_dashboard.xml',
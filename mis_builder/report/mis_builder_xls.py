@@ -22,9 +22,10 @@
 #
 ##############################################################################
 
-import xlwt
 from openerp.report import report_sxw
 from openerp.addons.report_xls.report_xls import report_xls
+from openerp.addons.report_xls_style.report_xls_style import \
+    report_xls_style
 import logging
 _logger = logging.getLogger(__name__)
 
@@ -37,7 +38,7 @@ class mis_builder_xls_parser(report_sxw.rml_parse):
         self.context = context
 
 
-class mis_builder_xls(report_xls):
+class mis_builder_xls(report_xls_style):
 
     def __init__(self, name, table, rml=False, parser=False, header=True,
                  store=False):
@@ -49,11 +50,11 @@ class mis_builder_xls(report_xls):
         # header
         rh_cell_format = _xs['bold'] + _xs['fill'] + \
             _xs['borders_all'] + _xs['right']
-        self.rh_cell_style = xlwt.easyxf(rh_cell_format)
-        self.rh_cell_style_date = xlwt.easyxf(
+        self.rh_cell_style = self.xls_style(rh_cell_format)
+        self.rh_cell_style_date = self.xls_style(
             rh_cell_format, num_format_str=report_xls.date_format)
         # lines
-        self.mis_rh_cell_style = xlwt.easyxf(
+        self.mis_rh_cell_style = self.xls_style(
             _xs['borders_all'] + _xs['bold'] + _xs['fill'])
 
     def generate_xls_report(self, _p, _xs, data, objects, wb):
@@ -76,7 +77,7 @@ class mis_builder_xls(report_xls):
         ]
         row_data = self.xls_row_template(c_specs, ['report_name'])
         row_pos = self.xls_write_row(
-            ws, row_pos, row_data, row_style=xlwt.easyxf(_xs['xls_title']))
+            ws, row_pos, row_data, row_style=self.xls_style(_xs['xls_title']))
         row_pos += 1
 
         # get the computed result of the report
@@ -120,7 +121,7 @@ class mis_builder_xls(report_xls):
                     num_format_str += '0' * int(value['dp'])
                 if value.get('suffix'):
                     num_format_str = num_format_str + ' "%s"' % value['suffix']
-                kpi_cell_style = xlwt.easyxf(
+                kpi_cell_style = self.xls_style(
                     _xs['borders_all'] + _xs['right'],
                     num_format_str=num_format_str)
                 if value.get('val'):
@@ -23,6 +23,9 @@
 ##############################################################################
 
 import openerp.tests.common as common
+from openerp import report
+from openerp.report import interface
+from openerp.addons.report_xls_style import report_xls_style
 
 from ..models import mis_builder
 
@@ -80,3 +83,25 @@ class test_mis_builder(common.TransactionCase):
                              'name': u'today'}]
                    }],
              }, data)
+
+    def test_xls_styles(self):
+        # each style object written adds an XF record to the workbook, the
+        # reports must get their styles from the shared cache, the same
+        # object for the same style string
+        instance_id = self.ref('mis_builder.mis_report_instance_test')
+        data = {'model': 'mis.report.instance'}
+        content, fmt = report.render_report(
+            self.cr, self.uid, [instance_id], 'mis.report.instance.xls', data)
+        self.assertEqual(fmt, 'xls')
+        styles = dict(report_xls_style._xls_style_cache)
+        service = interface.report_int._reports[
+            'report.mis.report.instance.xls']
+        title = service.xls_styles['xls_title']
+        self.assertIn((title, None), styles)
+        content, fmt = report.render_report(
+            self.cr, self.uid, [instance_id], 'mis.report.instance.xls', data)
+        for key, style in styles.iteritems():
+            self.assertIs(report_xls_style._xls_style_cache[key], style)
+        self.assertIs(service.xls_style(title), styles[(title, None)])
+        self.assertIs(report_xls_style.xls_style(title),
+                      styles[(title, None)])
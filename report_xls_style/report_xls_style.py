@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+##############################################################################
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Affero General Public License as
+#    published by the Free Software Foundation, either version 3 of the
+#    License, or (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#    GNU Affero General Public License for more details.
+#
+#    You should have received a copy of the GNU Affero General Public License
+#    along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+##############################################################################
+
+import xlwt
+from openerp.addons.report_xls.report_xls import report_xls
+
+# xlwt adds an XF record to the workbook for each style object it writes,
+# the styles are built once and shared by all the exports of the process
+_xls_style_cache = {}
+
+
+def xls_style(format_str, num_format_str=None):
+    """Return the xlwt style of an easyxf format string, built once"""
+    key = (format_str, num_format_str)
+    style = _xls_style_cache.get(key)
+    if style is None:
+        style = _xls_style_cache[key] = xlwt.easyxf(
+            format_str, num_format_str=num_format_str)
+    return style
+
+
+class report_xls_style(report_xls):
+
+    """report_xls getting its cell styles from xls_style"""
+
+    xls_style = staticmethod(xls_style)